@@ -4,60 +4,151 @@
 # Python standard libraries
 import os
 import json
+import time
+import threading
+from functools import lru_cache
+from contextlib import contextmanager
 # external libraries
 from dotenv import load_dotenv
 from pydantic import ValidationError
-from langchain_openai import ChatOpenAI, OpenAI
-from langchain_community.callbacks import get_openai_callback
 # Internal project libraries
-from base_model import ContentGapAnalysisResult, force_json_closure,normalize_mixed_text
+from base_model import (SECTION_EVENTS, dump_result, load_result, parse_model_json, repair_model_json,
+                        result_sections, section_id, validate_result, validate_section)
+from cache import ResultCache, make_cache_key
+from compact_output import COMPACT_PROMPT, RESPONSE_FORMAT, expand_result, load_compact, number_products
+from llm_backend import get_backend
+from json_stream import JSONStreamParser
+from map_reduce import PROMPTS_SIGNATURE, run_map_reduce, split_products
+from metrics import LLM_COST, LLM_TOKENS, STARTUP_SECONDS, stage
+from storage import atomic_write
 from logger import get_logger
+# LangChain (token callbacks), the feature engine, review dedup and the token budget (NumPy/SciPy,
+# tiktoken) are imported on first use, so importing this module stays fast and offline
 
 logger = get_logger()
 
 load_dotenv()
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")  # "fake" runs the whole pipeline offline
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    logger.error("API key not found in .env file!")
-    raise ValueError("API key not found in .env file!")
+WARMUP_PROBE = os.getenv("WARMUP_PROBE", "1") == "1"  # send a test request to the model during warm-up
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "30"))
 
+MODEL_NAME = "gpt-4o-mini" # in this case we want to use gpt-4o-mini
 
-llm = ChatOpenAI(
-    model="gpt-4o-mini", # in this case we want to use gpt-4o-mini
-    base_url="https://api.avalai.ir/v1",
-    temperature=None,
-    max_tokens=3800, #token limiter
-    timeout=None,
-    max_retries=0,
-    api_key=OPENAI_API_KEY)
+_llm = None
+_llm_lock = threading.Lock()
 
 
-# testing the API connection and tracking token usage
-try:
-    logger.info("Testing OpenAI API connection...")
+def get_llm():
+    """The model backend, built on first use instead of at import time."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                if LLM_BACKEND == "openai" and not OPENAI_API_KEY:
+                    logger.error("API key not found in .env file!")
+                    raise ValueError("API key not found in .env file!")
+                _llm = get_backend(
+                    LLM_BACKEND,
+                    model=MODEL_NAME,
+                    base_url=os.getenv("OPENAI_BASE_URL", "https://api.avalai.ir/v1"),
+                    temperature=None,
+                    max_tokens=3800, #token limiter
+                    api_key=OPENAI_API_KEY)
+    return _llm
+
+
+@contextmanager
+def track_usage():
+    """Log the tokens and cost of the model calls made inside the block and add them to the metrics."""
+    from langchain_community.callbacks import get_openai_callback
+
     with get_openai_callback() as cb:
-        test_response = llm.invoke([
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": "Hello world!"}
-        ])
-        logger.info(cb)
-        logger.info("OpenAI API test successful")
+        yield cb
+    logger.info(cb)
+    LLM_TOKENS.inc(cb.prompt_tokens, kind="prompt")
+    LLM_TOKENS.inc(cb.completion_tokens, kind="completion")
+    LLM_COST.inc(cb.total_cost)
 
-except Exception as e:
-    logger.error(f"OpenAI API test failed: {repr(e)}")
-    raise
 
-# Prompting The Model
+# state of the background warm-up, reported by /readyz
+readiness = {"status": "starting", "error": None, "attempts": 0, "ready_seconds": None}
 
 
-def analyze_content_gaps(input_file: str, output_file: str ):
-    with open(input_file, "r", encoding="utf-8") as f:
-        content = f.read()
+def warm_up(stop: threading.Event = None, started: float = None) -> bool:
+    """Build the client, load the heavy modules and test the API connection, retrying until it works.
 
-    messages = [
-    {
-        "role": "system",
-        "content": """
+    Runs in a background thread at startup, so a new worker answers requests
+    right away; `stop` ends the retries, `started` (a perf_counter value) is
+    where the reported time to readiness is measured from.
+    """
+    stop = stop or threading.Event()
+    started = time.perf_counter() if started is None else started
+    while True:
+        readiness["attempts"] += 1
+        try:
+            llm = get_llm()
+            import feature_engine, review_dedup, token_budget  # noqa: F401
+            if WARMUP_PROBE:
+                # testing the API connection and tracking token usage
+                logger.info("Testing OpenAI API connection...")
+                with track_usage():
+                    llm.invoke([
+                        {"role": "system", "content": "You are a helpful assistant."},
+                        {"role": "user", "content": "Hello world!"}
+                    ])
+                logger.info("OpenAI API test successful")
+        except Exception as e:
+            readiness.update(status="failed", error=repr(e))
+            logger.error(f"OpenAI API test failed: {repr(e)}, retrying in {WARMUP_RETRY_SECONDS:.0f}s")
+            if stop.wait(WARMUP_RETRY_SECONDS):
+                return False
+            continue
+        seconds = time.perf_counter() - started
+        readiness.update(status="ready", error=None, ready_seconds=round(seconds, 3))
+        STARTUP_SECONDS.set(seconds, phase="ready")
+        logger.info(f"Ready {seconds:.3f}s after start")
+        return True
+
+# Result cache: identical inputs (same prompt, model and settings) skip the LLM entirely
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+# CACHE_MAX_MB is the disk budget of both caches; the extracts get their share, the results the rest
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_MB", "256")) * 1024 * 1024
+EXTRACT_CACHE_MAX_BYTES = min(int(os.getenv("EXTRACT_CACHE_MAX_MB", "64")) * 1024 * 1024, CACHE_MAX_BYTES)
+result_cache = ResultCache(
+    directory=os.getenv("CACHE_DIR", os.path.join(BASE_PATH, "cache")),
+    max_memory_items=int(os.getenv("CACHE_MAX_ITEMS", "256")),
+    max_disk_bytes=CACHE_MAX_BYTES - EXTRACT_CACHE_MAX_BYTES,
+    ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+)
+# Per-product map-stage extracts, keyed by the product's description and reviews
+extract_cache = ResultCache(
+    directory=os.path.join(os.getenv("CACHE_DIR", os.path.join(BASE_PATH, "cache")), "extracts"),
+    max_memory_items=int(os.getenv("EXTRACT_CACHE_MAX_ITEMS", "4096")),
+    max_disk_bytes=EXTRACT_CACHE_MAX_BYTES,
+    ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+)
+
+# Analysis modes: one call with the whole document, per-product map-reduce for large catalogs,
+# "incremental" map-reduce that only re-extracts changed products and merges locally,
+# a local-only "fast" mode, or "assisted" where the model refines the local pre-analysis
+ANALYZE_MODES = ("single", "map_reduce", "incremental", "auto", "fast", "assisted")
+ANALYZE_MODE = os.getenv("ANALYZE_MODE", "single")
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", "4"))
+AUTO_MAP_REDUCE_PRODUCTS = int(os.getenv("AUTO_MAP_REDUCE_PRODUCTS", "5"))
+AUTO_MAP_REDUCE_CHARS = int(os.getenv("AUTO_MAP_REDUCE_CHARS", "20000"))
+LOCAL_FALLBACK = os.getenv("LOCAL_FALLBACK", "0") == "1"  # answer from the local engine when the LLM fails
+REVIEW_DEDUP = os.getenv("REVIEW_DEDUP", "1") == "1"  # collapse near-duplicate reviews before prompting
+REVIEW_DEDUP_THRESHOLD = float(os.getenv("REVIEW_DEDUP_THRESHOLD", "0.6"))
+OUTPUT_PRETTY = os.getenv("OUTPUT_PRETTY", "0") == "1"  # indent output files instead of compact JSON
+MODEL_CONTEXT_TOKENS = int(os.getenv("MODEL_CONTEXT_TOKENS", "128000"))
+INPUT_TOKEN_BUDGET = int(os.getenv("INPUT_TOKEN_BUDGET", "0"))  # 0: what the context leaves for the input
+# "compact": single-mode answers name products by index and are expanded locally (fewer completion tokens)
+OUTPUT_PROTOCOL = os.getenv("OUTPUT_PROTOCOL", "full")
+STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "0") == "1"  # send the compact JSON schema as response_format
+
+# Prompting The Model
+SYSTEM_PROMPT = """
 You are an AI assistant specialized in **Content Gap Analysis**.
 Task:
 - Compare product descriptions and customer reviews.
@@ -86,27 +177,179 @@ Rules:
 5. Marketing insight: 3-4 short sentences in Persian summarizing key points and what features/benefits should be highlighted.
 6. The response must be a valid JSON.
 7. Do not include any text outside the JSON.
-8. use double quotes for all keys and string values."""},
+8. use double quotes for all keys and string values.
+9. A review given as {"text": "...", "count": N} stands for N near-identical reviews; weigh it accordingly."""
+
+DRAFT_PROMPT = """A draft of the analysis was computed automatically from the text above.
+Refine it: fix or merge wrong features, rephrase them as short Persian phrases and write the marketing insight.
+Keep the product names exactly as they are. Draft:
+"""
+
+CONTINUE_PROMPT = """Your answer above was cut off. Return ONLY a JSON object with these fields, complete and in the same format: {fields}"""
+
+
+def resolve_mode(content: str, mode: str) -> str:
+    """Pick the concrete analysis mode; 'auto' switches to map-reduce for large catalogs."""
+    if mode not in ANALYZE_MODES:
+        raise ValueError(f"Unknown analysis mode: {mode}")
+    if mode != "auto":
+        return mode
+    try:
+        products = split_products(content)
+    except ValueError:
+        return "single"
+    if len(products) >= AUTO_MAP_REDUCE_PRODUCTS or len(content) >= AUTO_MAP_REDUCE_CHARS:
+        return "map_reduce"
+    return "single"
+
+
+def analyze_content_gaps(input_file: str, output_file: str, mode: str = None) -> str:
+    """Write the analysis of `input_file` to `output_file`.
+
+    Returns "done", or "fallback" when the model call failed and the local
+    pre-analysis was saved instead (LOCAL_FALLBACK).
+    """
+    with stage("input_read"), open(input_file, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    mode = resolve_mode(content, mode or ANALYZE_MODE)
+    logger.info(f"Analyzing {input_file} in {mode} mode")
+    status = "done"
+    if mode == "fast":
+        from feature_engine import analyze_locally
+        data = analyze_locally(content)
+    else:
+        try:
+            data = analyze_with_llm(content, mode)
+        except Exception as e:
+            data, status = local_fallback(content, e), "fallback"
+
+    with stage("output_write"):
+        atomic_write(output_file, dump_result(data, pretty=OUTPUT_PRETTY))
+    return status
+
+
+def local_fallback(content: str, error: Exception) -> dict:
+    """Local pre-analysis saved when the model call failed; re-raises `error` unless LOCAL_FALLBACK is on."""
+    if not LOCAL_FALLBACK:
+        raise error
+    from feature_engine import analyze_locally
+    try:
+        data = analyze_locally(content)
+    except ValueError:
+        raise error
+    logger.warning(f"LLM analysis failed ({repr(error)}), saved the local pre-analysis instead")
+    return data
+
+
+def prepare_content(content: str) -> str:
+    """Shrink the prompt before it is sent: near-duplicate reviews become one entry with a count."""
+    if not REVIEW_DEDUP:
+        return content
+    from review_dedup import collapse_reviews
+    try:
+        document = json.loads(content)
+        products = document["products"]
+    except (ValueError, KeyError, TypeError):
+        return content
+
+    for product in products:
+        reviews = product.get("reviews") if isinstance(product, dict) else None
+        if not isinstance(reviews, list) or len(reviews) < 2:
+            continue
+        collapsed = collapse_reviews(reviews, REVIEW_DEDUP_THRESHOLD)
+        if len(collapsed) < len(reviews):
+            product["reviews"] = [text if count == 1 else {"text": text, "count": count}
+                                  for text, count in collapsed]
+    return json.dumps(document, ensure_ascii=False)
+
+
+@lru_cache(maxsize=1)
+def input_token_budget() -> int:
+    """Tokens the input document may use: the context window minus the prompts and the answer."""
+    from token_budget import count_tokens
+    if INPUT_TOKEN_BUDGET > 0:
+        return INPUT_TOKEN_BUDGET
+    prompts = count_tokens(SYSTEM_PROMPT + DRAFT_PROMPT, MODEL_NAME)
+    return MODEL_CONTEXT_TOKENS - (get_llm().max_tokens or 0) - prompts
+
+
+def fit_prompt(content: str) -> str:
+    """Trim an input that is too large for one call to its most salient parts and log what was cut."""
+    from token_budget import fit_to_budget
+    content, report = fit_to_budget(content, input_token_budget(), MODEL_NAME)
+    if report.trimmed:
+        logger.warning(f"Input trimmed from {report.tokens_before} to {report.tokens_after} tokens "
+                       f"({report.tokenizer}): {json.dumps(report.to_dict(), ensure_ascii=False)}")
+    return content
+
+
+def analyze_with_llm(content: str, mode: str) -> dict:
+    """Cached LLM analysis."""
+    with stage("prompt_build"):
+        raw_content, content = content, prepare_content(content)
+        if mode not in ("map_reduce", "incremental"):  # map-reduce sends one product per call
+            content = fit_prompt(content)
+    if mode in ("map_reduce", "incremental"):
+        prompt, compute = PROMPTS_SIGNATURE, lambda: map_reduce_analysis(content, local_merge=mode == "incremental")
+    elif mode == "assisted":
+        prompt, compute = SYSTEM_PROMPT + DRAFT_PROMPT, lambda: run_analysis(content, draft=local_draft(raw_content))
+    else:
+        prompt, compute = SYSTEM_PROMPT, lambda: run_analysis(content)
+        if OUTPUT_PROTOCOL == "compact":
+            try:
+                numbered, names = number_products(content)
+                prompt, compute = COMPACT_PROMPT, lambda: run_compact_analysis(numbered, names)
+            except ValueError:
+                logger.info("Input is not a products document, using the full output protocol")
+
+    settings = {**get_llm().settings, "mode": mode}
+    if prompt == COMPACT_PROMPT:
+        settings["structured_output"] = STRUCTURED_OUTPUT
+    cache_key = make_cache_key(content, prompt, MODEL_NAME, settings)
+    return result_cache.get_or_compute(cache_key, compute)
+
+
+def map_reduce_analysis(content: str, local_merge: bool = False) -> dict:
+    with track_usage():
+        return run_map_reduce(get_llm(), content, MAP_CONCURRENCY, cache=extract_cache, local_merge=local_merge)
+
+
+def local_draft(content: str) -> dict:
+    """Local pre-analysis handed to the model in assisted mode."""
+    from feature_engine import analyze_products
+    products = split_products(content)
+    return analyze_products(products)
+
+
+def build_messages(content: str, draft: dict = None) -> list:
+    messages = [
+    {
+        "role": "system",
+        "content": SYSTEM_PROMPT},
 
          #using own data
          {"role": "user","content": content}
     ]
+    if draft is not None:
+        messages.append({"role": "user", "content": DRAFT_PROMPT + json.dumps(draft, ensure_ascii=False)})
+    return messages
+
+
+def run_analysis(content: str, draft: dict = None) -> dict:
+    """Send one input document to the model and return the validated result."""
+    messages = build_messages(content, draft)
 
     response = None
     try:
-        with get_openai_callback() as cb:
-            response = llm.invoke(messages)
-            logger.info(cb)
+        with track_usage():
+            response = get_llm().invoke(messages)
 
         logger.info("")
-        cleaned_text = normalize_mixed_text(response.content.strip())
-        cleaned_json = force_json_closure(cleaned_text)
-        data = json.loads(cleaned_json)
-        result = ContentGapAnalysisResult(**data)
-
-        with open(output_file, 'w', encoding="utf-8") as f:
-            json.dump(result.model_dump(by_alias=True), f, indent=2, ensure_ascii=False)
-
+        data, missing = load_result(response.content)
+        if missing:
+            data = validate_result(complete_truncated(messages, response.content, data, missing))
+        return data
 
     except ValidationError as ve:
         logger.error("Model output does not match expected structure!")
@@ -118,3 +361,88 @@ Rules:
         logger.error(f"Unexpected error: {repr(e)}")
         logger.error(f"Raw model output: {response.content if response else 'No response'}")
         raise
+
+
+def run_compact_analysis(numbered: str, names: list) -> dict:
+    """Single-call analysis in the compact protocol: products are sent with an index (see
+    number_products), the model answers with indices only, and the answer is expanded locally."""
+    messages = [{"role": "system", "content": COMPACT_PROMPT}, {"role": "user", "content": numbered}]
+
+    response = None
+    try:
+        with track_usage():
+            response = get_llm().invoke(messages, response_format=RESPONSE_FORMAT if STRUCTURED_OUTPUT else None)
+        data, missing = load_compact(response.content)
+        if missing:
+            data = complete_truncated(messages, response.content, data, missing)
+        return expand_result(data, names)
+
+    except (ValidationError, ValueError) as e:
+        logger.error(f"Compact model output could not be expanded: {repr(e)}")
+        logger.error(f"Raw model output: {response.content if response else 'No response'}")
+        raise
+
+
+def complete_truncated(messages: list, partial: str, data: dict, missing: list) -> dict:
+    """Salvage a cut-off answer by asking only for the sections that are missing."""
+    logger.warning(f"Model output was truncated, asking again for: {', '.join(missing)}")
+    follow_up = messages + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUE_PROMPT.format(fields=", ".join(missing))},
+    ]
+    with track_usage():
+        response = get_llm().invoke(follow_up)
+    extra = parse_model_json(response.content)
+    data.update({section: extra[section] for section in missing if section in extra})
+    return data
+
+
+def stream_content_gaps(input_file: str, output_file: str):
+    """Single-mode analysis that yields (event, data) for every section as soon as it is complete.
+
+    Sections are validated on their own while the model is still generating;
+    the full document is validated and written to `output_file` at the end.
+    When the answer was cut off, only the sections (or products) that were
+    not sent yet are sent once the missing part has been asked for again.
+    """
+    with stage("input_read"), open(input_file, "r", encoding="utf-8") as f:
+        content = f.read()
+    with stage("prompt_build"):
+        content = fit_prompt(prepare_content(content))
+
+    cache_key = make_cache_key(content, SYSTEM_PROMPT, MODEL_NAME, {**get_llm().settings, "mode": "single"})
+    data = result_cache.get(cache_key)
+    if data is not None:
+        yield from result_sections(data)
+    else:
+        parser = JSONStreamParser()
+        messages = build_messages(content)
+        raw, sent = [], set()
+        try:
+            with track_usage():
+                for chunk in get_llm().stream(messages):
+                    raw.append(chunk)
+                    for key, child, text in parser.feed(chunk):
+                        section = validate_section(key, child, text)
+                        if section is not None:
+                            sent.add(section_id(*section))
+                            yield section
+            data, missing = repair_model_json("".join(raw))
+            if missing:
+                data = complete_truncated(messages, "".join(raw), data, missing)
+            data = validate_result(data)
+            # what was cut off mid-stream is sent now, without repeating what the client already has
+            completed = {SECTION_EVENTS[section] for section in missing}
+            for event, section in result_sections(data):
+                if event in completed and section_id(event, section) not in sent:
+                    yield event, section
+        except ValidationError as ve:
+            logger.error("Model output does not match expected structure!")
+            logger.error(ve.json())
+            logger.error(f"Raw model output: {''.join(raw) or 'No response'}")
+            raise
+        result_cache.set(cache_key, data)
+
+    with stage("output_write"):
+        atomic_write(output_file, dump_result(data, pretty=OUTPUT_PRETTY))
+    yield "done", {"output_file": output_file}
@@ -1,10 +1,15 @@
 # Python standard libraries
 import re
-from typing import List, Dict
+import json
+from typing import List, Dict, Optional, Tuple
 # external libraries
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic_core import to_json
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator, model_validator
 # internal modules
-from logger import get_logger
+from json_stream import RepairResult, repair_json
+from normalizer import normalize_text
+from logger import get_logger, sampled
+from metrics import stage
 
 logger = get_logger()
 
@@ -20,7 +25,6 @@ class ProductReviewGap(BaseModel):
         if not v.strip():
             logger.warning("Empty product_name detected in ProductReviewGap")
             raise ValueError("product_name cannot be empty or whitespace")
-        logger.info(f"Validated product_name: {v}")
         return v
 
 
@@ -37,42 +41,154 @@ class ContentGapAnalysisResult(BaseModel):
         if not v or not v.strip():
             logger.warning("Empty marketing_insight detected in ContentGapAnalysisResult")
             raise ValueError(f"{info.field_name} cannot be empty")
-        logger.info("Validated marketing_insight")
+        logger.info("Validated marketing_insight", extra=sampled("validated_marketing_insight"))
         return v
 
     @model_validator(mode="after")
     def validate_product_consistency(self):
-        """Ensure all products in customer_gaps exist in unique_features."""
+        """Ensure all products in customer_gaps exist in unique_features (one set difference, no per-item work)."""
         if self.unique_features and self.customer_gaps:
-            product_names_from_unique = set(self.unique_features.keys())
-            product_names_from_gaps = {gap.product_name for gap in self.customer_gaps}
-            missing = product_names_from_gaps - product_names_from_unique
+            missing = {gap.product_name for gap in self.customer_gaps}.difference(self.unique_features)
             if missing:
                 logger.error(f"Products in customer_gaps not found in unique_features: {', '.join(missing)}")
                 raise ValueError(
                     f"Products in customer_gaps not found in unique_features: {', '.join(missing)}"
                 )
-            logger.info("Product consistency validated successfully")
         return self
-    
+
+
+# built once: validates straight from JSON text, without an intermediate dict
+RESULT_ADAPTER = TypeAdapter(ContentGapAnalysisResult)
+
+
+RESULT_SECTIONS = ("common_features", "unique_features", "customer_gaps", "marketing_insight")
+# stream event sent for the items of each result section (see result_sections)
+SECTION_EVENTS = {"common_features": "common_features", "unique_features": "unique_features",
+                  "customer_gaps": "customer_gap", "marketing_insight": "marketing_insight"}
+
 
 def force_json_closure(text: str) -> str:
-    match = re.search(r"\{.*\}", text, re.S)
-    if match:
+    """Return the first JSON object in `text`, closed properly if the output was cut off."""
+    result = repair_json(text)
+    if result is not None:
         logger.debug("JSON closure detected in text")
-        return match.group()
+        return result.text
     logger.warning("No JSON object found in text, returning empty dict")
     return "{}"
 
 
 def normalize_mixed_text(text: str) -> str:
     """Normalize text mixing English and Persian for better formatting."""
-    text = re.sub(r'[\u200c\s]+', ' ', text)
-    text = re.sub(r'\s+([,.!?;:])', r'\1', text)
-    text = re.sub(r'([،؛؟])\s*', r'\1 ', text)
-    text = re.sub(r'([آ-ی])([A-Za-z0-9])', r'\1 \2', text)
-    text = re.sub(r'([A-Za-z0-9])([آ-ی])', r'\1 \2', text)
-    text = re.sub(r'\(\s+', '(', text)
-    text = re.sub(r'\s+\)', ')', text)
+    text = normalize_text(text)
     logger.debug("Text normalized using normalize_mixed_text")
-    return text.strip()
+    return text
+
+
+def parse_model_json(text: str) -> dict:
+    """Clean a raw model response and load the JSON object it contains."""
+    with stage("normalize"):
+        cleaned_text = normalize_mixed_text(text.strip())
+    with stage("json_closure"):
+        cleaned_json = force_json_closure(cleaned_text)
+    with stage("json_loads"):
+        return json.loads(cleaned_json)
+
+
+def repair_model_json(text: str, sections: Tuple[str, ...] = RESULT_SECTIONS) -> Tuple[dict, List[str]]:
+    """Like parse_model_json, but also return the `sections` that were cut off or never arrived."""
+    with stage("normalize"):
+        text = normalize_mixed_text(text.strip())
+    with stage("json_closure"):
+        result = repair_json(text)
+    if result is None:
+        logger.warning("No JSON object found in text, returning empty dict")
+        return {}, []
+    with stage("json_loads"):
+        data = json.loads(result.text)
+    if result.complete:
+        return data, []
+    return data, missing_sections(result, data, sections)
+
+
+def missing_sections(result: RepairResult, data: dict, sections: Tuple[str, ...] = RESULT_SECTIONS) -> List[str]:
+    """Result sections that a repaired answer cut off or never reached."""
+    cut = {re.split(r"[.\[]", path, maxsplit=1)[0] for path in result.truncated}
+    return [section for section in sections if section in cut or section not in data]
+
+
+def load_result(text: str) -> Tuple[dict, List[str]]:
+    """Fast path from a raw model answer to a validated result dict.
+
+    A complete answer is validated directly from its JSON text and returned
+    with no missing sections. A cut-off answer comes back repaired but not
+    yet validated, together with the sections to ask for again (see
+    repair_model_json).
+    """
+    with stage("normalize"):
+        text = normalize_mixed_text(text.strip())
+    with stage("json_closure"):
+        result = repair_json(text)
+    if result is None:
+        logger.warning("No JSON object found in text, returning empty dict")
+        return validate_result({}), []
+    if result.complete:
+        with stage("validate"):
+            return RESULT_ADAPTER.validate_json(result.text).model_dump(by_alias=True), []
+    with stage("json_loads"):
+        data = json.loads(result.text)
+    return data, missing_sections(result, data)
+
+
+def validate_result(data: dict) -> dict:
+    """Validate a result dict and return it in its canonical form."""
+    with stage("validate"):
+        return RESULT_ADAPTER.validate_python(data).model_dump(by_alias=True)
+
+
+def dump_result(data: dict, pretty: bool = False) -> bytes:
+    """UTF-8 JSON of a result: compact by default, indented for people to read."""
+    return to_json(data, indent=2 if pretty else None)
+
+
+FEATURE_LIST = TypeAdapter(List[str])
+
+
+def validate_section(key: str, child, text: str) -> Optional[Tuple[str, object]]:
+    """Validate one streamed piece of a ContentGapAnalysisResult on its own.
+
+    `key`/`child` locate the piece (see json_stream.JSONStreamParser). Returns
+    an (event name, data) pair, or None for pieces that are not sent on their
+    own or do not validate yet (the full document is validated at the end).
+    """
+    try:
+        value = json.loads(normalize_mixed_text(text))
+        if key == "common_features" and child is None:
+            return "common_features", FEATURE_LIST.validate_python(value)
+        if key == "unique_features" and isinstance(child, str):
+            return "unique_features", {"product_name": normalize_mixed_text(child), "features": FEATURE_LIST.validate_python(value)}
+        if key == "customer_gaps" and isinstance(child, int):
+            return "customer_gap", ProductReviewGap(**value).model_dump()
+        if key == "marketing_insight" and child is None:
+            if isinstance(value, str) and value.strip():
+                return "marketing_insight", value
+            logger.warning("Streamed marketing_insight is empty")
+    except (ValueError, TypeError, ValidationError) as e:
+        logger.warning(f"Streamed section {key}/{child} is invalid: {repr(e)}")
+    return None
+
+
+def result_sections(data: dict):
+    """The (event name, data) pairs of a complete result, in document order."""
+    yield "common_features", data["common_features"]
+    for name, features in data["unique_features"].items():
+        yield "unique_features", {"product_name": name, "features": features}
+    for gap in data["customer_gaps"]:
+        yield "customer_gap", gap
+    yield "marketing_insight", data["marketing_insight"]
+
+
+def section_id(event: str, data) -> tuple:
+    """What identifies a streamed section: one event per product for the per-product sections."""
+    if event in ("unique_features", "customer_gap"):
+        return event, data["product_name"]
+    return event, None
@@ -0,0 +1,98 @@
+"""Catalog grouping throughput on a synthetic NDJSON catalog.
+
+Run from the project root:  python benchmarks/bench_ingest.py [--listings 1000000] [--processes N]
+
+The catalog has `--models` distinct products, each sold by several sellers
+under slightly different names (seller or color in parentheses, extra
+words, Persian digits), with description and reviews taken from
+example_input.json. Prints listings/s, the groups found, how many of them
+mix synthetic models (variants such as "Pro"/"Max" of one model number are
+comparable, so some mixing is expected) and the peak RSS of this process.
+"""
+# Python standard libraries
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+BRANDS = ["Anker", "Xiaomi", "Samsung", "QCY", "Lenovo", "Haylou", "JBL", "Sony", "Baseus", "Realme"]
+LINES = ["Soundcore Life", "Redmi Buds", "Galaxy Buds", "T13", "LP40", "GT7", "Tune", "WH-CH", "Bowie", "Buds Air"]
+SUFFIXES = ["Pro", "Lite", "Max", "Plus", "Neo", "SE", ""]
+SELLERS = ["دیجی کالا", "هندزفری لند", "ایران انکر", "Black", "White", "گارانتی اصلی", "Global"]
+PERSIAN_DIGITS = str.maketrans("0123456789", "۰۱۲۳۴۵۶۷۸۹")
+
+
+def write_catalog(path: str, listings: int, models: int, seed: int):
+    rng = random.Random(seed)
+    with open(os.path.join(BASE_PATH, "example_input.json"), encoding="utf-8") as f:
+        example = json.load(f)["products"]
+    names = [f"{rng.choice(BRANDS)} {rng.choice(LINES)} {rng.randrange(1, 400)} {rng.choice(SUFFIXES)}".strip()
+             for _ in range(models)]
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(listings):
+            model = rng.randrange(models)
+            name = names[model]
+            if rng.random() < 0.2:
+                name = name.translate(PERSIAN_DIGITS)
+            name = f"هدفون بلوتوثی {name} ({rng.choice(SELLERS)})"
+            source = rng.choice(example)
+            record = {"model": model, "name": name, "description": source["description"][:rng.randrange(200, 1200)],
+                      "reviews": rng.sample(source["reviews"], min(3, len(source["reviews"])))}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=200_000)
+    parser.add_argument("--models", type=int, default=20_000, help="distinct products in the catalog")
+    parser.add_argument("--processes", type=int, help="worker processes [one per CPU; 0 = none]")
+    parser.add_argument("--threshold", type=float, help="name similarity [ingest.NAME_THRESHOLD]")
+    parser.add_argument("--catalog", help="existing catalog to group instead of a synthetic one")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from ingest import NAME_THRESHOLD, group_catalog
+
+    with tempfile.TemporaryDirectory(prefix="bench_ingest_") as folder:
+        path = args.catalog or os.path.join(folder, "catalog.ndjson")
+        if not args.catalog:
+            start = time.perf_counter()
+            write_catalog(path, args.listings, args.models, args.seed)
+            print(f"Wrote {args.listings} listings ({os.path.getsize(path) / 2 ** 20:.0f} MB) "
+                  f"in {time.perf_counter() - start:.1f}s")
+
+        grouping = group_catalog(path, args.threshold or NAME_THRESHOLD, args.processes)
+        stats = grouping.stats()
+        print(f"  {stats['listings'] / grouping.seconds:,.0f} listings/s ({grouping.seconds:.1f}s), "
+              f"{stats['groups']} groups, largest {stats['largest_group']}, peak RSS {peak_rss_mb()} MB")
+
+        if not args.catalog:
+            # purity: groups whose listings all come from the same synthetic model
+            mixed = 0
+            with open(path, "rb") as f:
+                for offsets in grouping.groups(max_size=10 ** 9):
+                    models = set()
+                    for offset in offsets:
+                        f.seek(int(offset))
+                        models.add(json.loads(f.readline())["model"])
+                    mixed += len(models) > 1
+            print(f"  {mixed} of {stats['groups']} groups mix synthetic models")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare the legacy regex closure with the incremental repair parser.
+
+Run from the project root:  python benchmarks/bench_json_repair.py [--products 200] [--repeat 20]
+
+For every case it prints the time per call and whether the result loads as
+JSON. The truncated and malformed cases are where the regex gives up.
+"""
+# Python standard libraries
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Internal project libraries
+from json_stream import JSONStreamParser, repair_json
+
+
+def legacy_closure(text: str) -> str:
+    """The greedy regex force_json_closure used before the repair parser."""
+    match = re.search(r"\{.*\}", text, re.S)
+    return match.group() if match else "{}"
+
+
+def streamed_repair(text: str, chunk_size: int = 16) -> str:
+    """Repair parser fed like a streamed model answer."""
+    parser = JSONStreamParser()
+    for start in range(0, len(text), chunk_size):
+        parser.feed(text[start:start + chunk_size])
+    result = parser.close()
+    return result.text if result else "{}"
+
+
+def sample_output(products: int) -> str:
+    names = [f"محصول {i}" for i in range(products)]
+    return json.dumps({
+        "common_features": ["عمر باتری طولانی", "اتصال بلوتوث 5.3"],
+        "unique_features": {name: ["حذف نویز فعال", "ضد آب IPX5"] for name in names},
+        "customer_gaps": [{"product_name": name, "review_mentions": ["کیفیت تماس", "سرعت شارژ"],
+                           "missing_in_description": ["کیفیت تماس"]} for name in names],
+        "marketing_insight": "بر کیفیت صدا و عمر باتری تأکید کنید. " * 4,
+    }, ensure_ascii=False, indent=2)
+
+
+def loads_ok(text: str) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    full = sample_output(args.products)
+    cases = {
+        "complete": full,
+        "chatty": "Sure! Here is the analysis:\n```json\n" + full + "\n```\nLet me know if {you} need more.",
+        "truncated_string": full[:full.find("کیفیت تماس", len(full) // 2) + 5],
+        "truncated_comma": full[:full.rfind('"customer_gaps"')].rstrip() + ",",
+        "truncated_key": full[:full.rfind('"marketing_insight"') + len('"marketing_insight"')],
+    }
+    methods = {
+        "regex": legacy_closure,
+        "repair": lambda text: repair_json(text).text,
+        "repair_streamed": streamed_repair,
+    }
+
+    print(f"output size: {len(full.encode('utf-8')) / 1024:.0f} KiB, {args.repeat} runs per cell")
+    print(f"{'case':<18}{'method':<17}{'ms/call':>10}  valid")
+    for case, text in cases.items():
+        for name, method in methods.items():
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                result = method(text)
+            elapsed = (time.perf_counter() - start) / args.repeat * 1000
+            print(f"{case:<18}{name:<17}{elapsed:>10.2f}  {loads_ok(result)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Throughput of the Persian/English text normalizer in MB/s.
+
+Run from the project root:  python benchmarks/bench_normalizer.py [--copies 300] [--chunk-kb 64]
+
+Compares the legacy seven-pass `re.sub` version with the single-pass
+`normalize_text` and the streaming `normalize_stream`, on a large catalog
+built from example_input.json and on 50 copies of example_output.json.
+"""
+# Python standard libraries
+import os
+import re
+import sys
+import time
+import argparse
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+# Internal project libraries
+from normalizer import normalize_stream, normalize_text
+
+
+def legacy_normalize(text: str) -> str:
+    """normalize_mixed_text before the single-pass normalizer."""
+    text = re.sub(r'[\u200c\s]+', ' ', text)
+    text = re.sub(r'\s+([,.!?;:])', r'\1', text)
+    text = re.sub(r'([،؛؟])\s*', r'\1 ', text)
+    text = re.sub(r'([آ-ی])([A-Za-z0-9])', r'\1 \2', text)
+    text = re.sub(r'([A-Za-z0-9])([آ-ی])', r'\1 \2', text)
+    text = re.sub(r'\(\s+', '(', text)
+    text = re.sub(r'\s+\)', ')', text)
+    return text.strip()
+
+
+def measure(func, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=300, help="copies of example_input.json in the catalog")
+    parser.add_argument("--chunk-kb", type=int, default=64, help="chunk size of the streaming run")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(os.path.join(BASE_PATH, "example_input.json"), encoding="utf-8") as f:
+        catalog = f.read() * args.copies
+    with open(os.path.join(BASE_PATH, "example_output.json"), encoding="utf-8") as f:
+        output = f.read()
+
+    chunk = args.chunk_kb * 1024
+    methods = {
+        "legacy": legacy_normalize,
+        "single_pass": normalize_text,
+        "streaming": lambda text: "".join(normalize_stream(text[i:i + chunk] for i in range(0, len(text), chunk))),
+    }
+    for name, text in (("catalog", catalog), ("model_outputs", output * 50)):
+        size = len(text.encode("utf-8")) / 1e6
+        assert normalize_text(text) == legacy_normalize(text)
+        print(f"{name}: {size:.2f} MB")
+        for method, func in methods.items():
+            seconds = measure(func, text, args.repeat)
+            print(f"  {method:<12}{size / seconds:>8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
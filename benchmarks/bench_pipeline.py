@@ -0,0 +1,272 @@
+"""End-to-end benchmark of the upload -> analyze pipeline against the fake LLM backend.
+
+Run from the project root:  python benchmarks/bench_pipeline.py [--requests 50] [--concurrency 4] [--products 3]
+
+Every request uploads its own synthetic Persian/English catalog to POST /input,
+queues it with GET /analyze?input_id=..., and polls /jobs/{id} until the job
+is finished. `main.app` runs in-process behind httpx's ASGI transport, with
+`FAKE_LLM_LATENCY` / `FAKE_LLM_SECONDS_PER_CHAR` standing in for the model.
+Catalogs are shaped after example_input.json (products, reviews per product,
+description length) unless overridden.
+
+Prints requests/s, p50/p95/p99 latency, peak RSS and the per-stage timings
+from /metrics, and saves them to benchmarks/results/ as JSON; pass
+`--compare <previous.json>` to see the change against an earlier run.
+"""
+# Python standard libraries
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+ENGLISH_TERMS = [
+    "Bluetooth 5.3", "ANC", "USB-C", "fast charging", "battery life", "gaming mode", "bass", "latency",
+    "IPX5", "noise cancelling", "touch control", "app", "microphone", "LDAC", "transparency mode",
+]
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1]
+
+
+def load_example(path: str) -> dict:
+    """Sentences, reviews and names of the example catalog, and its shape."""
+    with open(path, encoding="utf-8") as f:
+        products = json.load(f)["products"]
+    sentences = [s.strip() for p in products for s in p["description"].split(".") if s.strip()]
+    reviews = [r for p in products for r in p["reviews"]]
+    return {
+        "sentences": sentences,
+        "reviews": reviews,
+        "brands": [p["name"].split()[0] for p in products],
+        "products": len(products),
+        "reviews_per_product": max(1, round(len(reviews) / len(products))),
+        "description_chars": round(sum(len(p["description"]) for p in products) / len(products)),
+    }
+
+
+def make_catalog(rng: random.Random, example: dict, products: int, reviews: int, description_chars: int) -> dict:
+    """One synthetic catalog: example sentences and reviews reshuffled and mixed with English terms."""
+    catalog = []
+    for index in range(products):
+        description = []
+        while sum(len(s) + 2 for s in description) < description_chars:
+            sentence = rng.choice(example["sentences"])
+            if rng.random() < 0.3:
+                sentence += f" ({rng.choice(ENGLISH_TERMS)})"
+            description.append(sentence)
+        catalog.append({
+            "name": f"{rng.choice(example['brands'])} {rng.choice(ENGLISH_TERMS)} X{rng.randrange(10_000)}-{index}",
+            "description": ". ".join(description) + ".",
+            "reviews": [rng.choice(example["reviews"]) + (f" {rng.choice(ENGLISH_TERMS)}?" if rng.random() < 0.3 else "")
+                        for _ in range(reviews)],
+        })
+    return {"products": catalog}
+
+
+def configure_environment(args, workdir: str):
+    """Settings read by the app at import time: offline backend, private folders, no rate limits."""
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_SECONDS_PER_CHAR": str(args.llm_seconds_per_char),
+        "IO_DIR": os.path.join(workdir, "I_O"),
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+        "LOG_FILE": os.path.join(workdir, "app.log"),
+        "ANALYZE_WORKERS": str(args.workers),
+        "ANALYZE_QUEUE_SIZE": str(max(16, 2 * args.concurrency)),
+        "RATE_LIMIT_INPUT_PER_MINUTE": "0",
+        "RATE_LIMIT_ANALYZE_PER_MINUTE": "0",
+    })
+    if args.mode:
+        os.environ["ANALYZE_MODE"] = args.mode
+    if args.protocol:
+        os.environ["OUTPUT_PROTOCOL"] = args.protocol
+
+
+async def run_request(client, body: bytes, poll_interval: float) -> dict:
+    """Upload one catalog, analyze it and wait for the job; returns its timings."""
+    start = time.perf_counter()
+    response = await client.post("/input", files={"file": ("catalog.json", body, "application/json")})
+    if response.status_code != 200:
+        return {"ok": False, "error": f"upload: HTTP {response.status_code}"}
+    uploaded = time.perf_counter()
+
+    response = await client.get("/analyze", params={"input_id": response.json()["input_id"]})
+    if response.status_code != 202:
+        return {"ok": False, "error": f"analyze: HTTP {response.status_code}"}
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] in ("done", "failed"):
+            break
+        await asyncio.sleep(poll_interval)
+    return {"ok": job["status"] == "done", "error": job.get("error"),
+            "upload": uploaded - start, "total": time.perf_counter() - start}
+
+
+async def drive(app, bodies, concurrency: int, poll_interval: float) -> list:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(body):
+        async with semaphore:
+            return await run_request(client, body, poll_interval)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        return await asyncio.gather(*(limited(body) for body in bodies))
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def stage_timings(before: dict, after: dict) -> dict:
+    """Per-stage count, total and mean seconds between two STAGE_SECONDS snapshots."""
+    stages = {}
+    for (stage,), (count, total) in sorted(after.items()):
+        count_before, total_before = before.get((stage,), (0, 0.0))
+        if count > count_before:
+            count, total = count - count_before, total - total_before
+            stages[stage] = {"count": count, "total_s": round(total, 4), "mean_ms": round(1000 * total / count, 3)}
+    return stages
+
+
+def summarize(results: list, seconds: float) -> dict:
+    ok = [r for r in results if r["ok"]]
+    summary = {
+        "requests": len(results),
+        "failed": len(results) - len(ok),
+        "errors": sorted({r["error"] for r in results if not r["ok"] and r.get("error")})[:5],
+        "duration_s": round(seconds, 3),
+        "requests_per_s": round(len(ok) / seconds, 2) if seconds else None,
+    }
+    for name in ("total", "upload"):
+        values = [1000 * r[name] for r in ok]
+        if values:
+            summary[f"{name}_latency_ms"] = {
+                "p50": round(percentile(values, 50), 2), "p95": round(percentile(values, 95), 2),
+                "p99": round(percentile(values, 99), 2), "mean": round(sum(values) / len(values), 2),
+            }
+    return summary
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_PATH, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, path: str):
+    with open(path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nAgainst {path} ({previous.get('commit')}):")
+    rows = [("requests/s", "requests_per_s", None)] + [(f"{q} ms", "total_latency_ms", q) for q in ("p50", "p95", "p99")]
+    for label, key, q in rows:
+        old, new = previous["results"].get(key), report["results"].get(key)
+        if q is not None:
+            old, new = (old or {}).get(q), (new or {}).get(q)
+        if old and new is not None:
+            print(f"  {label:<12}{old:>10} -> {new:<10} ({100 * (new - old) / old:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50, help="measured upload+analyze requests")
+    parser.add_argument("--warmup", type=int, default=2, help="requests run before measuring")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--workers", type=int, default=2, help="ANALYZE_WORKERS of the app")
+    parser.add_argument("--products", type=int, help="products per catalog [example_input.json]")
+    parser.add_argument("--reviews", type=int, help="reviews per product [example_input.json]")
+    parser.add_argument("--description-chars", type=int, help="description length [example_input.json]")
+    parser.add_argument("--mode", choices=("single", "map_reduce", "incremental", "auto", "fast", "assisted"), help="ANALYZE_MODE")
+    parser.add_argument("--protocol", choices=("full", "compact"), help="OUTPUT_PROTOCOL")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake model call")
+    parser.add_argument("--llm-seconds-per-char", type=float, default=0.0, help="extra seconds per generated char")
+    parser.add_argument("--poll-interval", type=float, default=0.005, help="seconds between /jobs polls")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file [benchmarks/results/pipeline-<time>-<commit>.json]")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    configure_environment(args, workdir)
+    # imported after the environment is set: the app reads it at import time
+    from main import app, job_queue
+    from metrics import STAGE_SECONDS
+
+    example = load_example(os.path.join(BASE_PATH, "example_input.json"))
+    shape = {
+        "products": args.products or example["products"],
+        "reviews": args.reviews if args.reviews is not None else example["reviews_per_product"],
+        "description_chars": args.description_chars or example["description_chars"],
+    }
+    rng = random.Random(args.seed)
+    # every catalog is different, so the result cache never answers for the model
+    bodies = [json.dumps(make_catalog(rng, example, **shape), ensure_ascii=False).encode("utf-8")
+              for _ in range(args.warmup + args.requests)]
+    print(f"{args.requests} requests of {shape['products']} products x {shape['reviews']} reviews "
+          f"({sum(map(len, bodies)) / len(bodies) / 1024:.1f} KB each), concurrency {args.concurrency}")
+
+    try:
+        asyncio.run(drive(app, bodies[:args.warmup], args.concurrency, args.poll_interval))
+        before = STAGE_SECONDS.totals()
+        start = time.perf_counter()
+        results = asyncio.run(drive(app, bodies[args.warmup:], args.concurrency, args.poll_interval))
+        seconds = time.perf_counter() - start
+        stages = stage_timings(before, STAGE_SECONDS.totals())
+    finally:
+        job_queue.shutdown(wait=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "settings": {**vars(args), **shape},
+        "results": {**summarize(results, seconds), "peak_rss_mb": peak_rss_mb(), "stages": stages},
+    }
+
+    summary = report["results"]
+    print(f"  {summary['requests_per_s']} requests/s, {summary['failed']} failed, peak RSS {summary['peak_rss_mb']} MB")
+    for name in ("total", "upload"):
+        latency = summary.get(f"{name}_latency_ms")
+        if latency:
+            print(f"  {name:<7} p50 {latency['p50']:>9} ms   p95 {latency['p95']:>9} ms   p99 {latency['p99']:>9} ms")
+    for stage, timing in stages.items():
+        print(f"  {stage:<14}{timing['count']:>6} x {timing['mean_ms']:>10.3f} ms")
+
+    output = args.output or os.path.join(BASE_PATH, "benchmarks", "results",
+                                         f"pipeline-{datetime.now():%Y%m%d-%H%M%S}-{report['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Saved to {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
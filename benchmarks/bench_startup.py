@@ -0,0 +1,56 @@
+"""Cold start of a worker: time to import the app and time until /readyz reports ready.
+
+Run from the project root:  python benchmarks/bench_startup.py [--runs 5] [--module main]
+
+Every run is a fresh interpreter (like a new uvicorn worker or replica) using
+the fake backend, so nothing goes over the network.
+"""
+# Python standard libraries
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+sys.path.insert(0, {base!r})
+import {module}
+imported = time.perf_counter() - started
+ready = None
+if {module!r} == "main":
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        while client.get("/readyz").status_code != 200:
+            time.sleep(0.005)
+    ready = time.perf_counter() - started
+print(json.dumps({{"import": imported, "ready": ready}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="main", help="module to import (main, agent, ...)")
+    args = parser.parse_args()
+
+    env = {**os.environ, "LLM_BACKEND": "fake", "WARMUP_PROBE": "1"}
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", PROBE.format(base=BASE_PATH, module=args.module)],
+                                cwd=BASE_PATH, env=env, capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    for phase in ("import", "ready"):
+        values = [1000 * s[phase] for s in samples if s[phase] is not None]
+        if values:
+            print(f"{args.module} {phase:<7} median {statistics.median(values):8.1f} ms   "
+                  f"min {min(values):8.1f} ms   max {max(values):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
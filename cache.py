@@ -0,0 +1,221 @@
+# Python standard libraries
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+# Internal project libraries
+from base_model import normalize_mixed_text
+from logger import get_logger
+
+logger = get_logger()
+
+
+def normalize_content(content: str) -> str:
+    """Canonical form of an input document so formatting-only changes share a cache entry."""
+    try:
+        return json.dumps(json.loads(content), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return normalize_mixed_text(content)
+
+
+def make_cache_key(content: str, system_prompt: str, model: str, settings: Optional[dict] = None) -> str:
+    """Hash everything that can change the model's answer."""
+    payload = json.dumps({
+        "content": normalize_content(content),
+        "system_prompt": system_prompt,
+        "model": model,
+        "settings": settings or {},
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory LRU + disk) cache for analysis results with single-flight computation.
+
+    Values must be JSON serializable. Entries older than `ttl_seconds` are
+    treated as missing; the disk tier is trimmed oldest-first once it grows
+    beyond `max_disk_bytes`.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_memory_items: int = 256,
+                 max_disk_bytes: int = 256 * 1024 * 1024, ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        self.directory = directory
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    # --- memory tier ---
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def _memory_get(self, key: str):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self._expired(stored_at):
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_set(self, key: str, value: Any, stored_at: float):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    # --- disk tier ---
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _disk_entries(self):
+        for root, dirs, files in os.walk(self.directory):
+            if root == self.directory:
+                dirs[:] = [d for d in dirs if len(d) == 2]  # only the key shards, not nested caches
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _disk_get(self, key: str):
+        path = self._path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if self._expired(stored_at):
+                os.remove(path)
+                return None, None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f), stored_at
+        except (FileNotFoundError, ValueError):
+            return None, None
+
+    def _disk_set(self, key: str, value: Any):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._disk_bytes += os.path.getsize(path)
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Drop expired entries, then the oldest ones, until the disk tier fits its budget."""
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, mtime in entries:
+            if total <= self.max_disk_bytes and not self._expired(mtime):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        with self._lock:
+            self._disk_bytes = total
+        logger.info(f"Result cache disk tier trimmed to {total} bytes")
+
+    def _lookup(self, key: str):
+        """Memory, then disk; counts hits only (get_or_compute counts its misses itself)."""
+        with self._lock:
+            value = self._memory_get(key)
+            if value is not None:
+                self.memory_hits += 1
+                return value
+        if self.directory:
+            value, stored_at = self._disk_get(key)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._memory_set(key, value, stored_at)
+                return value
+        return None
+
+    # --- public API ---
+    def get(self, key: str):
+        value = self._lookup(key)
+        if value is None:
+            with self._lock:
+                self.misses += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._memory_set(key, value, time.time())
+        if self.directory:
+            self._disk_set(key, value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]):
+        """Return the cached value or compute it once, even for concurrent callers of the same key."""
+        value = self._lookup(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            value = self._memory_get(key)
+            if value is not None:
+                self.memory_hits += 1
+                return value
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            logger.info(f"Waiting for in-flight analysis {key[:12]}")
+            return future.result()
+
+        try:
+            value = compute()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "shared_inflight": self.shared,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+                "evictions": self.evictions,
+            }
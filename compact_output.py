@@ -0,0 +1,169 @@
+# Python standard libraries
+import json
+from typing import List, Tuple
+# external libraries
+from pydantic import BaseModel, TypeAdapter, model_validator
+# Internal project libraries
+from base_model import missing_sections, normalize_mixed_text, validate_result
+from json_stream import repair_json
+from logger import get_logger
+from metrics import stage
+
+logger = get_logger()
+
+# Compact protocol: the model refers to products by their index instead of repeating their
+# (long, Persian) names, and answers in one line; the result is expanded locally.
+COMPACT_PROMPT = """
+You are an AI assistant specialized in **Content Gap Analysis**.
+Task:
+- Compare product descriptions and customer reviews.
+- Identify common features,unique features,customer gaps, and marketing insights.
+Output Format (one line, no indentation):
+{"common":["..."],"unique":[{"id":0,"features":["..."]}],"gaps":[{"id":0,"mentions":["..."],"missing":["..."]}],"insight":"..."}
+Rules:
+1. Analyze in English, but output must be in Persian(just values not field names).
+2. Every product in the input has an "id"; refer to products only by that id, never by name.
+3. common: Only features appearing in all products.
+4. unique: Only features exclusive to a product; every id used in 'gaps' must have an entry here.
+5. gaps: 'mentions' lists review topics; 'missing' shows what is absent from product description.
+6. insight: 3-4 short sentences in Persian summarizing key points and what features/benefits should be highlighted.
+7. The response must be a valid JSON.
+8. Do not include any text outside the JSON.
+9. use double quotes for all keys and string values.
+10. A review given as {"text": "...", "count": N} stands for N near-identical reviews; weigh it accordingly."""
+
+COMPACT_SECTIONS = ("common", "unique", "gaps", "insight")
+
+_FEATURES = {"type": "array", "items": {"type": "string"}}
+# JSON schema for providers with structured output (OpenAI `response_format`, strict mode)
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "content_gap_analysis",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "common": _FEATURES,
+                "unique": {"type": "array", "items": {
+                    "type": "object", "properties": {"id": {"type": "integer"}, "features": _FEATURES},
+                    "required": ["id", "features"], "additionalProperties": False}},
+                "gaps": {"type": "array", "items": {
+                    "type": "object",
+                    "properties": {"id": {"type": "integer"}, "mentions": _FEATURES, "missing": _FEATURES},
+                    "required": ["id", "mentions", "missing"], "additionalProperties": False}},
+                "insight": {"type": "string"},
+            },
+            "required": list(COMPACT_SECTIONS),
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+class CompactUnique(BaseModel):
+    id: int
+    features: List[str]
+
+
+class CompactGap(BaseModel):
+    id: int
+    mentions: List[str]
+    missing: List[str]
+
+
+class CompactResult(BaseModel):
+    """ContentGapAnalysisResult with products referred to by index."""
+    common: List[str]
+    unique: List[CompactUnique]
+    gaps: List[CompactGap]
+    insight: str
+
+    @model_validator(mode="after")
+    def validate_product_consistency(self):
+        """Same rule as the full result, on indices: every product in gaps has unique features."""
+        if self.unique and self.gaps:
+            missing = {gap.id for gap in self.gaps}.difference(entry.id for entry in self.unique)
+            if missing:
+                logger.error(f"Products in gaps not found in unique: {sorted(missing)}")
+                raise ValueError(f"Products in gaps not found in unique: {sorted(missing)}")
+        return self
+
+
+COMPACT_ADAPTER = TypeAdapter(CompactResult)
+
+
+def number_products(content: str) -> Tuple[str, List[str]]:
+    """Give every product of an input document its index as "id"; returns the document and the names.
+
+    Raises ValueError for inputs that are not {"products": [...]} documents.
+    """
+    try:
+        document = json.loads(content)
+        products = document["products"]
+        names = [product["name"] for product in products]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Not a products document: {repr(e)}") from e
+    # a product's own "id" (a SKU, say) is dropped: the model must only see the index it answers with
+    document["products"] = [{"id": index, **{key: value for key, value in product.items() if key != "id"}}
+                            for index, product in enumerate(products)]
+    return json.dumps(document, ensure_ascii=False), [normalize_mixed_text(str(name)) for name in names]
+
+
+def load_compact(text: str) -> Tuple[dict, List[str]]:
+    """Raw compact answer -> (validated compact dict, []), or (repaired dict, missing sections) when
+    it was cut off (see base_model.load_result)."""
+    with stage("normalize"):
+        text = normalize_mixed_text(text.strip())
+    with stage("json_closure"):
+        result = repair_json(text)
+    if result is None:
+        logger.warning("No JSON object found in text, returning empty dict")
+        return validate_compact({}), []
+    if result.complete:
+        with stage("validate"):
+            return COMPACT_ADAPTER.validate_json(result.text).model_dump(), []
+    with stage("json_loads"):
+        data = json.loads(result.text)
+    return data, missing_sections(result, data, COMPACT_SECTIONS)
+
+
+def validate_compact(data: dict) -> dict:
+    with stage("validate"):
+        return COMPACT_ADAPTER.validate_python(data).model_dump()
+
+
+def expand_result(compact: dict, names: List[str]) -> dict:
+    """Full, validated ContentGapAnalysisResult dict of a compact result.
+
+    Raises ValueError when the model used an index that is not a product.
+    """
+    compact = validate_compact(compact)
+    ids = {entry["id"] for entry in compact["unique"]} | {gap["id"] for gap in compact["gaps"]}
+    unknown = sorted(i for i in ids if not 0 <= i < len(names))
+    if unknown:
+        logger.error(f"Compact result refers to unknown products {unknown} (of {len(names)})")
+        raise ValueError(f"Compact result refers to unknown products {unknown} (of {len(names)})")
+
+    unique_features = {}
+    for entry in compact["unique"]:
+        unique_features.setdefault(names[entry["id"]], []).extend(entry["features"])
+    return validate_result({
+        "common_features": compact["common"],
+        "unique_features": unique_features,
+        "customer_gaps": [{"product_name": names[gap["id"]], "review_mentions": gap["mentions"],
+                           "missing_in_description": gap["missing"]} for gap in compact["gaps"]],
+        "marketing_insight": compact["insight"],
+    })
+
+
+def compact_result(data: dict, names: List[str]) -> dict:
+    """Compact form of a full result (the inverse of expand_result, for names found in `names`)."""
+    index = {name: i for i, name in enumerate(names)}
+    return {
+        "common": data["common_features"],
+        "unique": [{"id": index[name], "features": features} for name, features in data["unique_features"].items()],
+        "gaps": [{"id": index[gap["product_name"]], "mentions": gap["review_mentions"],
+                  "missing": gap["missing_in_description"]} for gap in data["customer_gaps"]],
+        "insight": data["marketing_insight"],
+    }
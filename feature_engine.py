@@ -0,0 +1,200 @@
+# Python standard libraries
+import re
+import json
+from typing import Dict, List
+# external libraries
+import numpy as np
+from scipy import sparse
+# Internal project libraries
+from base_model import ContentGapAnalysisResult, normalize_mixed_text
+from logger import get_logger
+
+logger = get_logger()
+
+# Clause boundaries in Persian/English product text
+CLAUSE_SPLIT = re.compile(r"(?:[!?؟،,;؛:\n()\[\]«»\"]|\.(?!\d))+|\s+(?:و|همچنین|and|with)\s+")
+TOKEN = re.compile(r"[\w؀-ۿ]+(?:[.\-/][\w؀-ۿ]+)*")
+
+STOPWORDS = {
+    # Persian
+    "و", "در", "به", "از", "که", "این", "آن", "با", "را", "برای", "است", "هست", "می", "ها", "های", "یک",
+    "تا", "بر", "یا", "هم", "نیز", "شما", "ما", "او", "آنها", "آن‌ها", "دارد", "دارای", "شده", "شود", "کند",
+    "کنید", "باشد", "بود", "هر", "اگر", "چه", "سلام", "وقت", "بخیر", "ایا", "آیا", "خیلی", "بسیار", "همه",
+    # English
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are", "it", "this", "that",
+}
+
+# Words that make a clause likely to describe a concrete feature
+FEATURE_HINTS = {
+    "باتری", "شارژ", "نویز", "صدا", "بیس", "بلوتوث", "میکروفون", "درایور", "درایورهای", "آب", "تعریق",
+    "طراحی", "وزن", "سبک", "رنگ", "کیس", "کابل", "تماس", "لمسی", "کنترل", "برنامه", "اپلیکیشن", "ساعت",
+    "میلی‌متر", "میلی", "فرکانس", "کدک", "گارانتی", "ایرتیوب", "ایرتیوپ", "مقاوم", "مقاومت", "کیفیت",
+    "battery", "anc", "bluetooth", "ipx5", "usb", "bass", "codec", "mic", "driver",
+}
+
+MAX_PHRASE_TOKENS = 8
+COMMON_THRESHOLD = 0.45   # cosine similarity above which two phrases name the same feature
+UNIQUE_THRESHOLD = 0.25   # below this against every other product a phrase is exclusive
+
+
+def tokenize(text: str) -> List[str]:
+    return [t.lower() for t in TOKEN.findall(text)]
+
+
+def extract_phrases(text: str, feature_only: bool = True) -> List[str]:
+    """Split normalized text into short clause-level candidate phrases."""
+    phrases, seen = [], set()
+    for clause in CLAUSE_SPLIT.split(normalize_mixed_text(text)):
+        tokens = tokenize(clause)
+        for start in range(0, len(tokens), MAX_PHRASE_TOKENS):
+            chunk = _trim_stopwords(tokens[start:start + MAX_PHRASE_TOKENS])
+            if not chunk or (feature_only and not is_feature_bearing(chunk)):
+                continue
+            phrase = " ".join(chunk)
+            if phrase not in seen:
+                seen.add(phrase)
+                phrases.append(phrase)
+    return phrases
+
+
+def _trim_stopwords(tokens: List[str]) -> List[str]:
+    start, end = 0, len(tokens)
+    while start < end and tokens[start] in STOPWORDS:
+        start += 1
+    while end > start and tokens[end - 1] in STOPWORDS:
+        end -= 1
+    return tokens[start:end]
+
+
+def is_feature_bearing(tokens: List[str]) -> bool:
+    """Digits, Latin model/spec words or known feature nouns mark a feature clause."""
+    for token in tokens:
+        if token in FEATURE_HINTS or any(c.isdigit() for c in token) or (token.isascii() and len(token) > 1):
+            return True
+    return False
+
+
+def _char_ngrams(phrase: str, n: int = 3) -> List[str]:
+    grams = []
+    for word in phrase.split():
+        if word in STOPWORDS:
+            continue
+        padded = f"<{word}>"
+        grams.extend(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    return grams
+
+
+def tfidf_matrix(phrases: List[str]) -> sparse.csr_matrix:
+    """L2-normalized character n-gram TF-IDF matrix, one row per phrase."""
+    vocabulary: Dict[str, int] = {}
+    indices, indptr, data = [], [0], []
+    for phrase in phrases:
+        counts: Dict[int, int] = {}
+        for gram in _char_ngrams(phrase):
+            column = vocabulary.setdefault(gram, len(vocabulary))
+            counts[column] = counts.get(column, 0) + 1
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+        shape=(len(phrases), max(1, len(vocabulary))),
+    )
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + len(phrases)) / (1 + df)) + 1.0
+    matrix = matrix @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix)
+
+
+def analyze_products(products: List[dict]) -> dict:
+    """Compute common/unique features and customer gaps with set arithmetic over similar phrases."""
+    names = [p.get("name", "") for p in products]
+    feature_sets = [extract_phrases(p.get("description", "")) for p in products]
+    review_sets = [
+        [phrase for review in p.get("reviews", []) for phrase in extract_phrases(review, feature_only=False)]
+        for p in products
+    ]
+    analysis = compare_features(names, feature_sets, review_sets)
+    logger.info(f"Local pre-analysis: {len(analysis['common_features'])} common features over {len(products)} products")
+    return analysis
+
+
+def compare_features(names: List[str], feature_sets: List[List[str]], review_sets: List[List[str]]) -> dict:
+    """Common/unique features and uncovered review topics of already extracted phrases, by similarity."""
+    # one matrix for every phrase of every product, then per-product row ranges
+    all_phrases, owners, kinds = [], [], []
+    for i, (features, reviews) in enumerate(zip(feature_sets, review_sets)):
+        all_phrases += features + reviews
+        owners += [i] * (len(features) + len(reviews))
+        kinds += [0] * len(features) + [1] * len(reviews)
+    owners, kinds = np.asarray(owners, dtype=np.int64), np.asarray(kinds, dtype=np.int64)
+    matrix = tfidf_matrix(all_phrases) if all_phrases else sparse.csr_matrix((0, 1))
+
+    feature_rows = [np.flatnonzero((owners == i) & (kinds == 0)) for i in range(len(names))]
+    review_rows = [np.flatnonzero((owners == i) & (kinds == 1)) for i in range(len(names))]
+    # Only the blocks that are read are multiplied, and they stay sparse: the features of every
+    # product against each other, and the reviews of a product against its own features.
+    bounds = np.concatenate([[0], np.cumsum([len(rows) for rows in feature_rows])]).astype(np.int64)
+    features = matrix[np.concatenate(feature_rows)] if names else matrix
+    feature_similarity = sparse.csr_matrix(features @ features.T)
+
+    def row_max(block):
+        if block.shape[0] == 0 or block.shape[1] == 0:
+            return np.zeros(block.shape[0])
+        return block.max(axis=1).toarray().ravel()
+
+    def best_match(i, j):
+        return row_max(feature_similarity[bounds[i]:bounds[i + 1], bounds[j]:bounds[j + 1]])
+
+    # best similarity of each feature phrase against every other product's features
+    best = {}
+    for i in range(len(names)):
+        best[i] = np.stack([best_match(i, j) for j in range(len(names)) if j != i]) if len(names) > 1 \
+            else np.zeros((1, len(feature_rows[i])))
+
+    common = []
+    if len(names) > 1 and len(feature_rows[0]):
+        shared = (best[0] >= COMMON_THRESHOLD).all(axis=0)
+        common = [all_phrases[r] for r in feature_rows[0][shared]]
+
+    unique, gaps = {}, []
+    for i, name in enumerate(names):
+        exclusive = (best[i] < UNIQUE_THRESHOLD).all(axis=0)
+        unique[name] = [all_phrases[r] for r in feature_rows[i][exclusive]]
+        covered = row_max(matrix[review_rows[i]] @ matrix[feature_rows[i]].T) >= COMMON_THRESHOLD
+        gaps.append({
+            "product_name": name,
+            "review_mentions": [all_phrases[r] for r in review_rows[i]],
+            "missing_in_description": [all_phrases[r] for r, ok in zip(review_rows[i], covered) if not ok],
+        })
+    return {"common_features": common, "unique_features": unique, "customer_gaps": gaps}
+
+
+def draft_marketing_insight(analysis: dict) -> str:
+    """Short templated Persian summary used when the model is skipped."""
+    sentences = []
+    if analysis["common_features"]:
+        sentences.append("ویژگی‌های مشترک همه فروشندگان: " + "، ".join(analysis["common_features"][:5]) + ".")
+    for name, features in analysis["unique_features"].items():
+        if features:
+            sentences.append(f"{name} بر {'، '.join(features[:3])} تاکید دارد.")
+    missing = sorted({m for gap in analysis["customer_gaps"] for m in gap["missing_in_description"]})
+    if missing:
+        sentences.append("پرسش‌های مشتریان درباره " + "، ".join(missing[:5]) + " در توضیحات پاسخ داده نشده است.")
+    if not sentences:
+        sentences.append("تفاوت قابل توجهی میان توضیحات محصولات یافت نشد.")
+    return " ".join(sentences[:4])
+
+
+def analyze_locally(content: str) -> dict:
+    """Full ContentGapAnalysisResult computed without the LLM ("fast" mode)."""
+    try:
+        products = json.loads(content)["products"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Local analysis needs a JSON input of the form {\"products\": [...]}")
+    analysis = analyze_products(products)
+    analysis["marketing_insight"] = draft_marketing_insight(analysis)
+    return ContentGapAnalysisResult(**analysis).model_dump(by_alias=True)
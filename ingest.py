@@ -0,0 +1,238 @@
+"""Catalog ingestion: group the listings of an NDJSON catalog into comparable products.
+
+Every line of a catalog is one listing, {"name", "description", "reviews", ...}.
+Listings are grouped by their names (normalized, seller suffixes in
+parentheses removed) with MinHash/LSH over character shingles, so the three
+"Soundcore Life P3" sellers of example_input.json end up in one group, and
+each group becomes a {"products": [...]} input of its own.
+
+Memory stays bounded by the number of listings, not by the catalog size:
+worker processes read the file in byte ranges and return only line offsets
+and name signatures; the signatures are kept in a memory-mapped temp file
+while they are banded, and a group's listings are read back from disk only
+when its document is built.
+
+Run on its own:  python ingest.py catalog.ndjson --output-dir groups/
+"""
+# Python standard libraries
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import multiprocessing
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+# external libraries
+import numpy as np
+# Internal project libraries
+from normalizer import normalize_text
+from review_dedup import NUM_PERM, canonical_review, minhash_signatures, signature_groups
+from logger import get_logger
+
+logger = get_logger()
+
+CHUNK_BYTES = 8 * 1024 * 1024  # catalog bytes scanned per worker task
+NAME_THRESHOLD = 0.7           # estimated Jaccard similarity of two names in one group
+MIN_GROUP = 2                  # a single listing has nothing to be compared with
+MAX_GROUP = 20                 # larger groups are analyzed in slices of this many listings
+PARENTHESES = re.compile(r"\([^()]*\)|\[[^\[\]]*\]")
+DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩يك", "01234567890123456789یک")
+
+
+class CatalogError(Exception):
+    """Raised when a catalog has no usable listings."""
+
+
+def canonical_name(name: str) -> str:
+    """Name used for grouping: normalized like any mixed text (see normalize_mixed_text), without the
+    seller or color in parentheses, lowercased, with Persian/Arabic digits and letters unified."""
+    text = normalize_text(str(name)).translate(DIGITS)
+    stripped = canonical_review(PARENTHESES.sub(" ", text))
+    return stripped or canonical_review(text)
+
+
+def model_key(canonical: str) -> int:
+    """Block of a canonical name: a stable hash of its words that contain digits.
+
+    Names that differ only in a model number ("life p2" / "life p3") are
+    nearly identical as character shingles, so only listings with the same
+    model numbers are compared at all.
+    """
+    numbers = " ".join(sorted({word for word in canonical.split() if any(c.isdigit() for c in word)}))
+    return int.from_bytes(hashlib.blake2b(numbers.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _listing_name(line: bytes) -> Optional[str]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    name = record.get("name") if isinstance(record, dict) else None
+    return name if isinstance(name, str) and name.strip() else None
+
+
+def _chunk_bounds(path: str, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """Byte ranges of about `chunk_bytes` that start and end on line boundaries."""
+    size, bounds, start = os.path.getsize(path), [], 0
+    with open(path, "rb") as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # the line the range ends in belongs to it
+            end = min(f.tell(), size)
+            bounds.append((start, end))
+            start = end
+    return bounds
+
+
+def _scan_chunk(task: Tuple[str, int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """Worker: offsets, name signatures and model keys of the listings starting in one byte range, and
+    the number of lines skipped (not JSON, or without a name)."""
+    path, start, end = task
+    offsets, names, keys, skipped = [], [], [], 0
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            offset, position = position, position + len(line)
+            name = _listing_name(line)
+            canonical = canonical_name(name) if name is not None else ""
+            if not canonical:
+                skipped += bool(line.strip())
+                continue
+            offsets.append(offset)
+            names.append(canonical)
+            keys.append(model_key(canonical))
+    # MinHash values are the upper 32 bits of each permutation, so they fit in half the space
+    signatures = minhash_signatures(names).astype(np.uint32) if names else np.empty((0, NUM_PERM), dtype=np.uint32)
+    return np.array(offsets, dtype=np.int64), signatures, np.array(keys, dtype=np.uint64), skipped
+
+
+def _scan(tasks: List[Tuple[str, int, int]], processes: int):
+    """Results of `_scan_chunk` in catalog order, from a process pool unless `processes` is 0."""
+    if processes == 0 or len(tasks) == 1:
+        yield from map(_scan_chunk, tasks)
+        return
+    # spawned, not forked: the server process that starts an ingestion runs other threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count(), mp_context=context) as pool:
+        yield from pool.map(_scan_chunk, tasks)
+
+
+@dataclass
+class CatalogGroups:
+    """Listings of a catalog (by line offset, in file order) and the group each one belongs to."""
+    path: str
+    offsets: np.ndarray
+    labels: np.ndarray
+    skipped: int = 0
+    seconds: float = 0.0
+
+    def groups(self, min_size: int = MIN_GROUP, max_size: int = MAX_GROUP) -> Iterator[np.ndarray]:
+        """Offsets of the listings of every group with at least `min_size` listings; larger groups than
+        `max_size` are yielded in consecutive slices."""
+        if not len(self.labels):
+            return
+        order = np.argsort(self.labels, kind="stable")  # stable: file order inside every group
+        _, starts, counts = np.unique(self.labels[order], return_index=True, return_counts=True)
+        for start, count in zip(starts, counts):
+            if count < min_size:
+                continue
+            members = self.offsets[order[start:start + count]]
+            for slice_start in range(0, count, max_size):
+                yield members[slice_start:slice_start + max_size]
+
+    def stats(self, min_size: int = MIN_GROUP, max_size: int = MAX_GROUP) -> dict:
+        sizes = np.bincount(self.labels) if len(self.labels) else np.empty(0, dtype=np.int64)
+        grouped = sizes[sizes >= min_size]
+        return {
+            "listings": len(self.offsets),
+            "skipped_lines": self.skipped,
+            "groups": int(np.ceil(grouped / max_size).sum()),
+            "grouped_listings": int(grouped.sum()),
+            "largest_group": int(sizes.max()) if len(sizes) else 0,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+def group_catalog(path: str, threshold: float = NAME_THRESHOLD, processes: Optional[int] = None,
+                  chunk_bytes: int = CHUNK_BYTES) -> CatalogGroups:
+    """Group the listings of an NDJSON catalog by similar names with the same model numbers.
+
+    `processes` worker processes read the catalog (None: one per CPU, 0: in
+    this process). Raises CatalogError when no line is a named listing.
+    """
+    start = time.perf_counter()
+    tasks = [(path, chunk_start, chunk_end) for chunk_start, chunk_end in _chunk_bounds(path, chunk_bytes)]
+    offsets, keys, skipped = [], [], 0
+    with tempfile.TemporaryDirectory(prefix="ingest_") as folder:
+        signature_path = os.path.join(folder, "signatures.u32")
+        with open(signature_path, "wb") as out:
+            for chunk_offsets, signatures, chunk_keys, chunk_skipped in _scan(tasks, processes):
+                offsets.append(chunk_offsets)
+                keys.append(chunk_keys)
+                out.write(signatures.tobytes())
+                skipped += chunk_skipped
+        if not sum(map(len, offsets)):
+            raise CatalogError(f"No listings with a name in {os.path.basename(path)} ({skipped} lines skipped)")
+        offsets, keys = np.concatenate(offsets), np.concatenate(keys)
+        signatures = np.memmap(signature_path, dtype=np.uint32, mode="r", shape=(len(offsets), NUM_PERM))
+        labels = signature_groups(signatures, threshold, blocks=keys)
+        del signatures  # unmapped before the temp folder is removed
+
+    grouping = CatalogGroups(path, offsets, labels, skipped, time.perf_counter() - start)
+    stats = grouping.stats()
+    logger.info(f"Grouped {stats['listings']} listings in {stats['seconds']}s "
+                f"({stats['groups']} groups, {skipped} lines skipped)")
+    return grouping
+
+
+def _product(record: dict) -> dict:
+    """The fields the analysis reads; anything else a catalog carries (price, seller, ...) is left out."""
+    reviews = record.get("reviews")
+    return {"name": record["name"], "description": str(record.get("description") or ""),
+            "reviews": reviews if isinstance(reviews, list) else []}
+
+
+def group_documents(grouping: CatalogGroups, min_size: int = MIN_GROUP, max_size: int = MAX_GROUP) -> Iterator[dict]:
+    """A {"products": [...]} document per group, read from the catalog one group at a time."""
+    with open(grouping.path, "rb") as f:
+        for offsets in grouping.groups(min_size, max_size):
+            products = []
+            for offset in offsets:
+                f.seek(int(offset))
+                products.append(_product(json.loads(f.readline())))
+            yield {"products": products}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("catalog", help="NDJSON file, one listing per line")
+    parser.add_argument("--output-dir", help="write every group as group<N>.json here (default: only print stats)")
+    parser.add_argument("--threshold", type=float, default=NAME_THRESHOLD)
+    parser.add_argument("--processes", type=int, help="worker processes [one per CPU; 0 = none]")
+    parser.add_argument("--min-group", type=int, default=MIN_GROUP)
+    parser.add_argument("--max-group", type=int, default=MAX_GROUP)
+    args = parser.parse_args()
+
+    try:
+        grouping = group_catalog(args.catalog, args.threshold, args.processes)
+    except CatalogError as e:
+        sys.exit(str(e))
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for number, document in enumerate(group_documents(grouping, args.min_group, args.max_group), 1):
+            with open(os.path.join(args.output_dir, f"group{number}.json"), "w", encoding="utf-8") as f:
+                json.dump(document, f, ensure_ascii=False)
+    print(json.dumps(grouping.stats(args.min_group, args.max_group), indent=2))
+
+
+if __name__ == "__main__":
+    main()
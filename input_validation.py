@@ -0,0 +1,101 @@
+# Python standard libraries
+from typing import Generator, Optional, Tuple
+# external libraries
+import ijson
+# Internal project libraries
+from logger import get_logger
+
+logger = get_logger()
+
+REQUIRED_PRODUCT_FIELDS = ("name", "description", "reviews")
+
+
+class InvalidInputError(ValueError):
+    """The uploaded document is not of the form {"products": [{"name", "description", "reviews"}]}."""
+
+
+class ProductsValidator:
+    """Checks an input document chunk by chunk while it is uploaded.
+
+    Bytes are pushed through ijson's event parser, so memory stays constant
+    no matter how large the catalog is; the first structural problem raises
+    `InvalidInputError` right away instead of after the upload.
+    """
+
+    def __init__(self):
+        self.products = 0
+        self._seen_products_key = False
+        self._fields = set()
+        self._checker = self._check()
+        next(self._checker)
+        self._parser = ijson.parse_coro(self._checker)
+        self._bytes = 0
+
+    def feed(self, chunk: bytes):
+        if not chunk:  # an empty send would mean end of input to ijson
+            return
+        self._bytes += len(chunk)
+        try:
+            self._parser.send(chunk)
+        except ijson.JSONError as e:
+            raise InvalidInputError(f"Invalid JSON after {self._bytes} bytes: {str(e).splitlines()[0]}") from e
+
+    def close(self) -> int:
+        """Finish the document; returns the number of products."""
+        try:
+            self._parser.close()
+        except ijson.JSONError as e:
+            message = "The document is empty" if not self._bytes else f"Incomplete JSON: {str(e).splitlines()[0]}"
+            raise InvalidInputError(message) from e
+        if not self._seen_products_key:
+            raise InvalidInputError('The document has no "products" list')
+        return self.products
+
+    def _check(self) -> Generator[None, Tuple[str, str, Optional[object]], None]:
+        """Coroutine that receives (prefix, event, value) events from ijson."""
+        prefix, event, value = yield
+        if event != "start_map":
+            raise InvalidInputError('The document must be a JSON object with a "products" list')
+        while True:
+            prefix, event, value = yield
+            if prefix == "" and event == "map_key" and value == "products":
+                self._seen_products_key = True
+            elif prefix == "products":
+                if event == "start_array":
+                    continue
+                if event == "end_array":
+                    if not self.products:
+                        raise InvalidInputError('"products" is empty')
+                    continue
+                raise InvalidInputError('"products" must be a list')
+            elif prefix == "products.item":
+                self._check_product(event, value)
+            elif prefix in ("products.item.name", "products.item.description"):
+                field = prefix.rsplit(".", 1)[1]
+                if event != "string" or not value.strip():
+                    raise InvalidInputError(f'Product {self.products}: "{field}" must be a non-empty string')
+            elif prefix == "products.item.reviews":
+                if event not in ("start_array", "end_array"):
+                    raise InvalidInputError(f'Product {self.products}: "reviews" must be a list')
+            elif prefix == "products.item.reviews.item" and event != "string":
+                raise InvalidInputError(f'Product {self.products}: every review must be a string')
+
+    def _check_product(self, event: str, value):
+        if event == "start_map":
+            self.products += 1
+            self._fields = set()
+        elif event == "map_key":
+            self._fields.add(value)
+        elif event == "end_map":
+            missing = [f for f in REQUIRED_PRODUCT_FIELDS if f not in self._fields]
+            if missing:
+                raise InvalidInputError(f"Product {self.products} is missing: {', '.join(missing)}")
+        else:
+            raise InvalidInputError(f"Product {self.products + 1} must be an object")
+
+
+def validate_products(data: bytes) -> int:
+    """Validate a whole document at once; returns the number of products."""
+    validator = ProductsValidator()
+    validator.feed(data)
+    return validator.close()
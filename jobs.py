@@ -0,0 +1,138 @@
+# Python standard libraries
+import time
+import uuid
+import threading
+import contextvars
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Dict, List, Optional
+# Internal project libraries
+from logger import get_logger, job_id_var
+
+logger = get_logger()
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no free slot for a new job."""
+
+
+@dataclass
+class Job:
+    """A single background analysis and its current state."""
+    id: str
+    status: str = "queued"  # queued -> running -> done | failed, or queued -> cancelled at shutdown
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+    future: Optional[Future] = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            **self.meta,
+        }
+
+
+class JobQueue:
+    """Bounded worker pool that runs blocking analyses off the event loop.
+
+    At most `workers` jobs run at the same time and at most `max_pending`
+    more wait for a free worker. When both are used up, `submit` raises
+    `QueueFullError` so callers can push back on clients instead of
+    piling up work the upstream API cannot absorb.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16, max_history: int = 1000):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyze")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable, *args, meta: Optional[dict] = None,
+               block: bool = False, timeout: Optional[float] = None, **kwargs) -> Job:
+        """Queue `func(*args, **kwargs)` and return its Job right away."""
+        if not self._slots.acquire(blocking=block, timeout=timeout if block else None):
+            logger.warning("Job queue is full, rejecting new job")
+            raise QueueFullError("Job queue is full, try again later")
+
+        job = Job(id=uuid.uuid4().hex, meta=dict(meta or {}))
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict_finished()
+        # run in a copy of the caller's context so the request id follows the job into its log records
+        context = contextvars.copy_context()
+        job.future = self._executor.submit(context.run, self._run, job, func, args, kwargs)
+        logger.info(f"Job {job.id} queued")
+        return job
+
+    def _run(self, job: Job, func: Callable, args: tuple, kwargs: dict):
+        job_id_var.set(job.id)
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = func(*args, **kwargs)
+            job.status = "done"
+            logger.info(f"Job {job.id} finished")
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            logger.error(f"Job {job.id} failed: {repr(e)}")
+        finally:
+            job.finished_at = time.time()
+            self._slots.release()
+        return job.result
+
+    def _evict_finished(self):
+        """Forget the oldest finished jobs once the history limit is reached."""
+        overflow = len(self._jobs) - self.max_history
+        if overflow <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at is not None][:overflow]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        """Block until the job has finished (mainly useful for scripts and tests)."""
+        job = self.get(job_id)
+        if job is not None and job.future is not None:
+            try:
+                job.future.result(timeout=timeout)
+            except Exception:
+                pass
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+        }
+
+    def shutdown(self, wait: bool = True) -> List[Job]:
+        """Stop the workers; without `wait` the jobs that did not start yet are cancelled and returned."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        with self._lock:
+            cancelled = [job for job in self._jobs.values() if job.future is not None and job.future.cancelled()]
+        for job in cancelled:
+            job.status, job.finished_at = "cancelled", time.time()
+        return cancelled
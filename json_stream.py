@@ -0,0 +1,250 @@
+# Python standard libraries
+import re
+import json
+from typing import List, NamedTuple, Optional, Tuple
+# Internal project libraries
+from logger import get_logger
+
+logger = get_logger()
+
+# (top-level key, child key or index or None, raw JSON text of the completed value)
+Section = Tuple[str, Optional[object], str]
+
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+SCALAR = re.compile(r'[^\s{}\[\]:,"]+')
+WHITESPACE = re.compile(r"\s+")
+# an escape cut in half: the last of an odd run of backslashes, or an incomplete \uXXXX after an even run
+DANGLING_ESCAPE = re.compile(r'(?<!\\)((?:\\\\)*)\\(?:u[0-9a-fA-F]{0,3})?$')
+
+
+class RepairResult(NamedTuple):
+    """Closed JSON text, whether the input was already complete, and the paths that were cut off."""
+    text: str
+    complete: bool
+    truncated: List[str]
+
+
+class _Level:
+    """One open object or array."""
+    __slots__ = ("kind", "start", "safe", "expect", "key")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind          # '{' or '['
+        self.start = start        # offset of the opening bracket
+        self.safe = start + 1     # offset after the last complete element
+        self.expect = "key" if kind == "{" else "value"  # key | colon | value | comma
+        self.key = None if kind == "{" else 0  # current key (object) or index (array)
+
+
+class JSONStreamParser:
+    """Single-pass, chunk-at-a-time JSON parser that tolerates truncated input.
+
+    Feed it text as it arrives (e.g. LLM tokens); anything before the first
+    '{' is skipped. `feed` returns the sections that completed in that chunk:
+    every value directly under the top-level object as (key, None, text) and
+    every value one level deeper as (key, child_key_or_index, text).
+
+    `close` returns the object as JSON text. Unterminated strings are closed,
+    a dangling trailing element (half a key, a key without value, a partial
+    literal, a trailing comma) is dropped, and open arrays/objects are closed;
+    the paths of everything that was cut off are reported.
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._joined: Optional[str] = None
+        self._length = 0
+        self._pending = ""      # unconsumed tail: an incomplete token
+        self._pending_at = 0    # its offset in the full text
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._stack: List[_Level] = []
+
+    @property
+    def done(self) -> bool:
+        """True once the top-level object has been closed."""
+        return self._end is not None
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far, starting at the top-level '{'."""
+        if self._start is None:
+            return ""
+        return self._full_text()[self._start:self._end]
+
+    def _full_text(self) -> str:
+        if self._joined is None:
+            self._joined = "".join(self._chunks)
+            self._chunks = [self._joined]
+        return self._joined
+
+    def feed(self, chunk: str) -> List[Section]:
+        if self.done or not chunk:
+            return []
+        self._chunks.append(chunk)
+        self._joined = None
+        buf, base = self._pending + chunk, self._pending_at
+        self._length += len(chunk)
+        sections: List[Section] = []
+
+        pos, n = 0, len(buf)
+        if self._start is None:
+            pos = buf.find("{")
+            if pos < 0:
+                self._pending, self._pending_at = "", self._length
+                return sections
+
+        while pos < n:
+            ch = buf[pos]
+            if ch.isspace():
+                pos = WHITESPACE.match(buf, pos).end()
+            elif ch == '"':
+                match = STRING.match(buf, pos)
+                if match is None:
+                    break  # string continues in a later chunk
+                self._on_string(base + pos, base + match.end(), match.group(), sections)
+                pos = match.end()
+            elif ch in "{[":
+                self._on_open(ch, base + pos)
+                pos += 1
+            elif ch in "}]":
+                self._on_close(base + pos, sections)
+                pos += 1
+                if self.done:
+                    break
+            elif ch == ":":
+                if self._stack and self._stack[-1].kind == "{":
+                    self._stack[-1].expect = "value"
+                pos += 1
+            elif ch == ",":
+                self._on_comma()
+                pos += 1
+            else:
+                match = SCALAR.match(buf, pos)
+                if match.end() == n:
+                    break  # literal/number may continue in a later chunk
+                self._value_done(base + pos, base + match.end(), sections)
+                pos = match.end()
+
+        self._pending, self._pending_at = buf[pos:], base + pos
+        return sections
+
+    # --- token handlers ---
+    def _on_open(self, kind: str, offset: int):
+        if self._start is None:
+            self._start = offset
+        self._stack.append(_Level(kind, offset))
+
+    def _on_close(self, offset: int, sections: List[Section]):
+        if not self._stack:
+            return
+        level = self._stack.pop()
+        if not self._stack:
+            self._end = offset + 1
+            return
+        self._value_done(level.start, offset + 1, sections)
+
+    def _on_comma(self):
+        if not self._stack:
+            return
+        level = self._stack[-1]
+        if level.kind == "{":
+            level.expect = "key"
+        else:
+            level.key += 1
+            level.expect = "value"
+
+    def _on_string(self, start: int, end: int, token: str, sections: List[Section]):
+        level = self._stack[-1]
+        if level.kind == "{" and level.expect in ("key", "comma"):
+            level.key = _decode_string(token)
+            level.expect = "colon"
+        else:
+            self._value_done(start, end, sections)
+
+    def _value_done(self, start: int, end: int, sections: List[Section]):
+        level = self._stack[-1]
+        level.safe = end
+        level.expect = "comma"
+        depth = len(self._stack)
+        if depth == 1:
+            sections.append((level.key, None, self._full_text()[start:end]))
+        elif depth == 2:
+            sections.append((self._stack[0].key, level.key, self._full_text()[start:end]))
+
+    def _path(self, depth: int) -> str:
+        """Path of the value currently being written at `depth` (1 = top-level key)."""
+        path = ""
+        for level in self._stack[:depth]:
+            if level.kind == "[":
+                path += f"[{level.key}]"
+            elif level.key is not None:
+                path += f".{level.key}" if path else str(level.key)
+        return path
+
+    # --- finishing ---
+    def close(self) -> Optional[RepairResult]:
+        """Close whatever is still open; None if no object was started at all."""
+        if self._start is None:
+            return None
+        text = self._full_text()
+        if self.done:
+            return RepairResult(text[self._start:self._end], True, [])
+
+        level = self._stack[-1]
+        truncated = [self._path(depth) for depth in range(1, len(self._stack))]
+        cut, tail = self._pending_at, ""
+        pending = self._pending
+        if pending.startswith('"'):
+            if not (level.kind == "{" and level.expect in ("key", "comma")):
+                # a value cut mid-string: keep what arrived and close it
+                truncated.append(self._path(len(self._stack)))
+                tail = DANGLING_ESCAPE.sub(r"\1", pending) + '"'
+                level.expect = "comma"
+        elif pending:
+            truncated.append(self._path(len(self._stack)))
+            try:
+                json.loads(pending)
+                tail = pending
+                level.expect = "comma"
+            except ValueError:
+                pass
+        elif level.kind == "{" and level.expect in ("colon", "value"):
+            truncated.append(self._path(len(self._stack)))
+
+        if level.expect != "comma":
+            # key without value, trailing comma or dropped partial literal
+            cut, tail = level.safe, ""
+
+        closers = "".join("}" if lvl.kind == "{" else "]" for lvl in reversed(self._stack))
+        truncated = [p for p in dict.fromkeys(truncated) if p]
+        logger.warning(f"Truncated JSON repaired, cut off: {', '.join(truncated) or 'nothing'}")
+        return RepairResult(text[self._start:cut] + tail + closers, False, truncated)
+
+
+def _decode_string(token: str) -> str:
+    if "\\" not in token:
+        return token[1:-1]
+    try:
+        return json.loads(token)
+    except ValueError:
+        return token[1:-1]
+
+
+_decoder = json.JSONDecoder()
+
+
+def repair_json(text: str) -> Optional[RepairResult]:
+    """Parse a whole (possibly truncated) response in one go."""
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        # fast path: a complete object is found by the C decoder without tokenizing in Python
+        _, end = _decoder.raw_decode(text, start)
+        return RepairResult(text[start:end], True, [])
+    except ValueError:
+        pass
+    parser = JSONStreamParser()
+    parser.feed(text)
+    return parser.close()
@@ -0,0 +1,336 @@
+# Python standard libraries
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+# Internal project libraries
+from logger import get_logger
+from metrics import LLM_FAILURES, LLM_RETRIES, stage
+
+logger = get_logger()
+
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# one limit for every backend in the process, so map-reduce batches and queued jobs share it
+_inflight = threading.BoundedSemaphore(int(os.getenv("LLM_MAX_INFLIGHT", "8")))
+
+
+@dataclass
+class LLMMessage:
+    """Minimal stand-in for a LangChain AIMessage (only `.content` is used by the pipeline)."""
+    content: str
+
+
+class RetryableError(Exception):
+    """Transient upstream failure; `retry_after` is the delay the server asked for, if any."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMBackend:
+    """Chat model wrapper with retries, jittered exponential backoff and a global in-flight limit.
+
+    Subclasses implement `_invoke(messages)` and raise `RetryableError` for
+    failures worth retrying. `invoke` and `batch` mirror the LangChain chat
+    model methods the pipeline uses.
+    """
+
+    name = "base"
+
+    def __init__(self, model: str, temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 30.0):
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> dict:
+        """Everything besides the prompt that changes the model's answer."""
+        return {"backend": self.name, "model": self.model,
+                "temperature": self.temperature, "max_tokens": self.max_tokens}
+
+    def _invoke(self, messages: List[dict], response_format: Optional[dict] = None) -> LLMMessage:
+        raise NotImplementedError
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than what the server asked for."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _stream(self, messages: List[dict]) -> Iterator[str]:
+        """Answer in text chunks; backends without native streaming send it in one piece."""
+        yield self._invoke(messages).content
+
+    def _retry_delay(self, attempt: int, error: RetryableError) -> float:
+        """Count a failed attempt and return how long to wait, or re-raise once retries are used up.
+
+        A server asking to wait longer than `backoff_max` is not retried early:
+        the error is re-raised instead.
+        """
+        if attempt >= self.max_retries:
+            self._failed()
+            logger.error(f"LLM call failed after {attempt + 1} attempts: {str(error)}")
+            raise error
+        if error.retry_after is not None and error.retry_after > self.backoff_max:
+            self._failed()
+            logger.error(f"LLM call failed, server asked to retry in {error.retry_after:.0f}s "
+                         f"(more than {self.backoff_max:.0f}s): {str(error)}")
+            raise error
+        delay = self.backoff_delay(attempt, error.retry_after)
+        with self._lock:
+            self.retries += 1
+        LLM_RETRIES.inc(backend=self.name)
+        logger.warning(f"LLM call failed ({str(error)}), retrying in {delay:.2f}s")
+        return delay
+
+    def _failed(self):
+        with self._lock:
+            self.failures += 1
+        LLM_FAILURES.inc(backend=self.name)
+
+    def invoke(self, messages: List[dict], response_format: Optional[dict] = None) -> LLMMessage:
+        """Answer `messages`; `response_format` asks providers with structured output for a JSON schema."""
+        with self._lock:
+            self.calls += 1
+        options = {"response_format": response_format} if response_format else {}
+        attempt = 0
+        while True:
+            try:
+                with _inflight, stage("llm_call"):
+                    return self._invoke(messages, **options)
+            except RetryableError as e:
+                time.sleep(self._retry_delay(attempt, e))
+                attempt += 1
+            except Exception:
+                self._failed()
+                raise
+
+    def stream(self, messages: List[dict]) -> Iterator[str]:
+        """Yield the answer as it is generated; a call is only retried before its first chunk."""
+        with self._lock:
+            self.calls += 1
+        attempt = 0
+        while True:
+            started = False
+            try:
+                with _inflight, stage("llm_stream"):
+                    for chunk in self._stream(messages):
+                        started = True
+                        yield chunk
+                return
+            except RetryableError as e:
+                if started:
+                    self._failed()
+                    raise
+                time.sleep(self._retry_delay(attempt, e))
+                attempt += 1
+            except Exception:
+                self._failed()
+                raise
+
+    def batch(self, batch: List[List[dict]], config: Optional[dict] = None) -> List[LLMMessage]:
+        """Run several independent calls concurrently, keeping the input order."""
+        max_concurrency = (config or {}).get("max_concurrency") or len(batch) or 1
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            # copy the context so token callbacks (get_openai_callback) see the worker threads
+            futures = [pool.submit(contextvars.copy_context().run, self.invoke, messages) for messages in batch]
+            return [f.result() for f in futures]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": self.name, "calls": self.calls, "retries": self.retries, "failures": self.failures}
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI-compatible endpoint through LangChain's ChatOpenAI and one pooled keep-alive HTTP client."""
+
+    name = "openai"
+
+    def __init__(self, model: str, api_key: str, base_url: str, timeout: float = 60.0,
+                 max_connections: int = 20, **kwargs):
+        super().__init__(model, **kwargs)
+        # heavy imports stay here so the fake backend works without LangChain/httpx
+        import httpx
+        from langchain_openai import ChatOpenAI
+
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=60.0),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+        )
+        self.llm = ChatOpenAI(
+            model=model,
+            base_url=base_url,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens, #token limiter
+            timeout=timeout,
+            max_retries=0,  # retries are handled by LLMBackend.invoke
+            api_key=api_key,
+            http_client=self.http_client,
+        )
+
+    @contextmanager
+    def _translate_errors(self):
+        """Turn transient OpenAI errors into RetryableError."""
+        import openai
+        try:
+            yield
+        except openai.APIConnectionError as e:  # includes timeouts
+            raise RetryableError(repr(e)) from e
+        except openai.APIStatusError as e:
+            if e.status_code in RETRY_STATUS_CODES:
+                raise RetryableError(f"HTTP {e.status_code}",
+                                     parse_retry_after(e.response.headers.get("retry-after"))) from e
+            raise
+
+    def _invoke(self, messages: List[dict], response_format: Optional[dict] = None):
+        with self._translate_errors():
+            if response_format:
+                return self.llm.invoke(messages, response_format=response_format)
+            return self.llm.invoke(messages)
+
+    def _stream(self, messages: List[dict]) -> Iterator[str]:
+        with self._translate_errors():
+            for chunk in self.llm.stream(messages):
+                if chunk.content:
+                    yield chunk.content
+
+
+class FakeBackend(LLMBackend):
+    """Deterministic offline stand-in for load tests and local development.
+
+    Answers are built by the local feature engine (or read from a canned
+    JSON file) and shaped after the output format in the system prompt.
+    `latency` seconds plus `seconds_per_char` per generated character are
+    slept to imitate generation time.
+    """
+
+    name = "fake"
+
+    def __init__(self, model: str = "fake", latency: float = 0.0, seconds_per_char: float = 0.0,
+                 canned_file: Optional[str] = None, **kwargs):
+        super().__init__(model, **kwargs)
+        self.latency = latency
+        self.seconds_per_char = seconds_per_char
+        self.canned = None
+        if canned_file:
+            with open(canned_file, "r", encoding="utf-8") as f:
+                self.canned = json.load(f)
+
+    def respond(self, messages: List[dict]) -> str:
+        system = messages[0]["content"] if messages else ""
+        user = messages[1]["content"] if len(messages) > 1 else ""
+        if "Hello world" in user:
+            return "Hello! How can I help you today?"
+        return json.dumps(self._answer(system, user), ensure_ascii=False)
+
+    def _answer(self, system: str, user: str) -> dict:
+        # imported lazily: the feature engine pulls in NumPy/SciPy
+        from feature_engine import extract_phrases
+
+        if '"gaps"' in system:  # compact protocol: products by index
+            from compact_output import compact_result
+            document = json.loads(user)
+            names = [product["name"] for product in document["products"]]
+            data = self._analysis(document) if self.canned is None else self.canned
+            return compact_result(data, names)
+        if '"features"' in system:  # map stage: one product
+            product = json.loads(user)
+            reviews = [r["text"] if isinstance(r, dict) else r for r in product.get("reviews", [])]
+            topics = [p for r in reviews for p in extract_phrases(r, feature_only=False)]
+            return {"features": extract_phrases(product.get("description", "")),
+                    "review_topics": topics, "missing_in_description": topics}
+        if '"customer_gaps"' not in system and '"common_features"' in system:  # merge stage
+            extracts = json.loads(user)
+            return {"common_features": [],
+                    "unique_features": {e["product_name"]: e["features"] for e in extracts}}
+        if '"common_features"' not in system:  # insight stage
+            return {"marketing_insight": "این پاسخ آزمایشی توسط سرویس جعلی تولید شده است."}
+
+        if self.canned is not None:
+            return self.canned
+        return self._analysis(json.loads(user))
+
+    @staticmethod
+    def _analysis(document: dict) -> dict:
+        from feature_engine import analyze_locally
+        for product in document.get("products", []):
+            product["reviews"] = [r["text"] if isinstance(r, dict) else r for r in product.get("reviews", [])]
+        return analyze_locally(json.dumps(document, ensure_ascii=False))
+
+    def _invoke(self, messages: List[dict], response_format: Optional[dict] = None) -> LLMMessage:
+        content = self.respond(messages)
+        delay = self.latency + self.seconds_per_char * len(content)
+        if delay:
+            time.sleep(delay)
+        return LLMMessage(content=content)
+
+    def _stream(self, messages: List[dict], chunk_size: int = 16) -> Iterator[str]:
+        content = self.respond(messages)
+        if self.latency:
+            time.sleep(self.latency)
+        for start in range(0, len(content), chunk_size):
+            chunk = content[start:start + chunk_size]
+            if self.seconds_per_char:
+                time.sleep(self.seconds_per_char * len(chunk))
+            yield chunk
+
+
+def get_backend(name: Optional[str] = None, model: str = "gpt-4o-mini", **kwargs) -> LLMBackend:
+    """Build the backend selected by `name` or the LLM_BACKEND environment variable."""
+    name = name or os.getenv("LLM_BACKEND", "openai")
+    common = {
+        "temperature": kwargs.pop("temperature", None),
+        "max_tokens": kwargs.pop("max_tokens", None),
+        "max_retries": int(os.getenv("LLM_MAX_RETRIES", "3")),
+        "backoff_base": float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+    }
+    if name == "fake":
+        return FakeBackend(
+            model=model,
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0")),
+            seconds_per_char=float(os.getenv("FAKE_LLM_SECONDS_PER_CHAR", "0")),
+            canned_file=os.getenv("FAKE_LLM_RESPONSE_FILE") or None,
+            **common,
+        )
+    if name == "openai":
+        return OpenAIBackend(
+            model=model,
+            timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+            **common,
+            **kwargs,
+        )
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -1,21 +1,145 @@
 import os
+import copy
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
+import contextvars
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
 
 if not os.path.exists("logs"):
     os.makedirs("logs")
 
+LOG_FILE = os.getenv("LOG_FILE", "logs/app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(float(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024)
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+# "size": every process (uvicorn worker, ingest pool worker) writes and rotates its own <name>.<pid><ext>;
+# "external": all processes append to LOG_FILE and reopen it after logrotate or similar moved it
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size")
+LOG_SAMPLE_LIMIT = int(os.getenv("LOG_SAMPLE_LIMIT", "20"))  # sampled records per key and window
+LOG_SAMPLE_WINDOW = float(os.getenv("LOG_SAMPLE_WINDOW", "60"))
 
-now = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-log_filename = f"logs/{now}.log"
+# set per request (main.py middleware) and per job (jobs.py); copied onto every record
+request_id_var = contextvars.ContextVar("request_id", default=None)
+job_id_var = contextvars.ContextVar("job_id", default=None)
 
-# logger config
-logging.basicConfig(
-    filename=log_filename,
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-    encoding="utf-8"
-)
+
+def sampled(key: str) -> dict:
+    """`extra=` for hot-path records: at most LOG_SAMPLE_LIMIT per key and window are written."""
+    return {"sample_key": key}
+
+
+class ContextFilter(logging.Filter):
+    """Attach the current request/job id; runs in the calling thread, before the record is queued."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.job_id = job_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Drop records with a `sample_key` beyond the per-window limit and report how many were dropped."""
+
+    def __init__(self, limit: int = LOG_SAMPLE_LIMIT, window: float = LOG_SAMPLE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._windows = {}  # key -> [window start, written, dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                dropped = state[2] if state else 0
+                state = self._windows[key] = [now, 0, 0]
+                if dropped:
+                    record.sampled_out = dropped
+            if state[1] >= self.limit:
+                state[2] += 1
+                return False
+            state[1] += 1
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "job_id": getattr(record, "job_id", None),
+            "thread": record.threadName,
+        }
+        if getattr(record, "sampled_out", None):
+            entry["sampled_out"] = record.sampled_out
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """QueueHandler that keeps a traceback as its own field instead of appending it to the message."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def process_log_file(path: str = None, pid: int = None) -> str:
+    """Log file of one process: logs/app.log -> logs/app.<pid>.log."""
+    base, ext = os.path.splitext(path or LOG_FILE)
+    return f"{base}.{pid or os.getpid()}{ext}"
+
+
+def _file_handler() -> logging.Handler:
+    """Handler that is safe with several processes: a size-rotated file per process, or one shared file
+    that is rotated externally. Files are created on the first record, not by idle pool workers."""
+    if LOG_ROTATION == "external":
+        return WatchedFileHandler(LOG_FILE, encoding="utf-8", delay=True)
+    return RotatingFileHandler(process_log_file(), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                               encoding="utf-8", delay=True)
+
+
+def _configure():
+    """Callers only put records on a queue; one background thread formats and writes them."""
+    file_handler = _file_handler()
+    file_handler.setFormatter(JsonFormatter())
+
+    queue_handler = StructuredQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(SamplingFilter())
+
+    listener = QueueListener(queue_handler.queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+    return listener
+
+
+listener = _configure()
 
 def get_logger():
     return logging.getLogger()
@@ -1,117 +1,576 @@
 # Python standard libraries
-import os
 import time
+STARTED = time.perf_counter()  # cold-start clock, read before the other (slower) imports
+import os
+import json
+import threading
+import math
+import uuid
+import codecs
+import hashlib
+from typing import Any, List, Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 # external libraries
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 import uvicorn
 from dotenv import load_dotenv
 # Internal project libraries
-from agent import analyze_content_gaps
-from logger import get_logger
+from agent import ANALYZE_MODES, analyze_content_gaps, extract_cache, readiness, result_cache, stream_content_gaps, warm_up
+from input_validation import InvalidInputError, ProductsValidator, validate_products
+from jobs import JobQueue, QueueFullError
+from metrics import QUEUE_DEPTH, RATE_LIMITED, STARTUP_SECONDS, render as render_metrics
+from rate_limit import RateLimiter, Rule, client_key, known_keys
+from storage import ENCODINGS, Storage
+from logger import get_logger, request_id_var
 
 # Load .env variables
 load_dotenv()
 logger = get_logger()
 
-app = FastAPI()
+# Background analysis workers
+ANALYZE_WORKERS = int(os.getenv("ANALYZE_WORKERS", "2"))
+ANALYZE_QUEUE_SIZE = int(os.getenv("ANALYZE_QUEUE_SIZE", "16"))
+job_queue = JobQueue(workers=ANALYZE_WORKERS, max_pending=ANALYZE_QUEUE_SIZE)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+# Catalog ingestion runs on its own worker, so feeding groups to a full analysis queue never blocks analyses
+ingest_queue = JobQueue(workers=1, max_pending=int(os.getenv("INGEST_QUEUE_SIZE", "2")))
+INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES")) if os.getenv("INGEST_PROCESSES") else None  # None: one per CPU
+INGEST_NAME_THRESHOLD = float(os.getenv("INGEST_NAME_THRESHOLD", "0.7"))
+INGEST_MIN_GROUP = int(os.getenv("INGEST_MIN_GROUP", "2"))
+INGEST_MAX_GROUP = int(os.getenv("INGEST_MAX_GROUP", "20"))
+
+# Uploads are streamed to disk in chunks, size-limited and validated while they arrive
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries and part headers around the file
+VALIDATE_INPUTS = os.getenv("VALIDATE_INPUTS", "1") == "1"  # 0 also accepts free-text inputs
+MAX_CATALOG_BYTES = int(float(os.getenv("MAX_CATALOG_MB", "2048")) * 1024 * 1024)
+OUTPUTS_PAGE_MAX = 500  # largest page of GET /outputs
+# outputs still pending this long after they were reserved belong to a process that is gone
+PENDING_EXPIRE_SECONDS = float(os.getenv("PENDING_EXPIRE_SECONDS", "3600"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the model client and the API test run in the background; /readyz reports when they are done
+    stop_warm_up = threading.Event()
+    threading.Thread(target=warm_up, args=(stop_warm_up, STARTED), name="warm-up", daemon=True).start()
+    expired = storage.expire_pending(PENDING_EXPIRE_SECONDS)
+    if expired:
+        logger.warning(f"Marked {len(expired)} stale pending outputs as failed: {expired}")
+    yield
+    stop_warm_up.set()
+    ingest_queue.shutdown(wait=False)
+    cancel_outputs(job_queue.shutdown(wait=False))
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Refuse oversized uploads from their Content-Length, before the body is read"""
+    limit = {"/input": MAX_UPLOAD_BYTES, "/ingest": MAX_CATALOG_BYTES}.get(request.url.path)
+    if limit is not None:
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > limit + MULTIPART_OVERHEAD:
+            logger.error(f"Upload of {length} bytes rejected")
+            return upload_too_large(limit)
+    return await call_next(request)
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """Tag every log record of a request (and of the jobs it queues) with one request id"""
+    request_id = (request.headers.get("x-request-id") or uuid.uuid4().hex[:16])[:64]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+def upload_too_large(limit=None):
+    return JSONResponse(
+        content={"error": f"The uploaded file is larger than {(limit or MAX_UPLOAD_BYTES) // (1024 * 1024)} MB"},
+        status_code=413
+    )
 
 BASE_PATH = os.path.dirname(os.path.abspath(__file__))
-INPUTS_FOLDER = os.path.join(BASE_PATH, "I_O/inputs")
-OUTPUTS_FOLDER = os.path.join(BASE_PATH, "I_O/outputs")
-
-os.makedirs(INPUTS_FOLDER, exist_ok=True)
-os.makedirs(OUTPUTS_FOLDER, exist_ok=True)
-
-# Delay control
-last_input_time = 0
-last_analyze_time = 0
-DELAY_SECONDS = 60  # 1 minute
-
-def check_delay(last_time):
-    now = time.time()
-    elapsed = now - last_time
-    if elapsed < DELAY_SECONDS:
-        return False, DELAY_SECONDS - int(elapsed)  # زمان باقی‌مانده
-    return True, now
-
-def get_next_index_file(folder, prefix, ext=".json"):
-    """Generate next file name with incremental index"""
-    existing = [f for f in os.listdir(folder) if f.startswith(prefix) and f.endswith(ext)]
-    indices = []
-    for f in existing:
-        try:
-            index = int(f[len(prefix):-len(ext)])
-            indices.append(index)
-        except:
-            pass
-    next_index = max(indices) + 1 if indices else 1
-    return os.path.join(folder, f"{prefix}{next_index}{ext}")
+# inputs/outputs are indexed in SQLite (I_O/index.sqlite3) instead of scanning the folders
+IO_DIR = os.getenv("IO_DIR", os.path.join(BASE_PATH, "I_O"))
+storage = Storage(IO_DIR)
+INPUTS_FOLDER = storage.inputs_folder
+OUTPUTS_FOLDER = storage.outputs_folder
+CATALOGS_FOLDER = os.path.join(IO_DIR, "catalogs")  # uploaded NDJSON catalogs and their group manifests
+
+# Per-client admission control (token buckets shared by all worker processes); clients with one of
+# these X-API-Key values get a bucket per key, everyone else one per IP address
+RATE_LIMIT_API_KEYS = known_keys(os.getenv("RATE_LIMIT_API_KEYS", "").split(","))
+rate_limiter = RateLimiter(
+    db_path=os.getenv("RATE_LIMIT_DB", os.path.join(IO_DIR, "ratelimit.sqlite3")),
+    rules={
+        "input": Rule.from_env("input", per_minute=30, burst=10),
+        "analyze": Rule.from_env("analyze", per_minute=6, burst=3),
+        "batch": Rule.from_env("batch", per_minute=1, burst=2),
+        "ingest": Rule.from_env("ingest", per_minute=1, burst=2),
+    },
+)
+
+async def check_rate_limit(request: Request, scope: str):
+    """Return a 429 response if the client has used up its `scope` bucket, else None"""
+    client = client_key(request.headers.get("x-api-key"), request.client.host if request.client else None,
+                        RATE_LIMIT_API_KEYS)
+    # a blocking SQLite write (it may wait for the lock), kept off the event loop
+    allowed, retry_after = await run_in_threadpool(rate_limiter.acquire, scope, client)
+    if allowed:
+        return None
+    seconds_left = max(1, math.ceil(retry_after))
+    RATE_LIMITED.inc(scope=scope)
+    logger.error(f"Rate limit for {scope} exceeded by {client}, next request allowed in {seconds_left} seconds")
+    return JSONResponse(
+        content={"error": f"Please wait {seconds_left} seconds before next {scope} request"},
+        status_code=429,
+        headers={"Retry-After": str(seconds_left)}
+    )
+
+def run_analysis(input_file_path, output_id, mode=None):
+    """Job body: run the analysis and record the output (or the failure) in the index"""
+    output_file_path = storage.output_path(output_id)
+    completed = False
+    try:
+        status = analyze_content_gaps(input_file_path, output_file_path, mode=mode)
+        storage.complete_output(output_id, status)
+        completed = True
+    finally:
+        if not completed:
+            storage.fail_output(output_id)
+    logger.info(f"Analysis complete ({status}), output saved to {output_file_path}")
+    return {"output_file": output_file_path, "status": status}
 
 @app.post("/input")
-async def upload_text(file: UploadFile = File(...)):
-    """Upload a .txt file and store its content in the inputs folder"""
-    global last_input_time
-    ok, result = check_delay(last_input_time)
-    if not ok:
-        seconds_left = result
-        logger.error(f"Please wait {seconds_left} seconds before next input upload")
-        return JSONResponse(
-            content={"error": f"Please wait {seconds_left} seconds before next input upload"},
-            status_code=429
-        )
-    last_input_time = result
+async def upload_text(request: Request, file: UploadFile = File(...)):
+    """Upload a .json file (streamed, size-limited and validated) and store it in the inputs folder"""
+    limited = await check_rate_limit(request, "input")
+    if limited is not None:
+        return limited
+
+    validator = ProductsValidator() if VALIDATE_INPUTS else None
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    sha, size, blank = hashlib.sha256(), 0, True
+
+    def store_chunk(f, chunk: bytes):
+        """Decode, validate, hash and write one chunk; blocking, so it runs in the thread pool."""
+        nonlocal blank
+        text = decoder.decode(chunk)  # every chunk, so a character split across chunks is decoded whole
+        blank = blank and not text.strip()
+        if validator is not None:
+            validator.feed(chunk)
+        sha.update(chunk)
+        f.write(chunk)
 
+    tmp_path = await run_in_threadpool(storage.new_temp_input)
     try:
-        contents = await file.read()
-        text = contents.decode("utf-8").strip()
-        if not text:
+        with open(tmp_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    logger.error(f"Upload {file.filename} exceeded {MAX_UPLOAD_BYTES} bytes")
+                    return upload_too_large()
+                await run_in_threadpool(store_chunk, f, chunk)
+            decoder.decode(b"", final=True)
+
+        if blank:
             logger.warning("Uploaded file is empty")
             return JSONResponse(content={"error": "The uploaded file is empty"}, status_code=400)
+        products = await run_in_threadpool(validator.close) if validator is not None else None
 
-        save_path = get_next_index_file(INPUTS_FOLDER, "input")
-        with open(save_path, "w", encoding="utf-8") as f:
-            f.write(text)
-
-        logger.info(f"Input file uploaded. Saved as {save_path}")
-        return {"status": "ok", "filename": file.filename, "saved_path": save_path}
+        record = await run_in_threadpool(storage.add_input, tmp_path, file.filename, sha.hexdigest(), size)
+        logger.info(f"Input file uploaded. Saved as {record.path}")
+        return {"status": "ok", "filename": file.filename, "saved_path": record.path, "input_id": record.id,
+                "products": products}
 
+    except UnicodeDecodeError:
+        logger.warning(f"Uploaded file {file.filename} is not UTF-8")
+        return JSONResponse(content={"error": "The uploaded file must be UTF-8 encoded"}, status_code=400)
+    except InvalidInputError as e:
+        logger.warning(f"Rejected invalid input {file.filename}: {str(e)}")
+        return JSONResponse(content={"error": str(e)}, status_code=400)
     except Exception as e:
         logger.error(f"Failed to save uploaded file: {repr(e)}")
         return JSONResponse(content={"error": f"Failed to save file: {str(e)}"}, status_code=500)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 @app.get("/analyze")
-async def analyze_text():
-    """Analyze the latest uploaded text and save the result in the outputs folder"""
-    global last_analyze_time
-    ok, result = check_delay(last_analyze_time)
-    if not ok:
-        seconds_left = result
-        logger.error(f"Please wait {seconds_left} seconds before next analysis")
+async def analyze_text(request: Request, mode: Optional[str] = None, input_id: Optional[int] = None):
+    """Queue an analysis of the latest (or the given) uploaded text; the result is saved in the outputs folder"""
+    if mode is not None and mode not in ANALYZE_MODES:
         return JSONResponse(
-            content={"error": f"Please wait {seconds_left} seconds before next analysis"},
-            status_code=429
+            content={"error": f"Unknown mode '{mode}', expected one of: {', '.join(ANALYZE_MODES)}"},
+            status_code=400
         )
-    last_analyze_time = result
+    limited = await check_rate_limit(request, "analyze")
+    if limited is not None:
+        return limited
 
     try:
-        input_files = sorted(os.listdir(INPUTS_FOLDER))
-        if not input_files:
+        latest = storage.latest_input() if input_id is None else storage.get_input(input_id)
+        if latest is None and input_id is not None:
+            return JSONResponse(content={"error": f"Input {input_id} not found"}, status_code=404)
+        if latest is None:
             logger.warning("No file uploaded before analysis")
             return JSONResponse(content={"error": "No file has been uploaded yet"}, status_code=400)
 
-        input_file_path = os.path.join(INPUTS_FOLDER, input_files[-1])  # latest file
-        output_file_path = get_next_index_file(OUTPUTS_FOLDER, "output")
+        input_file_path = latest.path
+        output = storage.reserve_output(latest.id)
+        output_file_path = output.path
 
-        logger.info(f"Starting content gap analysis for {input_file_path}...")
-        analyze_content_gaps(input_file_path, output_file_path)
-        logger.info(f"Analysis complete, output saved to {output_file_path}")
-        return {"status": "ok", "output_file": output_file_path}
+        try:
+            job = job_queue.submit(
+                run_analysis, input_file_path, output.id, mode,
+                meta={"input_file": input_file_path, "output_file": output_file_path,
+                      "input_id": latest.id, "output_id": output.id},
+            )
+        except QueueFullError as e:
+            storage.fail_output(output.id)
+            logger.error(f"Analysis rejected: {str(e)}")
+            return JSONResponse(content={"error": str(e)}, status_code=503, headers={"Retry-After": "30"})
+
+        logger.info(f"Queued content gap analysis {job.id} for {input_file_path}...")
+        return JSONResponse(
+            content={"status": "queued", "job_id": job.id, "output_file": output_file_path, "output_id": output.id,
+                     "output_url": f"/outputs/{output.id}"},
+            status_code=202
+        )
 
     except Exception as e:
         logger.error(f"Error during analysis: {repr(e)}")
         return JSONResponse(content={"error": f"Internal error during analysis: {str(e)}"}, status_code=500)
 
+def cancel_outputs(jobs):
+    """Mark the outputs of analysis jobs that were dropped from the queue at shutdown as cancelled"""
+    for job in jobs:
+        for meta in [job.meta] + list(job.meta.get("items", [])):
+            if meta.get("output_id") is not None:
+                storage.fail_output(meta["output_id"], status="cancelled")
+
+class BatchAnalyzeRequest(BaseModel):
+    """Body of POST /analyze/batch: new documents and/or ids of stored inputs"""
+    inputs: List[Any] = Field(default_factory=list, description="Input documents (JSON objects or text) to store and analyze")
+    input_ids: List[int] = Field(default_factory=list, description="Ids of already uploaded inputs to analyze")
+    mode: Optional[str] = None
+
+def run_batch(items, mode=None, concurrency=BATCH_CONCURRENCY):
+    """Job body: analyze every queued item with at most `concurrency` running at once.
+
+    `items` is shared with the job's metadata, so /jobs/{id} shows per-item
+    progress while the batch runs; a failed item never stops the others.
+    """
+    def run_item(item):
+        item["status"] = "running"
+        try:
+            item["status"] = run_analysis(storage.input_path(item["input_id"]), item["output_id"], mode)["status"]
+        except Exception as e:
+            item["status"], item["error"] = "failed", str(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch") as pool:
+        list(pool.map(run_item, [item for item in items if item["status"] == "queued"]))
+    done = sum(item["status"] == "done" for item in items)
+    fallback = sum(item["status"] == "fallback" for item in items)
+    failed = len(items) - done - fallback
+    logger.info(f"Batch finished: {done} done, {fallback} fallback, {failed} failed")
+    return {"items": items, "done": done, "fallback": fallback, "failed": failed}
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request, body: BatchAnalyzeRequest):
+    """Queue one job that analyzes many inputs concurrently and reports the status of each"""
+    if body.mode is not None and body.mode not in ANALYZE_MODES:
+        return JSONResponse(
+            content={"error": f"Unknown mode '{body.mode}', expected one of: {', '.join(ANALYZE_MODES)}"},
+            status_code=400
+        )
+    count = len(body.inputs) + len(body.input_ids)
+    if not count or count > BATCH_MAX_ITEMS:
+        return JSONResponse(
+            content={"error": f"A batch needs between 1 and {BATCH_MAX_ITEMS} inputs, got {count}"},
+            status_code=400
+        )
+    limited = await check_rate_limit(request, "batch")
+    if limited is not None:
+        return limited
+
+    items = []
+    for document in body.inputs:
+        text = document if isinstance(document, str) else json.dumps(document, ensure_ascii=False)
+        if not text.strip():
+            items.append({"input_id": None, "status": "failed", "error": "The input document is empty"})
+            continue
+        if VALIDATE_INPUTS:
+            try:
+                validate_products(text.encode("utf-8"))
+            except InvalidInputError as e:
+                items.append({"input_id": None, "status": "failed", "error": str(e)})
+                continue
+        record = storage.save_input(text.encode("utf-8"), f"batch-{len(items)}.json")
+        items.append({"input_id": record.id, "status": "queued", "error": None})
+    for input_id in body.input_ids:
+        if storage.get_input(input_id) is None:
+            items.append({"input_id": input_id, "status": "failed", "error": f"Input {input_id} not found"})
+        else:
+            items.append({"input_id": input_id, "status": "queued", "error": None})
+
+    for index, item in enumerate(items):
+        item["index"] = index
+        if item["status"] == "queued":
+            output = storage.reserve_output(item["input_id"])
+            item["output_id"], item["output_file"] = output.id, output.path
+            item["output_url"] = f"/outputs/{output.id}"
+
+    try:
+        job = job_queue.submit(run_batch, items, body.mode, meta={"items": items})
+    except QueueFullError as e:
+        for item in items:
+            if "output_id" in item:
+                storage.fail_output(item["output_id"])
+        logger.error(f"Batch rejected: {str(e)}")
+        return JSONResponse(content={"error": str(e)}, status_code=503, headers={"Retry-After": "30"})
+
+    logger.info(f"Queued batch {job.id} with {len(items)} items")
+    return JSONResponse(content={"status": "queued", "job_id": job.id, "items": items}, status_code=202)
+
+def run_ingest(catalog_path, mode, progress):
+    """Job body: group a catalog into comparable products and queue one analysis job per group.
+
+    Submitting waits while the analysis queue is full, so a large catalog is
+    fed to the workers at their pace instead of being rejected. `progress` is
+    the job's metadata, so /jobs/{id} shows how far it got; every queued
+    group is also written to a manifest next to the catalog.
+    """
+    # imported lazily: grouping pulls in NumPy/SciPy
+    from ingest import group_catalog, group_documents
+
+    grouping = group_catalog(catalog_path, INGEST_NAME_THRESHOLD, INGEST_PROCESSES)
+    progress.update(grouping.stats(INGEST_MIN_GROUP, INGEST_MAX_GROUP), submitted=0)
+    name = os.path.splitext(os.path.basename(catalog_path))[0]
+    manifest_path = os.path.join(CATALOGS_FOLDER, f"{name}.groups.ndjson")
+    with open(manifest_path, "w", encoding="utf-8") as manifest:
+        for number, document in enumerate(group_documents(grouping, INGEST_MIN_GROUP, INGEST_MAX_GROUP), 1):
+            record = storage.save_input(json.dumps(document, ensure_ascii=False).encode("utf-8"), f"{name}-group{number}.json")
+            output = storage.reserve_output(record.id)
+            try:
+                job = job_queue.submit(run_analysis, record.path, output.id, mode, block=True,
+                                       meta={"input_id": record.id, "output_id": output.id, "output_file": output.path})
+            except Exception:
+                storage.fail_output(output.id)
+                raise
+            manifest.write(json.dumps({
+                "group": number, "job_id": job.id, "input_id": record.id, "output_id": output.id,
+                "output_url": f"/outputs/{output.id}", "products": [p["name"] for p in document["products"]],
+            }, ensure_ascii=False) + "\n")
+            progress["submitted"] = number
+    logger.info(f"Catalog {name}: queued {progress['submitted']} group analyses")
+    return {"manifest": manifest_path, "submitted": progress["submitted"]}
+
+@app.post("/ingest")
+async def ingest_catalog(request: Request, file: UploadFile = File(...), mode: Optional[str] = None):
+    """Upload an NDJSON catalog (one listing per line); a job groups it and queues an analysis per group"""
+    if mode is not None and mode not in ANALYZE_MODES:
+        return JSONResponse(
+            content={"error": f"Unknown mode '{mode}', expected one of: {', '.join(ANALYZE_MODES)}"},
+            status_code=400
+        )
+    limited = await check_rate_limit(request, "ingest")
+    if limited is not None:
+        return limited
+
+    os.makedirs(CATALOGS_FOLDER, exist_ok=True)
+    catalog_path = os.path.join(CATALOGS_FOLDER, f"catalog-{uuid.uuid4().hex[:12]}.ndjson")
+    tmp_path, size = catalog_path + ".tmp", 0
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_CATALOG_BYTES:
+                    logger.error(f"Catalog {file.filename} exceeded {MAX_CATALOG_BYTES} bytes")
+                    return upload_too_large(MAX_CATALOG_BYTES)
+                f.write(chunk)
+        if not size:
+            return JSONResponse(content={"error": "The uploaded catalog is empty"}, status_code=400)
+        os.replace(tmp_path, catalog_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    progress = {"catalog": os.path.basename(catalog_path), "filename": file.filename, "bytes": size}
+    try:
+        job = ingest_queue.submit(run_ingest, catalog_path, mode, progress, meta={"progress": progress})
+    except QueueFullError as e:
+        os.remove(catalog_path)
+        logger.error(f"Catalog rejected: {str(e)}")
+        return JSONResponse(content={"error": str(e)}, status_code=503, headers={"Retry-After": "60"})
+    logger.info(f"Queued ingestion {job.id} of {file.filename} ({size} bytes)")
+    return JSONResponse(content={"status": "queued", "job_id": job.id, "progress": progress}, status_code=202)
+
+def sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/analyze/stream")
+async def analyze_text_stream(request: Request):
+    """Analyze the latest uploaded text and stream every result section as a server-sent event"""
+    limited = await check_rate_limit(request, "analyze")
+    if limited is not None:
+        return limited
+
+    latest = storage.latest_input()
+    if latest is None:
+        logger.warning("No file uploaded before analysis")
+        return JSONResponse(content={"error": "No file has been uploaded yet"}, status_code=400)
+
+    input_file_path = latest.path
+    output = storage.reserve_output(latest.id)
+    output_file_path = output.path
+
+    def events():
+        # runs in Starlette's thread pool, so the blocking model stream never touches the event loop
+        logger.info(f"Streaming content gap analysis for {input_file_path}...")
+        finished = False
+        try:
+            for event, data in stream_content_gaps(input_file_path, output_file_path):
+                if event == "done":
+                    storage.complete_output(output.id)
+                    finished = True
+                yield sse_event(event, data)
+            logger.info(f"Analysis complete, output saved to {output_file_path}")
+        except Exception as e:
+            logger.error(f"Error during streamed analysis: {repr(e)}")
+            storage.fail_output(output.id)
+            finished = True
+            yield sse_event("error", {"error": f"Internal error during analysis: {str(e)}"})
+        finally:
+            # the client disconnected: the generator is closed at the section it was sent last
+            if not finished:
+                logger.warning(f"Client disconnected, streamed analysis of {input_file_path} cancelled")
+                storage.fail_output(output.id, status="cancelled")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return the status (and result once finished) of a queued analysis"""
+    job = job_queue.get(job_id) or ingest_queue.get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": f"Job {job_id} not found"}, status_code=404)
+    return job.to_dict()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 asks for this header)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """Content codings of an Accept-Encoding header that the client did not refuse with q=0"""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()[2:] if params.strip().startswith("q=") else "1"
+        try:
+            if float(q) > 0:
+                accepted.add(coding.strip().lower())
+        except ValueError:
+            continue
+    return accepted
+
+def output_summary(output):
+    return {**output.to_dict(), "url": f"/outputs/{output.id}"}
+
+@app.get("/outputs")
+async def list_outputs(request: Request, cursor: int = 0, limit: int = 50, status: Optional[str] = None,
+                       input_id: Optional[int] = None):
+    """Outputs after `cursor`, oldest first; pass `next_cursor` back to get the next page"""
+    limit = max(1, min(limit, OUTPUTS_PAGE_MAX))
+    outputs = storage.list_outputs(after=cursor, limit=limit, status=status, input_id=input_id)
+    body = json.dumps({
+        "items": [output_summary(output) for output in outputs],
+        "next_cursor": outputs[-1].id if len(outputs) == limit else None,
+    }, ensure_ascii=False).encode("utf-8")
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.api_route("/outputs/{output_id}", methods=["GET", "HEAD"])
+async def get_output(request: Request, output_id: int):
+    """Serve a finished output file as it is stored on disk.
+
+    The strong ETag is the content hash recorded in the index, so polling
+    clients get a 304 without the file being read. The precompressed
+    `.br` / `.gz` copy is sent when the client accepts it; byte ranges are
+    always served from the uncompressed file.
+    """
+    output = storage.get_output(output_id)
+    if output is None:
+        return JSONResponse(content={"error": f"Output {output_id} not found"}, status_code=404)
+    if output.status not in ("done", "fallback"):
+        # pending outputs are still being analyzed, failed ones never will be
+        return JSONResponse(content={"error": f"Output {output_id} is {output.status}", "status": output.status},
+                            status_code=202 if output.status == "pending" else 404)
+
+    path, etag, headers = output.path, f'"{output.sha256}"', {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    # a fallback output is the local pre-analysis, not a model answer
+    headers["X-Output-Status"] = output.status
+    if "range" not in request.headers:
+        accepted = accepted_encodings(request.headers.get("accept-encoding"))
+        for encoding in ENCODINGS:  # brotli first: it is the smaller one
+            variant = storage.variant_path(output_id, encoding)
+            if encoding in accepted and os.path.exists(variant):
+                path, etag = variant, f'"{output.sha256}-{encoding}"'
+                headers["Content-Encoding"] = encoding
+                break
+    headers["ETag"] = etag
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"})
+    return FileResponse(path, media_type="application/json", headers=headers)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the analysis result cache and of the per-product extract cache"""
+    return {**result_cache.stats(), "extracts": extract_cache.stats()}
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the background warm-up (model client, heavy modules, API test) succeeded"""
+    content = {**readiness, "import_seconds": IMPORT_SECONDS}
+    return JSONResponse(content=content, status_code=200 if readiness["status"] == "ready" else 503)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Per-stage latency histograms, token/cost totals, retries, rate-limit rejections and queue depth
+    in the Prometheus text format"""
+    queue = job_queue.stats()
+    QUEUE_DEPTH.set(queue["queued"], state="queued")
+    QUEUE_DEPTH.set(queue["running"], state="running")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+IMPORT_SECONDS = round(time.perf_counter() - STARTED, 3)
+STARTUP_SECONDS.set(IMPORT_SECONDS, phase="import")
+logger.info(f"App imported in {IMPORT_SECONDS:.3f}s")
+
 if __name__ == "__main__":
     HOST = os.getenv("HOST") 
     PORT = int(os.getenv("PORT"))  
@@ -0,0 +1,206 @@
+# Python standard libraries
+import json
+from typing import List, Optional, Tuple
+# external libraries
+from pydantic import ValidationError
+# Internal project libraries
+from base_model import ContentGapAnalysisResult, ProductReviewGap, parse_model_json, repair_model_json
+from cache import ResultCache, make_cache_key
+from logger import get_logger
+
+logger = get_logger()
+
+# Map stage: one call per product
+EXTRACT_PROMPT = """
+You are an AI assistant specialized in **Content Gap Analysis**.
+Task:
+- Read the description and customer reviews of ONE product.
+- Extract its features and the topics customers talk about.
+Output Format:
+{
+"features": ["..."],
+"review_topics": ["..."],
+"missing_in_description": ["..."]
+}
+Rules:
+1. Analyze in English, but output must be in Persian(just values not field names).
+2. Features: short phrases for every feature or spec stated in the description.
+3. Review topics: short phrases for what the reviews ask about or mention.
+4. 'missing_in_description' lists review topics the description does not cover.
+5. A review given as {"text": "...", "count": N} stands for N near-identical reviews; weigh it accordingly.
+6. The response must be a valid JSON.
+7. Do not include any text outside the JSON.
+8. use double quotes for all keys and string values."""
+
+# Merge stage: compare the extracted features of all products
+MERGE_PROMPT = """
+You are an AI assistant specialized in **Content Gap Analysis**.
+Task:
+- You get the extracted features of several listings of comparable products.
+- Split them into features shared by all products and features exclusive to one product.
+Output Format:
+{
+"common_features": ["..."],
+"unique_features": {
+  "Product_Name_1": ["..."],
+  "Product_Name_2": ["..."]
+}
+}
+Rules:
+1. Output must be in Persian(just values not field names).
+2. Common features: Only those appearing in all products (treat paraphrases as the same feature).
+3. Unique features: Only features exclusive to a product; use the product names exactly as given.
+4. The response must be a valid JSON.
+5. Do not include any text outside the JSON.
+6. use double quotes for all keys and string values."""
+
+# Final stage: marketing summary of the merged result
+INSIGHT_PROMPT = """
+You are an AI assistant specialized in **Content Gap Analysis**.
+Task:
+- You get the common features, unique features and customer gaps of comparable products.
+- Write a marketing insight for the marketing team.
+Output Format:
+{
+"marketing_insight": "..."
+}
+Rules:
+1. Marketing insight: 3-4 short sentences in Persian summarizing key points and what features/benefits should be highlighted.
+2. The response must be a valid JSON.
+3. Do not include any text outside the JSON.
+4. use double quotes for all keys and string values."""
+
+PROMPTS_SIGNATURE = EXTRACT_PROMPT + MERGE_PROMPT + INSIGHT_PROMPT
+EXTRACT_SECTIONS = ("features", "review_topics", "missing_in_description")
+
+
+def split_products(content: str) -> List[dict]:
+    """Return the products of a `{"products": [...]}` input document."""
+    try:
+        products = json.loads(content)["products"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Map-reduce mode needs a JSON input of the form {\"products\": [...]}")
+    if not isinstance(products, list) or not products:
+        raise ValueError("Map-reduce mode needs at least one product")
+    return products
+
+
+def _messages(system_prompt: str, payload) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+    ]
+
+
+def extract_key(llm, product: dict) -> str:
+    """Cache key of one product's extract: its description and reviews (not its name), the prompt and the model."""
+    payload = json.dumps({"description": product.get("description", ""), "reviews": product.get("reviews", [])},
+                         ensure_ascii=False)
+    return make_cache_key(payload, EXTRACT_PROMPT, llm.model, llm.settings)
+
+
+def parse_extract(text: str) -> Tuple[dict, bool]:
+    """One product's extract from a raw answer, and whether it is worth caching.
+
+    An answer that was cut off, is not JSON, has fields that are not lists of
+    strings or has neither features nor review topics is still used for this
+    run, but not cached: incremental mode would reuse it for the whole TTL.
+    """
+    data, missing = repair_model_json(text, EXTRACT_SECTIONS)
+    extract, valid = {}, not missing
+    for section in EXTRACT_SECTIONS:
+        values = data.get(section, [])
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            values, valid = [], False
+        extract[section] = values
+    return extract, valid and bool(extract["features"] or extract["review_topics"])
+
+
+def extract_products(llm, products: List[dict], max_concurrency: int = 4,
+                     cache: Optional[ResultCache] = None) -> List[dict]:
+    """Map stage: extract features and review topics of every product concurrently.
+
+    With a `cache`, products whose description and reviews were extracted
+    before are not sent again, so re-analyzing a catalog after a few reviews
+    changed only calls the model for the changed products.
+    """
+    keys = [extract_key(llm, product) for product in products] if cache is not None else []
+    pieces = [cache.get(key) for key in keys] if cache is not None else [None] * len(products)
+    changed = [i for i, piece in enumerate(pieces) if piece is None]
+    if changed:
+        batch = [_messages(EXTRACT_PROMPT, products[i]) for i in changed]
+        responses = llm.batch(batch, config={"max_concurrency": max_concurrency})
+        for i, response in zip(changed, responses):
+            pieces[i], valid = parse_extract(response.content)
+            if not valid:
+                logger.warning(f"Extract of {products[i].get('name', '')!r} is empty or cut off, not cached")
+            elif cache is not None:
+                cache.set(keys[i], pieces[i])
+    logger.info(f"Map stage extracted {len(changed)} of {len(products)} products, reused the rest")
+    return [{"product_name": product.get("name", ""), **piece} for product, piece in zip(products, pieces)]
+
+
+def customer_gaps(extracts: List[dict]) -> List[dict]:
+    return [
+        ProductReviewGap(
+            product_name=e["product_name"],
+            review_mentions=e["review_topics"],
+            missing_in_description=e["missing_in_description"],
+        ).model_dump()
+        for e in extracts
+    ]
+
+
+def merge_extracts(llm, extracts: List[dict]) -> dict:
+    """Reduce stage: common/unique features from the model, customer gaps straight from the extracts."""
+    payload = [{"product_name": e["product_name"], "features": e["features"]} for e in extracts]
+    data = parse_model_json(llm.invoke(_messages(MERGE_PROMPT, payload)).content)
+
+    names = [e["product_name"] for e in extracts]
+    unique = data.get("unique_features", {}) or {}
+    return {
+        "common_features": list(data.get("common_features", [])),
+        # keys must be the original product names so the consistency check holds
+        "unique_features": {name: list(unique.get(name, [])) for name in names},
+        "customer_gaps": customer_gaps(extracts),
+    }
+
+
+def merge_locally(extracts: List[dict]) -> dict:
+    """Reduce stage without the model: common/unique features by phrase similarity (see feature_engine)."""
+    # imported lazily: the feature engine pulls in NumPy/SciPy
+    from feature_engine import compare_features
+
+    names = [e["product_name"] for e in extracts]
+    analysis = compare_features(names, [e["features"] for e in extracts], [[] for _ in extracts])
+    return {
+        "common_features": analysis["common_features"],
+        "unique_features": analysis["unique_features"],
+        "customer_gaps": customer_gaps(extracts),
+    }
+
+
+def write_insight(llm, merged: dict) -> str:
+    """Final stage: marketing insight for the merged result."""
+    data = parse_model_json(llm.invoke(_messages(INSIGHT_PROMPT, merged)).content)
+    return data.get("marketing_insight", "")
+
+
+def run_map_reduce(llm, content: str, max_concurrency: int = 4, cache: Optional[ResultCache] = None,
+                   local_merge: bool = False) -> dict:
+    """Analyze a large input product by product and merge the pieces into one result.
+
+    `cache` keeps the per-product extracts between runs; with `local_merge`
+    the pieces are merged without a model call, so only changed products
+    and the marketing insight cost a request.
+    """
+    products = split_products(content)
+    extracts = extract_products(llm, products, max_concurrency, cache)
+    merged = merge_locally(extracts) if local_merge else merge_extracts(llm, extracts)
+    merged["marketing_insight"] = write_insight(llm, merged)
+    try:
+        return ContentGapAnalysisResult(**merged).model_dump(by_alias=True)
+    except ValidationError as ve:
+        logger.error("Merged map-reduce output does not match expected structure!")
+        logger.error(ve.json())
+        raise
@@ -0,0 +1,167 @@
+# Python standard libraries
+import math
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base class: a named family of time series keyed by label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: list = None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_number(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing total."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: list = None):
+        super().__init__(name, help, labels, registry)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _labels(self.label_names, key), value) for key, value in items]
+
+
+class Gauge(Metric):
+    """Current value that can go up and down."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: list = None):
+        super().__init__(name, help, labels, registry)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _labels(self.label_names, key), value) for key, value in items]
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets, plus their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry: list = None):
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}  # key -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block took, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def totals(self) -> Dict[Tuple, Tuple[int, float]]:
+        """(count, sum) of every label set."""
+        with self._lock:
+            return {key: (sum(counts), total) for key, (counts, total) in self._series.items()}
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        samples = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", _labels(self.label_names, key, f'le="{_number(bound)}"'), cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.label_names, key), total))
+            samples.append((f"{self.name}_count", _labels(self.label_names, key), cumulative))
+        return samples
+
+
+REGISTRY = []
+
+
+def render(registry: list = None) -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    return "\n".join(metric.render() for metric in (REGISTRY if registry is None else registry)) + "\n"
+
+
+# Pipeline metrics (per process; with several uvicorn workers each one is scraped on its own)
+STAGE_SECONDS = Histogram("content_gap_stage_seconds", "Time spent in each pipeline stage", labels=("stage",))
+LLM_TOKENS = Counter("content_gap_llm_tokens_total", "Tokens used by model calls", labels=("kind",))
+LLM_COST = Counter("content_gap_llm_cost_usd_total", "Estimated model cost in USD")
+LLM_RETRIES = Counter("content_gap_llm_retries_total", "Model calls retried after a transient error", labels=("backend",))
+LLM_FAILURES = Counter("content_gap_llm_failures_total", "Model calls that failed for good", labels=("backend",))
+RATE_LIMITED = Counter("content_gap_rate_limited_total", "Requests rejected by the per-client rate limit", labels=("scope",))
+STARTUP_SECONDS = Gauge("content_gap_startup_seconds", "Seconds from process start until the app was imported / ready", labels=("phase",))
+QUEUE_DEPTH = Gauge("content_gap_queue_depth", "Analysis jobs by state, read when /metrics is scraped", labels=("state",))
+
+
+def stage(name: str):
+    """Time a pipeline stage: `with stage("llm_call"): ...`"""
+    return STAGE_SECONDS.time(stage=name)
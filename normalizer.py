@@ -0,0 +1,70 @@
+# Python standard libraries
+import re
+from typing import Iterable, Iterator
+
+ZWNJ = "\u200c"
+PERSIAN_PUNCTUATION = "،؛؟"
+
+# Once whitespace is collapsed to single spaces, every remaining change is one of these
+# (one pattern, so the text is scanned once; see _replace for what each match becomes)
+GAPS = re.compile(
+    r"\( "                                      # space after '(' is dropped
+    r"|[،؛؟] ?"                                 # exactly one space after Persian punctuation
+    r"| (?=[),.!?;:])"                          # space before ')' and Latin punctuation is dropped
+    r"|[آ-ی](?=[A-Za-z0-9])|[A-Za-z0-9](?=[آ-ی])"  # Persian and Latin/digits are separated
+)
+
+
+def _replace(match: re.Match) -> str:
+    text = match.group()
+    if text == " ":
+        return ""
+    if text == "( ":
+        return "("
+    if text[0] in PERSIAN_PUNCTUATION:
+        following = match.string[match.end():match.end() + 1]
+        return text[0] if following in (")", "") else text[0] + " "
+    return text + " "
+
+
+def _collapse(text: str) -> str:
+    """Whitespace runs and zero-width non-joiners become one space; both ends are stripped."""
+    return " ".join(text.replace(ZWNJ, " ").split())
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and fix spacing around punctuation and Persian/Latin boundaries."""
+    return GAPS.sub(_replace, _collapse(text))
+
+
+class MixedTextNormalizer:
+    """Streaming form of `normalize_text`: feed chunks, get the normalized text piece by piece.
+
+    The spacing after the last non-space character depends on what comes
+    next, so that character (already emitted) and one pending space are kept
+    as context for the next chunk. The concatenated output equals
+    `normalize_text` of the whole document.
+    """
+
+    def __init__(self):
+        self._carry = ""
+
+    def feed(self, chunk: str) -> str:
+        buf = self._carry + chunk.replace(ZWNJ, " ")
+        stop = len(buf.rstrip())
+        if not stop:  # leading whitespace of the document
+            return ""
+        out = GAPS.sub(_replace, _collapse(buf[:stop]))
+        if self._carry:
+            out = out[1:]  # the context character was emitted with the previous chunk
+        self._carry = buf[stop - 1] + (" " if stop < len(buf) else "")
+        return out
+
+
+def normalize_stream(chunks: Iterable[str]) -> Iterator[str]:
+    """Normalize a document given as chunks (e.g. read from a file) without joining it."""
+    normalizer = MixedTextNormalizer()
+    for chunk in chunks:
+        out = normalizer.feed(chunk)
+        if out:
+            yield out
@@ -0,0 +1,116 @@
+# Python standard libraries
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+# Internal project libraries
+from logger import get_logger
+
+logger = get_logger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    scope TEXT NOT NULL,
+    client TEXT NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (scope, client)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS buckets_updated ON buckets (updated);
+"""
+PRUNE_EVERY = 1000  # acquires between removals of idle buckets
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Refill `per_minute` tokens a minute, hold at most `burst`; a rate of 0 disables the limit."""
+    per_minute: float
+    burst: float
+
+    @property
+    def per_second(self) -> float:
+        return self.per_minute / 60.0
+
+    @classmethod
+    def from_env(cls, scope: str, per_minute: float, burst: float) -> "Rule":
+        prefix = f"RATE_LIMIT_{scope.upper()}"
+        return cls(per_minute=float(os.getenv(f"{prefix}_PER_MINUTE", str(per_minute))),
+                   burst=float(os.getenv(f"{prefix}_BURST", str(burst))))
+
+
+def hash_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+
+def known_keys(api_keys: Iterable[str]) -> FrozenSet[str]:
+    """Hashes of the configured API keys, for `client_key`."""
+    return frozenset(hash_key(key.strip()) for key in api_keys if key.strip())
+
+
+def client_key(api_key: Optional[str], host: Optional[str], keys: FrozenSet[str] = frozenset()) -> str:
+    """Bucket owner: the API key if it is one of the configured `keys` (stored hashed), else the client
+    address. Unknown keys are ignored, so a new key per request does not get a fresh bucket."""
+    if api_key and hash_key(api_key) in keys:
+        return "key:" + hash_key(api_key)
+    return f"ip:{host or 'unknown'}"
+
+
+class RateLimiter:
+    """Per-client token buckets kept in SQLite, so every worker process shares the same limits.
+
+    Each `acquire` is one short write transaction (BEGIN IMMEDIATE), which
+    serializes concurrent updates of a bucket across threads and processes.
+    """
+
+    def __init__(self, db_path: str, rules: Dict[str, Rule]):
+        self.db_path = db_path
+        self.rules = rules
+        self._local = threading.local()
+        self._count = 0
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def acquire(self, scope: str, client: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """Take `cost` tokens from the client's bucket; returns (allowed, seconds until it would be)."""
+        rule = self.rules.get(scope)
+        if rule is None or rule.per_minute <= 0:
+            return True, 0.0
+
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()  # after the lock: a writer that waited must not refill from a stale clock
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE scope = ? AND client = ?",
+                             (scope, client)).fetchone()
+            tokens = rule.burst if row is None else min(rule.burst, row[0] + (now - row[1]) * rule.per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            db.execute("INSERT OR REPLACE INTO buckets (scope, client, tokens, updated) VALUES (?, ?, ?, ?)",
+                       (scope, client, tokens, now))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+        self._count += 1
+        if self._count % PRUNE_EVERY == 0:
+            self.prune(now)
+        return allowed, 0.0 if allowed else (cost - tokens) / rule.per_second
+
+    def prune(self, now: Optional[float] = None):
+        """Drop buckets that have been idle long enough to be full again (they start full anyway)."""
+        now = now or time.time()
+        refill = max((r.burst / r.per_second for r in self.rules.values() if r.per_minute > 0), default=0)
+        self._connection().execute("DELETE FROM buckets WHERE updated < ?", (now - refill,))
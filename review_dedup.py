@@ -0,0 +1,128 @@
+# Python standard libraries
+import re
+from typing import List, Optional, Tuple
+# external libraries
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+# Internal project libraries
+from logger import get_logger
+
+logger = get_logger()
+
+SHINGLE_SIZE = 4      # characters per shingle
+NUM_PERM = 32         # MinHash signature length
+BANDS = 8             # LSH bands of NUM_PERM // BANDS rows each
+NON_WORD = re.compile(r"[\W_]+")
+
+_rng = np.random.default_rng(20251026)  # fixed seed: signatures must be stable across runs
+_MULTIPLIERS = _rng.integers(1, 2 ** 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_OFFSETS = _rng.integers(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 2 ** 63, size=NUM_PERM // BANDS, dtype=np.uint64) | np.uint64(1)
+
+
+def canonical_review(text: str) -> str:
+    """Lowercase and strip punctuation/zero-width joiners so only wording is compared."""
+    return NON_WORD.sub(" ", text.replace("‌", "").lower()).strip()
+
+
+def shingle_hashes(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Hash every character shingle of every text at once.
+
+    Returns the shingle hashes and, for each text, the offset of its first
+    shingle in that array (texts shorter than a shingle are padded).
+    """
+    k = SHINGLE_SIZE
+    padded = [t.ljust(k) for t in texts]
+    lengths = np.fromiter((len(t) for t in padded), dtype=np.int64, count=len(padded))
+    codes = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+    text_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    counts = lengths - k + 1
+    # position of every shingle inside `codes`
+    positions = np.repeat(text_starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    positions += np.arange(int(counts.sum()), dtype=np.int64)
+
+    hashes = np.zeros(len(positions), dtype=np.uint64)
+    for j in range(k):
+        hashes = hashes * np.uint64(1000003) + codes[positions + j]
+    shingle_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return hashes, shingle_starts
+
+
+def minhash_signatures(texts: List[str]) -> np.ndarray:
+    """(len(texts), NUM_PERM) MinHash signatures using multiply-shift hashing."""
+    hashes, starts = shingle_hashes(texts)
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint64)
+    permuted = np.empty_like(hashes)
+    for p in range(NUM_PERM):
+        np.multiply(hashes, _MULTIPLIERS[p], out=permuted)
+        np.add(permuted, _OFFSETS[p], out=permuted)
+        np.right_shift(permuted, np.uint64(32), out=permuted)
+        signatures[:, p] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+def similar_pairs(signatures: np.ndarray, threshold: float = 0.6, blocks: Optional[np.ndarray] = None,
+                  batch: int = 1 << 16) -> Tuple[np.ndarray, np.ndarray]:
+    """Index pairs of rows whose signatures agree on at least `threshold` of their positions.
+
+    Rows that share a band are sorted next to each other, so only
+    neighbours are compared (at most n - 1 candidates per band); they are
+    verified on the full signature in batches, so `signatures` may be a
+    memory-mapped array larger than RAM. With `blocks` (one uint64 per row),
+    only rows with the same block value are paired.
+    """
+    rows = NUM_PERM // BANDS
+    left, right = [], []
+    for band in range(BANDS):
+        block = np.asarray(signatures[:, band * rows:(band + 1) * rows], dtype=np.uint64)
+        keys = (block * _BAND_MIX).sum(axis=1)  # wraps on overflow, which is fine for bucketing
+        del block
+        if blocks is not None:
+            keys = keys * _BAND_MIX[0] + blocks
+        order = np.argsort(keys, kind="stable")
+        same = keys[order[1:]] == keys[order[:-1]]
+        a, b = order[:-1][same], order[1:][same]
+        # verify candidates on the full signature to drop band collisions
+        for start in range(0, len(a), batch):
+            part_a, part_b = a[start:start + batch], b[start:start + batch]
+            similar = (signatures[part_a] == signatures[part_b]).mean(axis=1) >= threshold
+            if blocks is not None:
+                similar &= blocks[part_a] == blocks[part_b]
+            left.append(part_a[similar])
+            right.append(part_b[similar])
+    empty = np.empty(0, dtype=np.int64)
+    return (np.concatenate(left), np.concatenate(right)) if left else (empty, empty)
+
+
+def signature_groups(signatures: np.ndarray, threshold: float = 0.6, blocks: Optional[np.ndarray] = None) -> np.ndarray:
+    """Label each row with a group id; rows linked by similar signatures (in the same block) share a group."""
+    n = len(signatures)
+    if n < 2:
+        return np.zeros(n, dtype=np.int64)
+    left, right = similar_pairs(signatures, threshold, blocks)
+    graph = sparse.coo_matrix((np.ones(len(left), dtype=np.int8), (left, right)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    return labels
+
+
+def near_duplicate_groups(texts: List[str], threshold: float = 0.6) -> np.ndarray:
+    """Label each text with a group id; texts with estimated Jaccard >= threshold share a group."""
+    if len(texts) < 2:
+        return np.zeros(len(texts), dtype=np.int64)
+    return signature_groups(minhash_signatures(texts), threshold)
+
+
+def collapse_reviews(reviews: List[str], threshold: float = 0.6) -> List[Tuple[str, int]]:
+    """Collapse near-identical reviews into (first occurrence, number of reviews it stands for)."""
+    texts = [r for r in reviews if isinstance(r, str) and r.strip()]
+    if not texts:
+        return []
+    labels = near_duplicate_groups([canonical_review(t) for t in texts], threshold)
+    _, first, counts = np.unique(labels, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    collapsed = [(texts[first[i]], int(counts[i])) for i in order]
+    if len(collapsed) < len(texts):
+        logger.info(f"Collapsed {len(texts)} reviews into {len(collapsed)} distinct ones")
+    return collapsed
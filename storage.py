@@ -0,0 +1,326 @@
+# Python standard libraries
+import os
+import re
+import gzip
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import List, Optional
+# Internal project libraries
+from logger import get_logger
+
+logger = get_logger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inputs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS inputs_sha256 ON inputs (sha256);
+CREATE TABLE IF NOT EXISTS outputs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    input_id INTEGER REFERENCES inputs (id),
+    status TEXT NOT NULL,              -- pending -> done | fallback | failed | cancelled
+    sha256 TEXT,
+    size INTEGER,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS outputs_input_id ON outputs (input_id);
+"""
+SCHEMA_VERSION = 1
+COMPRESS_MIN_BYTES = 512  # smaller outputs are served as they are
+
+
+def _brotli():
+    """The brotli module, or None when it is not installed (only gzip variants are written then)."""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+# Content-Encoding -> (file suffix, compress(bytes) -> bytes)
+ENCODINGS = {
+    "br": (".br", lambda data: _brotli().compress(data, quality=11)),
+    "gzip": (".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+}
+
+
+def atomic_write(path: str, data, encoding: str = "utf-8"):
+    """Write `data` (str or bytes) to `path` through a temp file in the same folder and a rename."""
+    folder = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.encode(encoding) if isinstance(data, str) else data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def file_digest(path: str):
+    """(sha256 hex digest, size in bytes) of a file."""
+    sha, size = hashlib.sha256(), 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+            size += len(block)
+    return sha.hexdigest(), size
+
+
+@dataclass
+class InputRecord:
+    """An uploaded input file."""
+    id: int
+    path: str
+    filename: Optional[str]
+    sha256: str
+    size: int
+    created_at: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class OutputRecord:
+    """An analysis result and the input it was computed from."""
+    id: int
+    path: str
+    input_id: Optional[int]
+    status: str
+    sha256: Optional[str]
+    size: Optional[int]
+    created_at: float
+    finished_at: Optional[float]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class Storage:
+    """Input/output files indexed in SQLite.
+
+    Files keep their `input{id}.json` / `output{id}.json` names, but ids come
+    from the database (allocated atomically, also across processes), so
+    nothing ever scans or parses the folders. Every record keeps the
+    content hash, size and timestamps; outputs link to their input.
+    """
+
+    def __init__(self, root: str, db_path: Optional[str] = None):
+        self.inputs_folder = os.path.join(root, "inputs")
+        self.outputs_folder = os.path.join(root, "outputs")
+        os.makedirs(self.inputs_folder, exist_ok=True)
+        os.makedirs(self.outputs_folder, exist_ok=True)
+        self.db_path = db_path or os.path.join(root, "index.sqlite3")
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+        if self._connection().execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._backfill()
+
+    # --- connections ---
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections must not be shared between threads)."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database write lock up front."""
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def input_path(self, input_id: int) -> str:
+        return os.path.join(self.inputs_folder, f"input{input_id}.json")
+
+    def output_path(self, output_id: int) -> str:
+        return os.path.join(self.outputs_folder, f"output{output_id}.json")
+
+    def variant_path(self, output_id: int, encoding: str) -> str:
+        """Path of the precompressed (`gzip` / `br`) copy of an output, next to it."""
+        return self.output_path(output_id) + ENCODINGS[encoding][0]
+
+    def _backfill(self):
+        """Index the files written before the database existed (runs once)."""
+        pattern = re.compile(r"^(input|output)(\d+)\.json$")
+        found = {"input": [], "output": []}
+        for folder in (self.inputs_folder, self.outputs_folder):
+            for name in os.listdir(folder):
+                match = pattern.match(name)
+                if match:
+                    found[match.group(1)].append(int(match.group(2)))
+
+        with self._transaction() as db:
+            for input_id in sorted(found["input"]):
+                path = self.input_path(input_id)
+                sha, size = file_digest(path)
+                db.execute("INSERT OR IGNORE INTO inputs (id, filename, sha256, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                           (input_id, os.path.basename(path), sha, size, os.path.getmtime(path)))
+            for output_id in sorted(found["output"]):
+                path = self.output_path(output_id)
+                sha, size = file_digest(path)
+                mtime = os.path.getmtime(path)
+                db.execute("INSERT OR IGNORE INTO outputs (id, input_id, status, sha256, size, created_at, finished_at) "
+                           "VALUES (?, NULL, 'done', ?, ?, ?, ?)", (output_id, sha, size, mtime, mtime))
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        if found["input"] or found["output"]:
+            logger.info(f"Indexed {len(found['input'])} existing inputs and {len(found['output'])} outputs")
+
+    # --- inputs ---
+    def _input(self, row) -> Optional[InputRecord]:
+        if row is None:
+            return None
+        return InputRecord(id=row["id"], path=self.input_path(row["id"]), filename=row["filename"],
+                           sha256=row["sha256"], size=row["size"], created_at=row["created_at"])
+
+    def new_temp_input(self) -> str:
+        """Path of a fresh temp file in the inputs folder, to be filled and passed to `add_input`."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.inputs_folder, suffix=".tmp")
+        os.close(fd)
+        return tmp_path
+
+    def add_input(self, tmp_path: str, filename: Optional[str], sha256: str, size: int) -> InputRecord:
+        """Store a completely written temp file (see `new_temp_input`) under the next free id."""
+        now = time.time()
+        with self._transaction() as db:
+            input_id = db.execute("INSERT INTO inputs (filename, sha256, size, created_at) VALUES (?, ?, ?, ?)",
+                                  (filename, sha256, size, now)).lastrowid
+            # renamed inside the transaction: once the row is visible, the file is there
+            os.replace(tmp_path, self.input_path(input_id))
+        return InputRecord(input_id, self.input_path(input_id), filename, sha256, size, now)
+
+    def save_input(self, data: bytes, filename: Optional[str] = None) -> InputRecord:
+        """Store an uploaded file under the next free id."""
+        tmp_path = self.new_temp_input()
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            return self.add_input(tmp_path, filename, hashlib.sha256(data).hexdigest(), len(data))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get_input(self, input_id: int) -> Optional[InputRecord]:
+        return self._input(self._connection().execute("SELECT * FROM inputs WHERE id = ?", (input_id,)).fetchone())
+
+    def latest_input(self) -> Optional[InputRecord]:
+        """The most recently uploaded input (by id, not by file name)."""
+        return self._input(self._connection().execute("SELECT * FROM inputs ORDER BY id DESC LIMIT 1").fetchone())
+
+    def find_input(self, sha256: str) -> Optional[InputRecord]:
+        """The latest input with exactly this content, if any."""
+        return self._input(self._connection().execute(
+            "SELECT * FROM inputs WHERE sha256 = ? ORDER BY id DESC LIMIT 1", (sha256,)).fetchone())
+
+    # --- outputs ---
+    def _output(self, row) -> Optional[OutputRecord]:
+        if row is None:
+            return None
+        return OutputRecord(id=row["id"], path=self.output_path(row["id"]), input_id=row["input_id"],
+                            status=row["status"], sha256=row["sha256"], size=row["size"],
+                            created_at=row["created_at"], finished_at=row["finished_at"])
+
+    def reserve_output(self, input_id: Optional[int]) -> OutputRecord:
+        """Allocate the output id of an analysis before it runs, so queued jobs never share a file."""
+        now = time.time()
+        with self._transaction() as db:
+            output_id = db.execute("INSERT INTO outputs (input_id, status, created_at) VALUES (?, 'pending', ?)",
+                                   (input_id, now)).lastrowid
+        return OutputRecord(output_id, self.output_path(output_id), input_id, "pending", None, None, now, None)
+
+    def complete_output(self, output_id: int, status: str = "done") -> OutputRecord:
+        """Record the hash and size of a finished output file and write its compressed variants.
+
+        `status` is "fallback" for an output the local engine wrote because the model call failed.
+        """
+        sha, size = file_digest(self.output_path(output_id))
+        self._compress_output(output_id)
+        with self._transaction() as db:
+            db.execute("UPDATE outputs SET status = ?, sha256 = ?, size = ?, finished_at = ? WHERE id = ?",
+                       (status, sha, size, time.time(), output_id))
+        return self.get_output(output_id)
+
+    def _compress_output(self, output_id: int):
+        """Store gzip and (if available) brotli copies once, so serving them costs no CPU.
+
+        A variant is only kept when it is actually smaller than the output.
+        """
+        with open(self.output_path(output_id), "rb") as f:
+            data = f.read()
+        for encoding in ENCODINGS:
+            path = self.variant_path(output_id, encoding)
+            if len(data) < COMPRESS_MIN_BYTES or (encoding == "br" and _brotli() is None):
+                continue
+            compressed = ENCODINGS[encoding][1](data)
+            if len(compressed) < len(data):
+                atomic_write(path, compressed)
+
+    def _remove_files(self, output_id: int):
+        for path in [self.output_path(output_id)] + [self.variant_path(output_id, e) for e in ENCODINGS]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def fail_output(self, output_id: int, status: str = "failed"):
+        """Mark an analysis as failed (or "cancelled" when nobody waits for it) and drop whatever it left behind."""
+        self._remove_files(output_id)
+        with self._transaction() as db:
+            db.execute("UPDATE outputs SET status = ?, finished_at = ? WHERE id = ?", (status, time.time(), output_id))
+
+    def expire_pending(self, older_than: float) -> List[int]:
+        """Mark outputs still pending `older_than` seconds after they were reserved as failed.
+
+        Their analysis died with the process that ran it (a crash or a restart
+        with jobs still queued); returns their ids.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            ids = [row["id"] for row in db.execute("SELECT id FROM outputs WHERE status = 'pending' AND created_at < ?",
+                                                   (now - older_than,))]
+            db.executemany("UPDATE outputs SET status = 'failed', finished_at = ? WHERE id = ?",
+                           [(now, output_id) for output_id in ids])
+        for output_id in ids:
+            self._remove_files(output_id)
+        return ids
+
+    def get_output(self, output_id: int) -> Optional[OutputRecord]:
+        return self._output(self._connection().execute("SELECT * FROM outputs WHERE id = ?", (output_id,)).fetchone())
+
+    def list_outputs(self, after: int = 0, limit: int = 50, status: Optional[str] = None,
+                     input_id: Optional[int] = None) -> List[OutputRecord]:
+        """Outputs with an id above `after`, oldest first (keyset pagination: pass the last id as `after`)."""
+        query, params = "SELECT * FROM outputs WHERE id > ?", [after]
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        if input_id is not None:
+            query += " AND input_id = ?"
+            params.append(input_id)
+        rows = self._connection().execute(query + " ORDER BY id LIMIT ?", params + [limit])
+        return [self._output(row) for row in rows]
+
+    def outputs_for_input(self, input_id: int) -> list:
+        rows = self._connection().execute("SELECT * FROM outputs WHERE input_id = ? ORDER BY id", (input_id,))
+        return [self._output(row) for row in rows]
@@ -0,0 +1,215 @@
+# Python standard libraries
+import os
+import re
+import json
+import math
+from functools import lru_cache
+from dataclasses import dataclass, field, asdict
+from typing import List, Tuple
+# Internal project libraries
+from feature_engine import STOPWORDS, is_feature_bearing, tokenize
+from logger import get_logger
+
+logger = get_logger()
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?؟])\s+|\n+")
+PREVIEW_CHARS = 60     # length of a dropped piece in the report
+PREVIEWS_PER_PRODUCT = 5
+REFITS = 3             # retries with a tighter target when the pieces' token counts did not add up
+# "estimate" never loads tiktoken (which downloads its encoding file unless TIKTOKEN_CACHE_DIR holds it)
+TOKENIZER = os.getenv("TOKENIZER", "tiktoken")
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """tiktoken encoding of `model`, or None when it is unknown, cannot be loaded offline or TOKENIZER
+    is "estimate"."""
+    if TOKENIZER == "estimate":
+        return None
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:  # not installed, unknown model, or the encoding file cannot be downloaded
+        logger.warning(f"No tokenizer for {model} ({type(e).__name__}), estimating token counts")
+        return None
+
+
+def tokenizer_name(model: str) -> str:
+    encoding = _encoding(model)
+    return f"tiktoken:{encoding.name}" if encoding is not None else "estimate"
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Tokens of `text` for `model`; estimated from its characters when no tokenizer is available.
+
+    The estimate assumes 4 characters per token for ASCII and 3 for other
+    (mostly Persian, two UTF-8 bytes) characters, which errs on the high side
+    for both languages.
+    """
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    size = len(text.encode("utf-8"))
+    non_ascii = size - len(text)
+    return math.ceil((len(text) - non_ascii) / 4 + non_ascii / 3)
+
+
+def sentence_salience(sentence: str) -> float:
+    """Feature-bearing words per sentence length: specs and feature nouns score, filler scores 0."""
+    tokens = tokenize(sentence)
+    features = sum(1 for token in tokens if is_feature_bearing([token]))
+    return features / math.sqrt(len(tokens)) if tokens else 0.0
+
+
+def review_salience(review) -> float:
+    """Distinct content words (feature words count double), weighted by how many reviews it stands for."""
+    text, count = (review.get("text", ""), review.get("count", 1)) if isinstance(review, dict) else (review, 1)
+    words = {token for token in tokenize(str(text)) if token not in STOPWORDS}
+    score = len(words) + sum(1 for word in words if is_feature_bearing([word]))
+    return score * (1 + math.log(max(1, count)))
+
+
+@dataclass
+class BudgetReport:
+    """What the planner did to one input."""
+    budget: int
+    tokenizer: str
+    tokens_before: int
+    tokens_after: int
+    fits: bool = True
+    sentences_dropped: int = 0
+    reviews_dropped: int = 0
+    products: List[dict] = field(default_factory=list)  # per trimmed product: name, counts and previews
+
+    @property
+    def trimmed(self) -> bool:
+        return self.tokens_after < self.tokens_before
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class _Piece:
+    product: int
+    kind: str          # "sentence" | "review"
+    index: int
+    value: object
+    score: float
+    tokens: int
+    floor: bool = False  # best piece of its kind in its product: kept first
+
+
+def fit_to_budget(content: str, budget: int, model: str) -> Tuple[str, BudgetReport]:
+    """Trim an input document to at most `budget` tokens, keeping its most salient parts.
+
+    Every product keeps its name and, budget permitting, its best description
+    sentence and its best review; the remaining sentences and reviews are
+    added by salience until the budget is used up, in their original order.
+    Inputs that are not {"products": [...]} documents are trimmed sentence by
+    sentence the same way. Content that fits is returned unchanged.
+    """
+    before = count_tokens(content, model)
+    report = BudgetReport(budget=budget, tokenizer=tokenizer_name(model), tokens_before=before, tokens_after=before)
+    if before <= budget:
+        return content, report
+
+    try:
+        document = json.loads(content)
+        products = document["products"]
+        if not isinstance(products, list) or not all(isinstance(p, dict) for p in products):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return _fit_text(content, budget, model, report)
+
+    groups = []  # per product: its sentences, then its reviews, in document order
+    for p, product in enumerate(products):
+        group = []
+        sentences = [s for s in SENTENCE_SPLIT.split(str(product.get("description", ""))) if s.strip()]
+        reviews = product.get("reviews") if isinstance(product.get("reviews"), list) else []
+        for kind, values, salience in (("sentence", sentences, sentence_salience), ("review", reviews, review_salience)):
+            scored = [_Piece(p, kind, i, v, salience(v), count_tokens(json.dumps(v, ensure_ascii=False), model) + 1)
+                      for i, v in enumerate(values)]
+            if scored:
+                max(scored, key=lambda piece: piece.score).floor = True
+            group.extend(scored)
+        groups.append(group)
+
+    # everything but the trimmed description/review lists, which are refilled below
+    skeleton = {"products": [{**product, "description": "", "reviews": []} for product in products]}
+    fixed = count_tokens(json.dumps(skeleton, ensure_ascii=False), model)
+    ranked = sorted((piece for group in groups for piece in group), key=lambda piece: (not piece.floor, -piece.score, piece.product, piece.index))
+    target = budget
+    for _ in range(REFITS):
+        kept = _select(ranked, target - fixed)
+        trimmed_content = json.dumps({**document, "products": _rebuild(products, groups, kept)}, ensure_ascii=False)
+        tokens = count_tokens(trimmed_content, model)
+        if tokens <= budget:
+            break
+        target -= tokens - budget  # tokens do not add up exactly across piece boundaries
+
+    for product, group in zip(products, groups):
+        dropped = [piece for piece in group if id(piece) not in kept]
+        if dropped:
+            report.products.append({
+                "name": product.get("name"),
+                "sentences_dropped": sum(piece.kind == "sentence" for piece in dropped),
+                "reviews_dropped": sum(piece.kind == "review" for piece in dropped),
+                "dropped": [_preview(piece.value) for piece in dropped[:PREVIEWS_PER_PRODUCT]],
+            })
+    report.sentences_dropped = sum(entry["sentences_dropped"] for entry in report.products)
+    report.reviews_dropped = sum(entry["reviews_dropped"] for entry in report.products)
+    return trimmed_content, _finish(report, trimmed_content, model)
+
+
+def _select(ranked: List[_Piece], remaining: int) -> set:
+    """Ids of the pieces that fit, taken greedily in rank order (smaller ones may fill the gaps)."""
+    kept = set()
+    for piece in ranked:
+        if piece.tokens <= remaining:
+            kept.add(id(piece))
+            remaining -= piece.tokens
+    return kept
+
+
+def _rebuild(products: List[dict], groups: List[List[_Piece]], kept: set) -> List[dict]:
+    """Products with only the kept sentences and reviews, in their original order."""
+    rebuilt = []
+    for product, group in zip(products, groups):
+        mine = [piece for piece in group if id(piece) in kept]
+        trimmed = {**product, "description": " ".join(piece.value for piece in mine if piece.kind == "sentence")}
+        if "reviews" in product:
+            trimmed["reviews"] = [piece.value for piece in mine if piece.kind == "review"]
+        rebuilt.append(trimmed)
+    return rebuilt
+
+
+def _fit_text(content: str, budget: int, model: str, report: BudgetReport) -> Tuple[str, BudgetReport]:
+    """Free-text input: keep the most salient sentences that fit, in their original order."""
+    sentences = [s for s in SENTENCE_SPLIT.split(content) if s.strip()]
+    costs = [count_tokens(s, model) + 1 for s in sentences]
+    order = sorted(range(len(sentences)), key=lambda i: (-sentence_salience(sentences[i]), i))
+    kept, remaining = set(), budget
+    for i in order:
+        if costs[i] <= remaining:
+            kept.add(i)
+            remaining -= costs[i]
+    trimmed_content = "\n".join(sentences[i] for i in sorted(kept))
+    dropped = [sentences[i] for i in range(len(sentences)) if i not in kept]
+    report.sentences_dropped = len(dropped)
+    report.products.append({"name": None, "sentences_dropped": len(dropped), "reviews_dropped": 0,
+                            "dropped": [_preview(s) for s in dropped[:PREVIEWS_PER_PRODUCT]]})
+    return trimmed_content, _finish(report, trimmed_content, model)
+
+
+def _finish(report: BudgetReport, content: str, model: str) -> BudgetReport:
+    report.tokens_after = count_tokens(content, model)
+    report.fits = report.tokens_after <= report.budget
+    if not report.fits:
+        logger.warning(f"Input still has {report.tokens_after} tokens after trimming (budget {report.budget})")
+    return report
+
+
+def _preview(value) -> str:
+    text = value.get("text", "") if isinstance(value, dict) else str(value)
+    return text if len(text) <= PREVIEW_CHARS else text[:PREVIEW_CHARS - 1] + "…"
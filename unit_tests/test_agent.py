@@ -1,7 +1,13 @@
 import json
+import threading
 import pytest
 from unittest.mock import patch, MagicMock
-from agent import analyze_content_gaps
+from agent import (CACHE_MAX_BYTES, EXTRACT_CACHE_MAX_BYTES, analyze_content_gaps, extract_cache, prepare_content,
+                   readiness, result_cache, run_analysis, stream_content_gaps, warm_up)
+from compact_output import RESPONSE_FORMAT
+from llm_backend import FakeBackend
+from cache import ResultCache
+from metrics import STAGE_SECONDS
 
 @pytest.fixture
 def sample_input_file(tmp_path):
@@ -31,9 +37,9 @@ Reviews:
 def output_file(tmp_path):
     return tmp_path / "output.json"
 
-@patch("agent.llm.__call__")
+@patch("llm_backend.LLMBackend.invoke")
 def test_analyze_content_gaps_success(mock_call, sample_input_file, output_file):
-    """Test analyze_content_gaps with mocked ChatOpenAI __call__."""
+    """Test analyze_content_gaps with a mocked LLM backend call."""
     # Mock API response
     mock_response = MagicMock()
     mock_response.content = json.dumps({
@@ -66,4 +72,165 @@ def test_analyze_content_gaps_success(mock_call, sample_input_file, output_file)
     assert "customer_gaps" in data
     assert "marketing_insight" in data
     assert isinstance(data["customer_gaps"], list)
+
+@patch("agent.run_analysis")
+def test_analyze_content_gaps_reuses_cached_result(mock_run, sample_input_file, tmp_path, monkeypatch):
+    """A second analysis of the same input is served from the cache without calling the model."""
+    monkeypatch.setattr("agent.result_cache", ResultCache())
+    mock_run.return_value = {"common_features": [], "unique_features": {}, "customer_gaps": [],
+                             "marketing_insight": "cached"}
+
+    analyze_content_gaps(str(sample_input_file), str(tmp_path / "first.json"))
+    analyze_content_gaps(str(sample_input_file), str(tmp_path / "second.json"))
+
+    assert mock_run.call_count == 1
+    assert json.loads((tmp_path / "second.json").read_text(encoding="utf-8"))["marketing_insight"] == "cached"
+
+@patch("agent.run_analysis")
+def test_analyze_content_gaps_fast_mode_skips_llm(mock_run, tmp_path):
+    """Fast mode answers from the local engine without calling the model."""
+    input_file = tmp_path / "input.json"
+    input_file.write_text(json.dumps({"products": [
+        {"name": "Product A", "description": "باتری 10 ساعت. حذف نویز ANC", "reviews": ["بیس خوبه؟"]},
+        {"name": "Product B", "description": "حذف نویز ANC. بلوتوث 5.0", "reviews": []},
+    ]}, ensure_ascii=False), encoding="utf-8")
+    output_file = tmp_path / "output.json"
+
+    analyze_content_gaps(str(input_file), str(output_file), mode="fast")
+
+    mock_run.assert_not_called()
+    data = json.loads(output_file.read_text(encoding="utf-8"))
+    assert set(data["unique_features"]) == {"Product A", "Product B"}
+
+@patch("agent.run_analysis", side_effect=RuntimeError("model unavailable"))
+def test_analyze_content_gaps_marks_local_fallback(mock_run, tmp_path, monkeypatch):
+    """A failed model call is an error unless LOCAL_FALLBACK is on; then the local output is marked."""
+    monkeypatch.setattr("agent.result_cache", ResultCache())
+    monkeypatch.setattr("agent._llm", FakeBackend())
+    input_file = tmp_path / "input.json"
+    input_file.write_text(json.dumps({"products": [
+        {"name": "Product A", "description": "باتری 10 ساعت. حذف نویز ANC", "reviews": []},
+        {"name": "Product B", "description": "حذف نویز ANC. بلوتوث 5.0", "reviews": []},
+    ]}, ensure_ascii=False), encoding="utf-8")
+    output_file = tmp_path / "output.json"
+
+    monkeypatch.setattr("agent.LOCAL_FALLBACK", False)
+    with pytest.raises(RuntimeError):
+        analyze_content_gaps(str(input_file), str(output_file), mode="single")
+    assert not output_file.exists()
+
+    monkeypatch.setattr("agent.LOCAL_FALLBACK", True)
+    assert analyze_content_gaps(str(input_file), str(output_file), mode="single") == "fallback"
+    assert set(json.loads(output_file.read_text(encoding="utf-8"))["unique_features"]) == {"Product A", "Product B"}
+
+def test_prepare_content_collapses_duplicate_reviews():
+    content = json.dumps({"products": [
+        {"name": "Product A", "description": "...", "reviews": ["کیفیت صدا عالیه", "کیفیت صدا عالیه!", "باتری ضعیفه"]},
+    ]}, ensure_ascii=False)
+    reviews = json.loads(prepare_content(content))["products"][0]["reviews"]
+    assert reviews == [{"text": "کیفیت صدا عالیه", "count": 2}, "باتری ضعیفه"]
+
+def test_result_and_extract_caches_share_one_disk_budget():
+    assert result_cache.max_disk_bytes + extract_cache.max_disk_bytes == CACHE_MAX_BYTES
+    assert extract_cache.max_disk_bytes == EXTRACT_CACHE_MAX_BYTES > 0
+
+
+@patch("llm_backend.LLMBackend.invoke")
+def test_run_analysis_times_every_stage(mock_call):
+    """Each post-processing stage of a model answer is observed in the stage latency histogram."""
+    mock_call.return_value = MagicMock(content=json.dumps({
+        "common_features": [], "unique_features": {}, "customer_gaps": [], "marketing_insight": "x"}))
+    stages = ("normalize", "json_closure", "validate")
+    before = {stage: STAGE_SECONDS.count(stage=stage) for stage in stages}
+
+    run_analysis('{"products": []}')
+
+    assert all(STAGE_SECONDS.count(stage=stage) == before[stage] + 1 for stage in stages)
+
+
+@patch("llm_backend.LLMBackend.invoke")
+def test_run_analysis_asks_again_for_truncated_sections(mock_call):
+    """A cut-off answer is repaired and only the missing sections are requested again."""
+    truncated = MagicMock(content='{"common_features": [], "unique_features": {"A": ["x"]}, '
+                                  '"customer_gaps": [{"product_name": "A", "review_mentions": ["y"], "missing_in')
+    rest = MagicMock(content=json.dumps({"customer_gaps": [{"product_name": "A", "review_mentions": ["y"],
+                                                             "missing_in_description": ["y"]}],
+                                         "marketing_insight": "..."}))
+    mock_call.side_effect = [truncated, rest]
+
+    data = run_analysis("Product A")
+
+    assert data["customer_gaps"][0]["missing_in_description"] == ["y"]
+    assert data["marketing_insight"] == "..."
+    follow_up = mock_call.call_args_list[1].args[0]
+    assert "customer_gaps, marketing_insight" in follow_up[-1]["content"]
+
+
+def test_compact_protocol_writes_the_same_output(tmp_path, monkeypatch):
+    """The fake backend answers both protocols from the same local analysis."""
+    monkeypatch.setattr("agent.result_cache", ResultCache())
+    monkeypatch.setattr("agent.LOCAL_FALLBACK", False)
+    input_file = tmp_path / "input.json"
+    input_file.write_text(json.dumps({"products": [
+        {"name": "هدفون انکر (دیجی کالا)", "description": "نویز کنسلینگ و بلوتوث 5.3", "reviews": ["باتری خوب است؟"]},
+        {"name": "هدفون شیائومی", "description": "بلوتوث 5.3 و شارژ سریع", "reviews": ["میکروفون ضعیف است"]},
+    ]}, ensure_ascii=False), encoding="utf-8")
+
+    fake = FakeBackend()
+    monkeypatch.setattr("agent._llm", fake)
+
+    analyze_content_gaps(str(input_file), str(tmp_path / "full.json"), mode="single")
+    monkeypatch.setattr("agent.OUTPUT_PROTOCOL", "compact")
+    monkeypatch.setattr("agent.STRUCTURED_OUTPUT", True)
+    with patch.object(fake, "invoke", wraps=fake.invoke) as mock_invoke:
+        analyze_content_gaps(str(input_file), str(tmp_path / "compact.json"), mode="single")
+
+    assert mock_invoke.call_args.kwargs["response_format"] == RESPONSE_FORMAT
+    assert '"id": 0' in mock_invoke.call_args.args[0][1]["content"]
+    assert (tmp_path / "compact.json").read_bytes() == (tmp_path / "full.json").read_bytes()
+
+
+def test_warm_up_marks_the_worker_ready(monkeypatch):
+    monkeypatch.setattr("agent._llm", FakeBackend())
+    monkeypatch.setitem(readiness, "status", "starting")
+    stop = threading.Event()
+    stop.set()  # a failed probe returns at once instead of retrying
+    assert warm_up(stop)
+    assert readiness["status"] == "ready" and readiness["ready_seconds"] is not None
+
+
+@patch("agent.get_llm", side_effect=ConnectionError("upstream unreachable"))
+def test_warm_up_reports_failures_and_stops_retrying_on_shutdown(mock_get_llm, monkeypatch):
+    monkeypatch.setitem(readiness, "status", "starting")
+    stop = threading.Event()
+    stop.set()
+    assert not warm_up(stop)
+    assert readiness["status"] == "failed" and "upstream unreachable" in readiness["error"]
+
+
+def test_stream_does_not_repeat_sections_sent_before_the_cut(tmp_path, monkeypatch):
+    """A cut-off stream is completed, and only what the client has not received yet is sent."""
+    monkeypatch.setattr("agent.result_cache", ResultCache())
+    truncated = ('{"common_features": ["ANC"], "unique_features": {"A": ["x"], "B": ["y"]}, '
+                 '"customer_gaps": [{"product_name": "A", "review_mentions": ["m"], "missing_in_description": []}, '
+                 '{"product_name": "B", "review_mentions": ["n"], "missing_in')
+    rest = json.dumps({"customer_gaps": [
+        {"product_name": "A", "review_mentions": ["m"], "missing_in_description": []},
+        {"product_name": "B", "review_mentions": ["n"], "missing_in_description": ["n"]},
+    ], "marketing_insight": "..."})
+    llm = MagicMock(settings={"backend": "mock"})
+    llm.stream.return_value = iter([truncated[:60], truncated[60:]])
+    llm.invoke.return_value = MagicMock(content=rest)
+    monkeypatch.setattr("agent._llm", llm)
+    input_file = tmp_path / "input.json"
+    input_file.write_text(json.dumps({"products": [{"name": "A", "description": "x", "reviews": []}]}),
+                          encoding="utf-8")
+
+    events = list(stream_content_gaps(str(input_file), str(tmp_path / "output.json")))
+
+    sent = [(event, json.dumps(data, sort_keys=True)) for event, data in events]
+    assert len(sent) == len(set(sent))
+    assert [event for event, _ in events] == ["common_features", "unique_features", "unique_features",
+                                              "customer_gap", "customer_gap", "marketing_insight", "done"]
+    assert events[4][1]["missing_in_description"] == ["n"]
 # === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
\ No newline at end of file
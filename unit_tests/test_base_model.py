@@ -3,7 +3,11 @@ from base_model import (
     normalize_mixed_text,
     force_json_closure,
     ProductReviewGap,
-    ContentGapAnalysisResult
+    ContentGapAnalysisResult,
+    validate_section,
+    repair_model_json,
+    load_result,
+    dump_result
 )
 from pydantic import ValidationError
 
@@ -32,6 +36,43 @@ def test_force_json_closure_no_json():
     assert result == "{}"
 
 
+def test_force_json_closure_truncated_json():
+    text = 'answer: {"common_features": ["a", "b"], "marketing_insight": "cut'
+    assert force_json_closure(text) == '{"common_features": ["a", "b"], "marketing_insight": "cut"}'
+
+
+def test_repair_model_json_reports_missing_sections():
+    text = '{"common_features": ["a"], "unique_features": {"A": []}, "customer_gaps": [{"product_name": "A", "review'
+    data, missing = repair_model_json(text)
+    assert data["customer_gaps"] == [{"product_name": "A"}]
+    assert missing == ["customer_gaps", "marketing_insight"]
+    assert repair_model_json('{"common_features": []}') == ({"common_features": []}, [])
+
+
+
+def test_load_result_validates_complete_answer_from_json_text():
+    text = ('Here you go: {"common_features": ["باتری"], "unique_features": {"A": ["ANC"]}, '
+            '"customer_gaps": [{"product_name": "A", "review_mentions": [], "missing_in_description": []}], '
+            '"marketing_insight": "روی باتری تاکید کنید."}')
+    data, missing = load_result(text)
+    assert missing == []
+    assert data["unique_features"] == {"A": ["ANC"]}
+
+    with pytest.raises(ValidationError):  # product B has gaps but no unique_features entry
+        load_result(text.replace('"product_name": "A"', '"product_name": "B"'))
+
+
+def test_load_result_leaves_truncated_answer_for_continuation():
+    data, missing = load_result('{"common_features": ["a"], "unique_features": {"A": [')
+    assert data == {"common_features": ["a"], "unique_features": {"A": []}}
+    assert missing == ["unique_features", "customer_gaps", "marketing_insight"]
+
+
+def test_dump_result_is_compact_utf8_unless_pretty():
+    data = {"common_features": ["باتری"], "marketing_insight": "x"}
+    assert dump_result(data) == '{"common_features":["باتری"],"marketing_insight":"x"}'.encode("utf-8")
+    assert dump_result(data, pretty=True).decode("utf-8").startswith('{\n  "common_features"')
+
 #  Test ProductReviewGap
 def test_product_review_gap_valid():
     gap = ProductReviewGap(
@@ -89,5 +130,17 @@ def test_content_gap_analysis_inconsistent_product():
     with pytest.raises(ValidationError):
         ContentGapAnalysisResult(**data)
 
+#  Test validate_section
+def test_validate_section_accepts_complete_gap():
+    text = '{"product_name": "Product A", "review_mentions": ["x"], "missing_in_description": []}'
+    event, data = validate_section("customer_gaps", 0, text)
+    assert event == "customer_gap"
+    assert data["product_name"] == "Product A"
+
+
+def test_validate_section_rejects_invalid_piece():
+    assert validate_section("customer_gaps", 0, '{"product_name": "  ", "review_mentions": []}') is None
+    assert validate_section("marketing_insight", None, '""') is None
+
 # === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
 
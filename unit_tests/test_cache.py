@@ -0,0 +1,63 @@
+import time
+import threading
+from cache import ResultCache, make_cache_key
+
+
+def test_cache_key_ignores_json_formatting():
+    a = make_cache_key('{"products": [{"name": "A"}]}', "prompt", "gpt-4o-mini", {"max_tokens": 10})
+    b = make_cache_key('{\n  "products": [ {"name":"A"} ]\n}', "prompt", "gpt-4o-mini", {"max_tokens": 10})
+    c = make_cache_key('{"products": [{"name": "A"}]}', "other prompt", "gpt-4o-mini", {"max_tokens": 10})
+    assert a == b
+    assert a != c
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    cache.set("k" * 64, {"value": 1})
+
+    fresh = ResultCache(directory=str(tmp_path))
+    assert fresh.get("k" * 64) == {"value": 1}
+    assert fresh.stats()["disk_hits"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResultCache(directory=str(tmp_path), ttl_seconds=0.01)
+    cache.set("k" * 64, {"value": 1})
+    time.sleep(0.05)
+    assert cache.get("k" * 64) is None
+
+
+def test_single_flight_shares_one_call():
+    cache = ResultCache()
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return {"value": 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("key", compute)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 5
+    assert cache.get_or_compute("key", compute) == {"value": 42}
+    assert cache.stats()["memory_hits"] >= 1
+
+
+def test_get_counts_misses():
+    cache = ResultCache()
+    assert cache.get("key") is None
+    cache.set("key", {"value": 1})
+    assert cache.get("key") == {"value": 1}
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"]) == (1, 1)
+    assert stats["hit_ratio"] == 0.5
+# === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
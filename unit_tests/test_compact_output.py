@@ -0,0 +1,59 @@
+import json
+import pytest
+from pydantic import ValidationError
+from compact_output import compact_result, expand_result, load_compact, number_products
+
+DOCUMENT = json.dumps({"products": [
+    {"name": "هدفون  انکر", "description": "d", "reviews": ["r"]},
+    {"name": "Product B", "description": "e", "reviews": []},
+]}, ensure_ascii=False)
+
+COMPACT = {
+    "common": ["بلوتوث"],
+    "unique": [{"id": 0, "features": ["ANC"]}, {"id": 1, "features": ["USB-C"]}],
+    "gaps": [{"id": 1, "mentions": ["باتری"], "missing": ["باتری"]}],
+    "insight": "خلاصه",
+}
+
+
+def test_number_products_adds_ids_and_returns_normalized_names():
+    numbered, names = number_products(DOCUMENT)
+    assert [p["id"] for p in json.loads(numbered)["products"]] == [0, 1]
+    assert names == ["هدفون انکر", "Product B"]
+    with pytest.raises(ValueError):
+        number_products('{"items": []}')
+
+
+def test_number_products_replaces_ids_of_the_input():
+    document = json.loads(DOCUMENT)
+    document["products"][0]["id"], document["products"][1]["id"] = "sku-9", 0
+    numbered, names = number_products(json.dumps(document, ensure_ascii=False))
+    assert [p["id"] for p in json.loads(numbered)["products"]] == [0, 1]
+    assert expand_result(COMPACT, names)["unique_features"] == {"هدفون انکر": ["ANC"], "Product B": ["USB-C"]}
+
+
+def test_expand_result_restores_the_full_shape():
+    _, names = number_products(DOCUMENT)
+    full = expand_result(COMPACT, names)
+    assert full == {
+        "common_features": ["بلوتوث"],
+        "unique_features": {"هدفون انکر": ["ANC"], "Product B": ["USB-C"]},
+        "customer_gaps": [{"product_name": "Product B", "review_mentions": ["باتری"], "missing_in_description": ["باتری"]}],
+        "marketing_insight": "خلاصه",
+    }
+    assert compact_result(full, names) == COMPACT
+
+
+def test_expand_result_checks_product_indices():
+    with pytest.raises(ValidationError, match="not found in unique"):
+        expand_result({**COMPACT, "unique": [{"id": 0, "features": []}]}, ["A", "B"])
+    with pytest.raises(ValueError, match="unknown products"):
+        expand_result(COMPACT, ["A"])
+
+
+def test_load_compact_reports_cut_off_sections():
+    text = json.dumps(COMPACT, ensure_ascii=False, separators=(",", ":"))
+    assert load_compact(text) == (COMPACT, [])
+    data, missing = load_compact(text[:text.index('"gaps"') + 20])
+    assert data["unique"] == COMPACT["unique"]
+    assert missing == ["gaps", "insight"]
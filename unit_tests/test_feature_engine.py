@@ -0,0 +1,53 @@
+import json
+import pytest
+from feature_engine import analyze_locally, analyze_products, extract_phrases, tfidf_matrix
+
+
+@pytest.fixture
+def products():
+    return [
+        {"name": "Product A", "description": "دارای حذف نویز ANC. باتری 10 ساعت. شارژ سریع USB-C",
+         "reviews": ["صدای بیس خوبه؟"]},
+        {"name": "Product B", "description": "حذف نویز ANC. بلوتوث 5.0 و میکروفون", "reviews": []},
+    ]
+
+
+def test_extract_phrases_keeps_feature_clauses():
+    phrases = extract_phrases("این هدفون زیباست. باتری 10 ساعت دوام دارد. بلوتوث 5.0")
+    assert "باتری 10 ساعت دوام" in phrases
+    assert "بلوتوث 5.0" in phrases
+    assert all("زیباست" not in p for p in phrases)
+
+
+def test_tfidf_rows_are_normalized():
+    matrix = tfidf_matrix(["حذف نویز anc", "حذف نویز فعال anc", "باتری 10 ساعت"])
+    similarity = (matrix @ matrix.T).toarray()
+    assert similarity[0, 0] == pytest.approx(1.0)
+    assert similarity[0, 1] > similarity[0, 2]
+
+
+def test_analyze_products_splits_common_and_unique(products):
+    result = analyze_products(products)
+    assert any("anc" in f for f in result["common_features"])
+    assert any("باتری" in f for f in result["unique_features"]["Product A"])
+    assert any("بلوتوث" in f for f in result["unique_features"]["Product B"])
+    assert result["customer_gaps"][0]["missing_in_description"]
+
+
+def test_reviews_are_compared_with_their_own_product_only():
+    """A review topic that only another product describes is still a gap; empty products are handled."""
+    result = analyze_products([
+        {"name": "A", "description": "باتری 10 ساعت", "reviews": ["حذف نویز ANC دارد؟"]},
+        {"name": "B", "description": "حذف نویز ANC", "reviews": ["باتری 10 ساعت"]},
+        {"name": "C", "description": "", "reviews": []},
+    ])
+    assert result["customer_gaps"][0]["missing_in_description"] == ["حذف نویز anc"]
+    assert result["customer_gaps"][1]["missing_in_description"] == ["باتری 10 ساعت"]
+    assert result["unique_features"]["C"] == [] and result["common_features"] == []
+
+
+def test_analyze_locally_returns_valid_result(products):
+    result = analyze_locally(json.dumps({"products": products}, ensure_ascii=False))
+    assert set(result) == {"common_features", "unique_features", "customer_gaps", "marketing_insight"}
+    assert result["marketing_insight"]
+# === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
@@ -0,0 +1,57 @@
+import json
+import pytest
+from ingest import CatalogError, canonical_name, group_catalog, group_documents
+
+LISTINGS = [
+    {"name": "هدفون بلوتوثی انکر مدل Soundcore Life P3 (دیجی کالا)", "description": "a", "reviews": ["r"], "price": 1},
+    {"name": "Xiaomi Redmi Buds 4 Pro", "description": "b", "reviews": []},
+    {"name": "هدفون بلوتوثی انکر مدل Soundcore Life P3 (ایران انکر)", "description": "c", "reviews": ["s"]},
+    {"name": "هدفون بلوتوثی انکر مدل Soundcore Life P2 (ایران انکر)", "description": "d", "reviews": []},
+    {"name": "Xiaomi Redmi Buds ۴ Pro [Black]", "description": "e"},
+]
+
+
+def write_catalog(path, listings, extra_lines=()):
+    with open(path, "w", encoding="utf-8") as f:
+        for listing in listings:
+            f.write(json.dumps(listing, ensure_ascii=False) + "\n")
+        for line in extra_lines:
+            f.write(line + "\n")
+    return str(path)
+
+
+def test_canonical_name_drops_sellers_and_unifies_digits():
+    assert canonical_name("Xiaomi Redmi Buds ۴ Pro [Black]") == canonical_name("xiaomi  redmi buds 4 PRO (Global)")
+    assert canonical_name("(only a seller)") == "only a seller"
+
+
+def test_listings_of_the_same_product_are_grouped(tmp_path):
+    path = write_catalog(tmp_path / "catalog.ndjson", LISTINGS, ["not json", '{"description": "no name"}', ""])
+    grouping = group_catalog(path, processes=0)
+    documents = list(group_documents(grouping))
+
+    assert grouping.stats()["listings"] == 5
+    assert grouping.skipped == 2
+    # the P2 differs from the P3s only in its model number, so it stays alone and is not analyzed
+    assert [[p["description"] for p in d["products"]] for d in documents] == [["a", "c"], ["b", "e"]]
+    assert documents[1]["products"][1] == {"name": "Xiaomi Redmi Buds ۴ Pro [Black]", "description": "e", "reviews": []}
+
+
+def test_large_groups_are_sliced(tmp_path):
+    path = write_catalog(tmp_path / "catalog.ndjson", [{"name": f"Anker Q30 ({i})"} for i in range(5)])
+    grouping = group_catalog(path, processes=0)
+    assert [len(offsets) for offsets in grouping.groups(max_size=2)] == [2, 2, 1]
+    assert grouping.stats(max_size=2)["groups"] == 3
+
+
+def test_process_pool_matches_single_process(tmp_path):
+    path = write_catalog(tmp_path / "catalog.ndjson", LISTINGS * 20)
+    inline = group_catalog(path, processes=0, chunk_bytes=512)
+    pooled = group_catalog(path, processes=2, chunk_bytes=512)
+    assert pooled.offsets.tolist() == inline.offsets.tolist()
+    assert pooled.labels.tolist() == inline.labels.tolist()
+
+
+def test_catalog_without_listings(tmp_path):
+    with pytest.raises(CatalogError):
+        group_catalog(write_catalog(tmp_path / "catalog.ndjson", [], ["[]", "oops"]), processes=0)
@@ -0,0 +1,36 @@
+import pytest
+from input_validation import InvalidInputError, ProductsValidator, validate_products
+
+VALID = b'{"products": [{"name": "A", "description": "d", "reviews": ["x", "y"], "url": "u"},' \
+        b' {"name": "B", "description": "e", "reviews": []}]}'
+
+
+def test_valid_document_in_small_chunks():
+    validator = ProductsValidator()
+    for i in range(0, len(VALID), 3):
+        validator.feed(VALID[i:i + 3])
+    assert validator.close() == 2
+
+
+@pytest.mark.parametrize("data, message", [
+    (b'[1, 2]', "JSON object"),
+    (b'{"items": []}', 'no "products"'),
+    (b'{"products": []}', "empty"),
+    (b'{"products": {"name": "A"}}', "must be a list"),
+    (b'{"products": ["A"]}', "must be an object"),
+    (b'{"products": [{"name": "A", "description": "d"}]}', "missing: reviews"),
+    (b'{"products": [{"name": " ", "description": "d", "reviews": []}]}', '"name" must be a non-empty string'),
+    (b'{"products": [{"name": "A", "description": "d", "reviews": [{"x": 1}]}]}', "review must be a string"),
+    (b'{"products": [{"name": "A", "description": "d", "reviews": []}]', "Incomplete JSON"),
+    (b'{"products": [}', "Invalid JSON"),
+    (b'', "empty"),
+])
+def test_invalid_documents_are_rejected(data, message):
+    with pytest.raises(InvalidInputError, match=message):
+        validate_products(data)
+
+
+def test_error_is_raised_before_the_rest_arrives():
+    validator = ProductsValidator()
+    with pytest.raises(InvalidInputError):
+        validator.feed(b'{"products": ["not an object", ')
@@ -0,0 +1,49 @@
+import threading
+import pytest
+from jobs import JobQueue, QueueFullError
+
+
+def test_job_runs_in_background():
+    queue = JobQueue(workers=1, max_pending=1)
+    job = queue.submit(lambda x: x * 2, 21)
+    queue.wait(job.id, timeout=5)
+    assert job.status == "done"
+    assert job.result == 42
+    queue.shutdown()
+
+
+def test_failed_job_records_error():
+    def boom():
+        raise RuntimeError("upstream down")
+
+    queue = JobQueue(workers=1, max_pending=1)
+    job = queue.submit(boom)
+    queue.wait(job.id, timeout=5)
+    assert job.status == "failed"
+    assert "upstream down" in job.error
+    queue.shutdown()
+
+
+def test_queue_full_applies_backpressure():
+    release = threading.Event()
+    queue = JobQueue(workers=1, max_pending=1)
+    queue.submit(release.wait)
+    queue.submit(release.wait)
+    with pytest.raises(QueueFullError):
+        queue.submit(release.wait)
+    release.set()
+    queue.shutdown()
+
+
+def test_shutdown_without_waiting_cancels_queued_jobs():
+    started, release = threading.Event(), threading.Event()
+    queue = JobQueue(workers=1, max_pending=1)
+    running = queue.submit(lambda: started.set() or release.wait())
+    queued = queue.submit(release.wait)
+    assert started.wait(timeout=5)
+    assert queue.shutdown(wait=False) == [queued]
+    assert queued.status == "cancelled"
+    release.set()
+    queue.wait(running.id, timeout=5)
+    assert running.status == "done"
+# === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
@@ -0,0 +1,73 @@
+import json
+import pytest
+from json_stream import JSONStreamParser, repair_json
+
+
+def feed_all(text, chunk_size=5):
+    parser = JSONStreamParser()
+    sections = []
+    for i in range(0, len(text), chunk_size):
+        sections.extend(parser.feed(text[i:i + chunk_size]))
+    return parser, sections
+
+
+def test_reports_nested_values_as_they_complete():
+    doc = {"common_features": ["ANC", "IPX5"], "unique_features": {"A": ["x"], "B": []},
+           "customer_gaps": [{"product_name": "A"}], "marketing_insight": "نکته", "score": 1.5}
+    scanner, sections = feed_all("Here you go: " + json.dumps(doc, ensure_ascii=False, indent=2))
+
+    located = [(key, child) for key, child, _ in sections]
+    assert ("common_features", None) in located
+    assert ("unique_features", "A") in located
+    assert ("customer_gaps", 0) in located
+    assert ("marketing_insight", None) in located
+    assert ("score", None) in located
+    assert json.loads(dict(((k, c), t) for k, c, t in sections)[("unique_features", "A")]) == ["x"]
+    assert scanner.done
+    assert json.loads(scanner.text) == doc
+
+
+def test_handles_escapes_and_braces_inside_strings():
+    text = '{"marketing_insight": "use \\"ANC\\" {not json} [here]"}'
+    _, sections = feed_all(text, chunk_size=1)
+    assert sections == [("marketing_insight", None, '"use \\"ANC\\" {not json} [here]"')]
+
+
+def test_complete_document_is_returned_unchanged():
+    text = '{"a": [1, 2], "b": {"c": "x"}}'
+    result = repair_json("noise " + text + " trailing")
+    assert result.text == text
+    assert result.complete and result.truncated == []
+    assert repair_json("no json here") is None
+
+
+@pytest.mark.parametrize("text, expected, truncated", [
+    ('{"a": "ok", "b": "cut off mid', {"a": "ok", "b": "cut off mid"}, ["b"]),
+    ('{"a": [1, 2,', {"a": [1, 2]}, ["a"]),
+    ('{"a": 1, "b": tr', {"a": 1}, ["b"]),
+    ('{"a": 1, "b":', {"a": 1}, ["b"]),
+    ('{"a": 1, "b', {"a": 1}, []),
+    ('{"gaps": [{"name": "A", "items": ["x", "y', {"gaps": [{"name": "A", "items": ["x", "y"]}]},
+     ["gaps", "gaps[0]", "gaps[0].items", "gaps[0].items[1]"]),
+])
+def test_truncated_documents_are_closed(text, expected, truncated):
+    result = repair_json(text)
+    assert json.loads(result.text) == expected
+    assert not result.complete
+    assert result.truncated == truncated
+
+
+def test_dangling_escape_is_dropped():
+    assert json.loads(repair_json('{"a": "x\\u06').text) == {"a": "x"}
+    assert json.loads(repair_json('{"a": "x\\\\').text) == {"a": "x\\"}  # a complete escaped backslash stays
+    assert json.loads(repair_json('{"a": "x\\\\\\u0').text) == {"a": "x\\"}
+
+
+def test_every_truncation_point_is_repaired():
+    text = json.dumps({"common_features": ["C:\\path\\", "quote \" and \\\\ run", "بلوتوث \u06f5"],
+                       "unique_features": {"A\\": ["x\ty", "\\u0041"]}, "n": [1.5, True, None]})
+    for cut in range(1, len(text)):
+        result = repair_json(text[:cut])
+        assert result is not None and isinstance(json.loads(result.text), dict), text[:cut]
+
+# === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
@@ -0,0 +1,83 @@
+import json
+import pytest
+from unittest.mock import patch
+from llm_backend import FakeBackend, LLMBackend, LLMMessage, RetryableError, parse_retry_after
+
+
+class FlakyBackend(LLMBackend):
+    """Fails with a retryable error a given number of times, then answers."""
+    name = "flaky"
+
+    def __init__(self, failures, retry_after=None, **kwargs):
+        super().__init__("flaky", **kwargs)
+        self.remaining = failures
+        self.retry_after = retry_after
+
+    def _invoke(self, messages):
+        if self.remaining:
+            self.remaining -= 1
+            raise RetryableError("HTTP 429", self.retry_after)
+        return LLMMessage(content="ok")
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("garbage") is None
+
+
+@patch("llm_backend.time.sleep")
+def test_retries_transient_errors_and_honors_retry_after(mock_sleep):
+    backend = FlakyBackend(failures=2, retry_after=5, max_retries=3, backoff_base=0.01)
+    assert backend.invoke([]).content == "ok"
+    assert backend.stats()["retries"] == 2
+    assert all(call.args[0] >= 5 for call in mock_sleep.call_args_list)
+
+
+@patch("llm_backend.time.sleep")
+def test_gives_up_after_max_retries(mock_sleep):
+    backend = FlakyBackend(failures=5, max_retries=2, backoff_base=0.01)
+    with pytest.raises(RetryableError):
+        backend.invoke([])
+    assert backend.stats()["failures"] == 1
+    assert mock_sleep.call_count == 2
+
+
+@patch("llm_backend.time.sleep")
+def test_retry_after_beyond_backoff_max_is_not_retried_early(mock_sleep):
+    backend = FlakyBackend(failures=1, retry_after=60, max_retries=3, backoff_max=30)
+    with pytest.raises(RetryableError):
+        backend.invoke([])
+    assert backend.stats()["failures"] == 1
+    mock_sleep.assert_not_called()
+
+
+def test_backoff_delay_waits_the_full_retry_after():
+    backend = FlakyBackend(failures=0, backoff_base=0.01, backoff_max=30)
+    assert backend.backoff_delay(0, retry_after=25) == 25
+    assert backend.backoff_delay(10, retry_after=0.001) <= 30
+
+
+def test_batch_keeps_input_order():
+    class EchoBackend(LLMBackend):
+        def _invoke(self, messages):
+            return LLMMessage(content=messages[0]["content"])
+
+    backend = EchoBackend("echo")
+    replies = backend.batch([[{"role": "user", "content": str(i)}] for i in range(10)],
+                            config={"max_concurrency": 3})
+    assert [r.content for r in replies] == [str(i) for i in range(10)]
+
+
+def test_fake_backend_answers_full_analysis_deterministically():
+    backend = FakeBackend()
+    content = json.dumps({"products": [
+        {"name": "Product A", "description": "باتری 10 ساعت. حذف نویز ANC", "reviews": [{"text": "بیس خوبه؟", "count": 2}]},
+        {"name": "Product B", "description": "حذف نویز ANC. بلوتوث 5.0", "reviews": []},
+    ]}, ensure_ascii=False)
+    messages = [{"role": "system", "content": 'Output Format: {"common_features": [], "customer_gaps": []}'},
+                {"role": "user", "content": content}]
+    first, second = backend.invoke(messages).content, backend.invoke(messages).content
+    assert first == second
+    assert set(json.loads(first)["unique_features"]) == {"Product A", "Product B"}
+# === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
@@ -1,6 +1,9 @@
 import os
+import json
 import logging
-from logger import get_logger
+from logging.handlers import RotatingFileHandler, WatchedFileHandler
+from logger import (ContextFilter, JsonFormatter, SamplingFilter, _file_handler, get_logger, job_id_var,
+                    process_log_file, request_id_var, sampled)
 
 def test_logger_creates_log_file(tmp_path):
     # Reset logging config to avoid conflicts
@@ -24,4 +27,56 @@ def test_logger_creates_log_file(tmp_path):
     # Verify the message is written in the file
     content = log_file.read_text(encoding="utf-8")
     assert test_message in content, "Log message should appear in the log file"
+
+
+def make_record(message, **extra):
+    record = logging.LogRecord("root", logging.INFO, __file__, 1, message, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_records_are_json_lines_with_request_and_job_ids():
+    request_token, job_token = request_id_var.set("req-1"), job_id_var.set("job-1")
+    try:
+        record = make_record("Validated product_name: هدفون")
+        ContextFilter().filter(record)
+    finally:
+        request_id_var.reset(request_token)
+        job_id_var.reset(job_token)
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Validated product_name: هدفون"
+    assert entry["request_id"] == "req-1" and entry["job_id"] == "job-1"
+    assert entry["level"] == "INFO"
+
+
+def test_sampled_records_are_limited_per_window(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("logger.time.monotonic", lambda: now[0])
+    sampler = SamplingFilter(limit=3, window=10)
+
+    written = [sampler.filter(make_record("x", **sampled("hot"))) for _ in range(100)]
+    assert sum(written) == 3
+    assert all(sampler.filter(make_record("other")) for _ in range(10))  # unsampled records always pass
+
+    now[0] = 11
+    record = make_record("x", **sampled("hot"))
+    assert sampler.filter(record)
+    assert record.sampled_out == 97
+
+
+def test_every_process_rotates_its_own_file(tmp_path, monkeypatch):
+    log_file = str(tmp_path / "app.log")
+    monkeypatch.setattr("logger.LOG_FILE", log_file)
+    assert process_log_file(log_file, 123) == str(tmp_path / "app.123.log")
+
+    handler = _file_handler()
+    assert isinstance(handler, RotatingFileHandler)
+    assert handler.baseFilename == process_log_file(log_file, os.getpid())
+    assert not os.listdir(tmp_path)  # created by the first record only
+
+    monkeypatch.setattr("logger.LOG_ROTATION", "external")
+    handler = _file_handler()
+    assert isinstance(handler, WatchedFileHandler) and handler.baseFilename == log_file
+
 # === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
\ No newline at end of file
@@ -1,51 +1,347 @@
+import gc
 import os
+import json
+import time
+import asyncio
 import pytest
-from fastapi import UploadFile
+from fastapi import Request, UploadFile
 from fastapi.testclient import TestClient
 from unittest.mock import patch
-from main import app, INPUTS_FOLDER, OUTPUTS_FOLDER, get_next_index_file
+from main import analyze_text_stream, app, cancel_outputs, ingest_queue, job_queue, run_analysis
+from jobs import Job
+from llm_backend import FakeBackend
+from rate_limit import RateLimiter, Rule, known_keys
+from storage import Storage
 
 client = TestClient(app)
 
 @pytest.fixture(autouse=True)
-def cleanup_folders(tmp_path):
+def storage(tmp_path, monkeypatch):
     """Use tmp_path for inputs and outputs to avoid touching real folders."""
-    os.makedirs(INPUTS_FOLDER, exist_ok=True)
-    os.makedirs(OUTPUTS_FOLDER, exist_ok=True)
-    yield
-    # Clean up after test
-    for folder in [INPUTS_FOLDER, OUTPUTS_FOLDER]:
-        for f in os.listdir(folder):
-            os.remove(os.path.join(folder, f))
+    store = Storage(str(tmp_path))
+    monkeypatch.setattr("main.storage", store)
+    return store
+
+@pytest.fixture(autouse=True)
+def rate_limiter(tmp_path, monkeypatch):
+    """Fresh token buckets for every test."""
+    limiter = RateLimiter(str(tmp_path / "ratelimit.sqlite3"),
+                          {"input": Rule(per_minute=30, burst=10), "analyze": Rule(per_minute=6, burst=3)})
+    monkeypatch.setattr("main.rate_limiter", limiter)
+    return limiter
+
+VALID_INPUT = '{"products": [{"name": "A", "description": "d", "reviews": ["r"]}]}'
+
 
 def test_upload_text_success():
-    """Test uploading a valid text file."""
-    test_text = "This is a test file."
-    files = {"file": ("test.txt", test_text, "text/plain")}
+    """Test uploading a valid input file."""
+    files = {"file": ("test.json", VALID_INPUT, "application/json")}
     response = client.post("/input", files=files)
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "ok"
+    assert data["products"] == 1
     assert os.path.exists(data["saved_path"])
 
 
+@pytest.mark.parametrize("content", ["This is a test file.", '{"products": [{"name": "A"}]}', "   "])
+def test_upload_rejects_invalid_input(content, storage):
+    """Malformed or incomplete inputs are rejected and nothing is stored."""
+    response = client.post("/input", files={"file": ("test.json", content, "application/json")})
+    assert response.status_code == 400
+    assert storage.latest_input() is None
+    assert os.listdir(storage.inputs_folder) == []
+
+
+def test_upload_rejects_too_large_file(monkeypatch):
+    monkeypatch.setattr("main.MAX_UPLOAD_BYTES", 16)
+    monkeypatch.setattr("main.UPLOAD_CHUNK_SIZE", 8)
+    response = client.post("/input", files={"file": ("test.json", VALID_INPUT, "application/json")})
+    assert response.status_code == 413
+
+
+def test_upload_accepts_character_split_across_chunks(monkeypatch):
+    """A multi-byte character on a chunk boundary is decoded once both halves arrived."""
+    content = '{"products": [{"name": "هدفون", "description": "د", "reviews": []}]}'.encode("utf-8")
+    monkeypatch.setattr("main.UPLOAD_CHUNK_SIZE", content.index("هدفون".encode("utf-8")) + 1)
+    response = client.post("/input", files={"file": ("test.json", content, "application/json")})
+    assert response.status_code == 200
+
+
+def test_upload_rejects_invalid_utf8_after_first_chunk(monkeypatch):
+    monkeypatch.setattr("main.UPLOAD_CHUNK_SIZE", 8)
+    monkeypatch.setattr("main.VALIDATE_INPUTS", False)
+    response = client.post("/input", files={"file": ("test.txt", b"some text \xff\xfe more", "text/plain")})
+    assert response.status_code == 400
+
+
 @patch("main.analyze_content_gaps")
-def test_analyze_text_success(mock_analyze):
+def test_analyze_text_success(mock_analyze, storage):
     """Test analysis endpoint with a valid input file."""
     # Create a dummy input file
-    input_file_path = get_next_index_file(INPUTS_FOLDER, "input")
-    with open(input_file_path, "w", encoding="utf-8") as f:
-        f.write("Dummy product data")
+    storage.save_input(b"Dummy product data")
     
     # Make mock create the output file
-    def mock_func(input_file, output_file):
+    def mock_func(input_file, output_file, mode=None):
         with open(output_file, "w", encoding="utf-8") as f:
             f.write("{}")  # empty JSON
+        return "done"
     mock_analyze.side_effect = mock_func
 
     response = client.get("/analyze")
-    assert response.status_code == 200
+    assert response.status_code == 202
     data = response.json()
-    assert data["status"] == "ok"
-    assert os.path.exists(data["output_file"])
-    # === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
\ No newline at end of file
+    assert data["status"] == "queued"
+
+    job_queue.wait(data["job_id"], timeout=5)
+    response = client.get(f"/jobs/{data['job_id']}")
+    assert response.status_code == 200
+    job = response.json()
+    assert job["status"] == "done"
+    assert os.path.exists(job["output_file"])
+    assert storage.get_output(data["output_id"]).status == "done"
+
+
+@patch("main.analyze_content_gaps")
+def test_analyze_given_input_id(mock_analyze, storage):
+    """?input_id= analyzes that upload instead of the latest one; unknown ids are 404."""
+    first = storage.save_input(b"first")
+    storage.save_input(b"second")
+    mock_analyze.return_value = "done"
+
+    response = client.get("/analyze", params={"input_id": first.id})
+    assert response.status_code == 202
+    job_queue.wait(response.json()["job_id"], timeout=5)
+    assert mock_analyze.call_args[0][0] == first.path
+
+    assert client.get("/analyze", params={"input_id": 999}).status_code == 404
+
+
+def test_analyze_rejects_unknown_mode():
+    """Unknown analysis modes are rejected before anything is queued."""
+    response = client.get("/analyze", params={"mode": "nope"})
+    assert response.status_code == 400
+
+
+@patch("main.stream_content_gaps")
+def test_analyze_stream_sends_sections_as_events(mock_stream, storage):
+    """The streaming endpoint forwards every section as a server-sent event."""
+    storage.save_input(b"Dummy product data")
+
+    def fake_stream(input_file, output_file):
+        yield "common_features", ["ANC"]
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("{}")
+        yield "done", {"output_file": output_file}
+    mock_stream.side_effect = fake_stream
+
+    response = client.get("/analyze/stream")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert 'event: common_features\ndata: ["ANC"]' in response.text
+    assert "event: done" in response.text
+
+
+def test_analyze_stream_cancels_the_output_when_the_client_disconnects(storage, monkeypatch):
+    storage.save_input(b"Dummy product data")
+    monkeypatch.setattr("main.stream_content_gaps", lambda input_file, output_file: iter(
+        [("common_features", ["ANC"]), ("done", {"output_file": output_file})]))
+    request = Request({"type": "http", "method": "GET", "path": "/analyze/stream", "query_string": b"",
+                       "headers": [], "client": ("testclient", 50000)})
+
+    async def read_first_event():
+        events = (await analyze_text_stream(request)).body_iterator
+        first = await events.__anext__()
+        await events.aclose()  # what Starlette does when the client goes away
+        return first
+
+    assert "event: common_features" in asyncio.run(read_first_event())
+    gc.collect()
+    assert [output.status for output in storage.list_outputs()] == ["cancelled"]
+
+
+def test_queued_outputs_are_cancelled_at_shutdown_and_stale_ones_expire_at_startup(storage):
+    output, batch_output, stale = (storage.reserve_output(None) for _ in range(3))
+    cancel_outputs([Job("a", meta={"output_id": output.id}),
+                    Job("b", meta={"items": [{"output_id": batch_output.id}, {"output_id": None}]})])
+    assert storage.get_output(output.id).status == storage.get_output(batch_output.id).status == "cancelled"
+    assert client.get(f"/outputs/{output.id}").status_code == 404
+
+    with storage._transaction() as db:
+        db.execute("UPDATE outputs SET created_at = ? WHERE id = ?", (time.time() - 7200, stale.id))
+    fresh = storage.reserve_output(None)
+    with patch("main.job_queue.shutdown"), patch("main.ingest_queue.shutdown"), TestClient(app):
+        pass
+    assert storage.get_output(stale.id).status == "failed"
+    assert storage.get_output(fresh.id).status == "pending"  # may still be running in another worker
+
+
+def test_analyze_is_rate_limited_per_client(rate_limiter, monkeypatch):
+    """Once a client's bucket is empty it gets 429 with Retry-After; other clients are unaffected."""
+    monkeypatch.setattr("main.RATE_LIMIT_API_KEYS", known_keys(["tenant-b"]))
+    rate_limiter.rules["analyze"] = Rule(per_minute=1, burst=1)
+    assert client.get("/analyze").status_code == 400  # nothing uploaded, but the token is used
+    response = client.get("/analyze")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    assert client.get("/analyze", headers={"X-API-Key": "random"}).status_code == 429  # not a configured key
+    assert client.get("/analyze", headers={"X-API-Key": "tenant-b"}).status_code == 400
+
+
+def test_metrics_are_exposed_in_prometheus_format(rate_limiter):
+    """Rate-limit rejections and the queue depth show up on /metrics."""
+    rate_limiter.rules["analyze"] = Rule(per_minute=1, burst=1)
+    client.get("/analyze")
+    client.get("/analyze")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'content_gap_rate_limited_total{scope="analyze"}' in response.text
+    assert 'content_gap_queue_depth{state="queued"} 0' in response.text
+    assert "# TYPE content_gap_stage_seconds histogram" in response.text
+
+
+@patch("main.analyze_content_gaps")
+def test_analyze_batch_reports_each_item(mock_analyze, storage):
+    """A batch runs every item and reports partial results when some of them fail or fall back."""
+    stored = storage.save_input(b'{"products": []}')
+
+    def mock_func(input_file, output_file, mode=None):
+        with open(input_file, encoding="utf-8") as f:
+            content = f.read()
+        if "broken" in content:
+            raise ValueError("bad input")
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("{}")
+        return "fallback" if content == '{"products": []}' else "done"
+    mock_analyze.side_effect = mock_func
+
+    body = {"inputs": [{"products": [{"name": "A", "description": "d", "reviews": []}]}, "broken"],
+            "input_ids": [stored.id, 999]}
+    response = client.post("/analyze/batch", json=body)
+    assert response.status_code == 202
+    job = job_queue.wait(response.json()["job_id"], timeout=5)
+
+    items = job.result["items"]
+    assert [item["status"] for item in items] == ["done", "failed", "fallback", "failed"]
+    assert items[1]["error"].startswith("Invalid JSON")
+    assert items[3]["error"] == "Input 999 not found"
+    assert os.path.exists(items[0]["output_file"])
+    assert (job.result["done"], job.result["fallback"], job.result["failed"]) == (1, 1, 2)
+    assert storage.get_output(items[2]["output_id"]).status == "fallback"
+
+
+def test_analyze_batch_rejects_empty_batch():
+    assert client.post("/analyze/batch", json={"inputs": []}).status_code == 400
+
+
+def test_get_unknown_job():
+    """Unknown job ids return 404."""
+    response = client.get("/jobs/does-not-exist")
+    assert response.status_code == 404
+    assert response.headers["X-Request-ID"]
+    assert client.get("/cache/stats", headers={"X-Request-ID": "abc"}).headers["X-Request-ID"] == "abc"
+
+
+@patch("main.analyze_content_gaps")
+def test_ingest_queues_an_analysis_per_group(mock_analyze, storage, tmp_path, monkeypatch):
+    monkeypatch.setattr("main.CATALOGS_FOLDER", str(tmp_path / "catalogs"))
+    monkeypatch.setattr("main.INGEST_PROCESSES", 0)
+    def mock_func(input_path, output_path, mode=None):
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write("{}")
+        return "done"
+    mock_analyze.side_effect = mock_func
+    names = ["Anker Q30 (A)", "Anker Q30 (B)", "QCY T13 (A)", "QCY T13 (B)", "Sony WH-1000XM5"]
+    catalog = "".join(f'{{"name": "{name}", "description": "d", "reviews": []}}\n' for name in names)
+
+    response = client.post("/ingest", files={"file": ("catalog.ndjson", catalog, "application/x-ndjson")})
+    assert response.status_code == 202
+    job = ingest_queue.wait(response.json()["job_id"], timeout=30)
+    assert job.status == "done", job.error
+    assert client.get(f"/jobs/{job.id}").json()["progress"]["groups"] == 2
+
+    with open(job.result["manifest"], encoding="utf-8") as f:
+        groups = [json.loads(line) for line in f]
+    assert [g["products"] for g in groups] == [names[:2], names[2:4]]
+    for group in groups:
+        assert job_queue.wait(group["job_id"], timeout=30).status == "done"
+        assert storage.get_output(group["output_id"]).status == "done"
+
+
+@patch("main.analyze_content_gaps", return_value="done")
+def test_output_is_failed_when_it_cannot_be_recorded(mock_analyze, storage):
+    record = storage.reserve_output(storage.save_input(b"data").id)
+    with patch.object(storage, "complete_output", side_effect=OSError("disk full")), pytest.raises(OSError):
+        run_analysis("input.json", record.id)
+    assert storage.get_output(record.id).status == "failed"
+
+
+def finished_output(storage, content, status="done"):
+    record = storage.reserve_output(storage.save_input(b"data").id)
+    with open(record.path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return storage.complete_output(record.id, status)
+
+
+def test_get_output_with_etag_and_compression(storage):
+    content = '{"common_features": [' + ", ".join(f'"feature {i}"' for i in range(200)) + "]}"
+    output = finished_output(storage, content)
+
+    response = client.get(f"/outputs/{output.id}", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.text == content
+    etag = response.headers["etag"]
+    assert etag == f'"{output.sha256}"'
+    assert client.get(f"/outputs/{output.id}", headers={"If-None-Match": etag, "Accept-Encoding": "identity"}).status_code == 304
+
+    compressed = client.get(f"/outputs/{output.id}", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.text == content  # decoded by the client
+    assert compressed.headers["etag"] != etag
+
+    partial = client.get(f"/outputs/{output.id}", headers={"Range": "bytes=0-19", "Accept-Encoding": "gzip"})
+    assert partial.status_code == 206
+    assert partial.content == content[:20].encode()
+
+
+def test_get_output_marks_local_fallback(storage):
+    output = finished_output(storage, "{}", status="fallback")
+    response = client.get(f"/outputs/{output.id}")
+    assert response.status_code == 200
+    assert response.headers["x-output-status"] == "fallback"
+
+
+def test_get_output_that_is_not_finished(storage):
+    pending = storage.reserve_output(None)
+    assert client.get(f"/outputs/{pending.id}").status_code == 202
+    assert client.get("/outputs/999").status_code == 404
+
+
+def test_list_outputs_is_paginated(storage):
+    ids = [finished_output(storage, "{}").id for _ in range(3)]
+    first = client.get("/outputs", params={"limit": 2}).json()
+    assert [item["id"] for item in first["items"]] == ids[:2]
+    assert first["items"][0]["url"] == f"/outputs/{ids[0]}"
+    response = client.get("/outputs", params={"limit": 2, "cursor": first["next_cursor"]})
+    assert [item["id"] for item in response.json()["items"]] == ids[2:]
+    assert response.json()["next_cursor"] is None
+    assert client.get("/outputs", params={"limit": 2, "cursor": first["next_cursor"]},
+                      headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+
+def test_health_and_readiness_after_warm_up(monkeypatch):
+    """Liveness answers at once; readiness turns 200 when the background warm-up is done."""
+    monkeypatch.setattr("agent._llm", FakeBackend())  # the probe never leaves the process
+    # keep the queues for the other tests
+    with patch("main.job_queue.shutdown"), patch("main.ingest_queue.shutdown"), TestClient(app) as started:
+        assert started.get("/healthz").json() == {"status": "ok"}
+        for _ in range(100):
+            response = started.get("/readyz")
+            if response.status_code == 200:
+                break
+            time.sleep(0.05)
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready" and response.json()["import_seconds"] > 0
+    # === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
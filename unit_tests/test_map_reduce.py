@@ -0,0 +1,91 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+from cache import ResultCache
+from map_reduce import run_map_reduce, split_products
+
+
+def reply(data):
+    message = MagicMock()
+    message.content = json.dumps(data, ensure_ascii=False)
+    return message
+
+
+@pytest.fixture
+def content():
+    return json.dumps({"products": [
+        {"name": "Product A", "description": "ANC, 10h battery", "reviews": ["Good for gaming?"]},
+        {"name": "Product B", "description": "ANC, BassUp", "reviews": ["Sound quality is great"]},
+    ]})
+
+
+def test_split_products_requires_products_document():
+    with pytest.raises(ValueError):
+        split_products("plain text input")
+
+
+def test_run_map_reduce_merges_per_product_extracts(content):
+    llm = MagicMock()
+    llm.batch.return_value = [
+        reply({"features": ["ANC", "10h battery"], "review_topics": ["gaming"], "missing_in_description": ["latency"]}),
+        reply({"features": ["ANC", "BassUp"], "review_topics": ["sound"], "missing_in_description": []}),
+    ]
+    llm.invoke.side_effect = [
+        reply({"common_features": ["ANC"], "unique_features": {"Product A": ["10h battery"], "Product B": ["BassUp"]}}),
+        reply({"marketing_insight": "Highlight ANC."}),
+    ]
+
+    result = run_map_reduce(llm, content, max_concurrency=2)
+
+    assert llm.batch.call_args.kwargs["config"] == {"max_concurrency": 2}
+    assert len(llm.batch.call_args.args[0]) == 2
+    assert result["common_features"] == ["ANC"]
+    assert set(result["unique_features"]) == {"Product A", "Product B"}
+    assert result["customer_gaps"][0]["missing_in_description"] == ["latency"]
+    assert result["marketing_insight"] == "Highlight ANC."
+
+
+def test_incremental_run_only_extracts_changed_products(content, tmp_path):
+    llm = MagicMock(model="m", settings={"model": "m"})
+    own = {"Product A": "10h battery", "Product B": "BassUp"}
+    llm.batch.side_effect = lambda batch, config: [
+        reply({"features": ["ANC", own[json.loads(m[1]["content"])["name"]]], "review_topics": ["sound"],
+               "missing_in_description": []})
+        for m in batch
+    ]
+    llm.invoke.return_value = reply({"marketing_insight": "Highlight ANC."})
+    cache = ResultCache(directory=str(tmp_path))
+
+    first = run_map_reduce(llm, content, cache=cache, local_merge=True)
+    assert len(llm.batch.call_args.args[0]) == 2
+    assert llm.invoke.call_count == 1  # only the insight: the merge is local
+    assert first["common_features"] == ["ANC"]
+    assert first["unique_features"] == {"Product A": ["10h battery"], "Product B": ["BassUp"]}
+
+    changed = json.loads(content)
+    changed["products"][1]["reviews"].append("Battery?")
+    second = run_map_reduce(llm, json.dumps(changed), cache=cache, local_merge=True)
+    assert [json.loads(m[1]["content"])["name"] for m in llm.batch.call_args.args[0]] == ["Product B"]
+    assert llm.invoke.call_count == 2
+    assert second["customer_gaps"] == first["customer_gaps"]
+
+
+def test_empty_or_cut_off_extracts_are_not_cached(content, tmp_path):
+    cut_off = MagicMock(content='{"features": ["ANC", "10h batt')
+    no_json = MagicMock(content="No JSON here")
+    llm = MagicMock(model="m", settings={"model": "m"})
+    llm.batch.return_value = [cut_off, no_json]
+    llm.invoke.return_value = reply({"marketing_insight": "Highlight ANC."})
+    cache = ResultCache(directory=str(tmp_path))
+
+    first = run_map_reduce(llm, content, cache=cache, local_merge=True)
+    assert first["customer_gaps"][1]["review_mentions"] == []
+    assert cache.stats()["memory_items"] == 0
+
+    llm.batch.return_value = [
+        reply({"features": ["ANC"], "review_topics": ["gaming"], "missing_in_description": []}),
+        reply({"features": ["BassUp"], "review_topics": ["sound"], "missing_in_description": []}),
+    ]
+    run_map_reduce(llm, content, cache=cache, local_merge=True)
+    assert len(llm.batch.call_args.args[0]) == 2
+# === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
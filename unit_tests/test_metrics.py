@@ -0,0 +1,45 @@
+import pytest
+from metrics import Counter, Gauge, Histogram, render
+
+
+def test_counter_renders_one_sample_per_label_set():
+    registry = []
+    tokens = Counter("tokens_total", "Tokens used", labels=("kind",), registry=registry)
+    tokens.inc(120, kind="prompt")
+    tokens.inc(30, kind="completion")
+    tokens.inc(80, kind="prompt")
+
+    text = render(registry)
+    assert "# TYPE tokens_total counter" in text
+    assert 'tokens_total{kind="prompt"} 200' in text
+    assert 'tokens_total{kind="completion"} 30' in text
+    assert text.endswith("\n")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = []
+    latency = Histogram("stage_seconds", "Stage latency", labels=("stage",), buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value, stage="llm_call")
+
+    lines = render(registry).splitlines()
+    assert 'stage_seconds_bucket{stage="llm_call",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="llm_call",le="1"} 3' in lines
+    assert 'stage_seconds_bucket{stage="llm_call",le="+Inf"} 4' in lines
+    assert 'stage_seconds_count{stage="llm_call"} 4' in lines
+    assert 'stage_seconds_sum{stage="llm_call"} 4.25' in lines
+
+
+def test_histogram_time_records_failed_blocks_too():
+    latency = Histogram("block_seconds", "Block latency", registry=[])
+    with pytest.raises(ValueError):
+        with latency.time():
+            raise ValueError("boom")
+    assert latency.count() == 1
+
+
+def test_label_values_are_escaped():
+    registry = []
+    gauge = Gauge("depth", "Queue depth", labels=("state",), registry=registry)
+    gauge.set(2, state='a "quoted"\nvalue')
+    assert 'depth{state="a \\"quoted\\"\\nvalue"} 2' in render(registry)
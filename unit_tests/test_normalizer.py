@@ -0,0 +1,55 @@
+import re
+import random
+import pytest
+from normalizer import MixedTextNormalizer, normalize_stream, normalize_text
+
+
+def legacy_normalize(text):
+    """The seven-pass implementation normalize_text has to match exactly."""
+    text = re.sub(r'[\u200c\s]+', ' ', text)
+    text = re.sub(r'\s+([,.!?;:])', r'\1', text)
+    text = re.sub(r'([،؛؟])\s*', r'\1 ', text)
+    text = re.sub(r'([آ-ی])([A-Za-z0-9])', r'\1 \2', text)
+    text = re.sub(r'([A-Za-z0-9])([آ-ی])', r'\1 \2', text)
+    text = re.sub(r'\(\s+', '(', text)
+    text = re.sub(r'\s+\)', ')', text)
+    return text.strip()
+
+
+ALPHABET = list("aZ09 \t\n\x1c\x85\xa0\u3000\u200c()،؛؟,.!?;:آبیپ٠ـ-\"{}") + ["  "]
+
+
+def random_texts(count, seed=7):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield rng, "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 16)))
+
+
+@pytest.mark.parametrize("text", [
+    "  سلام  ,دنیا ( test )",
+    "باتری5000mAh و USBC",
+    "چرا؟بله،خیر ؛ok )",
+    "،)",
+    "\u200cنیم\u200cفاصله\n\n",
+])
+def test_matches_legacy_examples(text):
+    assert normalize_text(text) == legacy_normalize(text)
+
+
+def test_matches_legacy_on_random_text():
+    for _, text in random_texts(20000):
+        assert normalize_text(text) == legacy_normalize(text), repr(text)
+
+
+def test_stream_matches_whole_document_for_any_chunking():
+    for rng, text in random_texts(20000, seed=11):
+        cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 5))))
+        chunks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        assert "".join(normalize_stream(chunks)) == legacy_normalize(text), repr(chunks)
+
+
+def test_stream_holds_back_only_the_pending_gap():
+    normalizer = MixedTextNormalizer()
+    assert normalizer.feed("  سلام ") == "سلام"
+    assert normalizer.feed("  ,") == ","
+    assert normalizer.feed(" test") == " test"
@@ -0,0 +1,48 @@
+import pytest
+from rate_limit import RateLimiter, Rule, client_key, known_keys
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "ratelimit.sqlite3")
+
+
+def test_burst_then_refill(db_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("rate_limit.time.time", lambda: now[0])
+    limiter = RateLimiter(db_path, {"analyze": Rule(per_minute=6, burst=2)})
+
+    assert limiter.acquire("analyze", "ip:a") == (True, 0.0)
+    assert limiter.acquire("analyze", "ip:a") == (True, 0.0)
+    allowed, retry_after = limiter.acquire("analyze", "ip:a")
+    assert not allowed and retry_after == pytest.approx(10.0)
+    assert limiter.acquire("analyze", "ip:b")[0]  # buckets are per client
+
+    now[0] += 10
+    assert limiter.acquire("analyze", "ip:a")[0]
+
+
+def test_limits_are_shared_between_limiter_instances(db_path):
+    """Two limiters on one database behave like two worker processes."""
+    rules = {"input": Rule(per_minute=1, burst=3)}
+    first, second = RateLimiter(db_path, rules), RateLimiter(db_path, rules)
+    results = [limiter.acquire("input", "ip:a")[0] for limiter in (first, second, first, second)]
+    assert results == [True, True, True, False]
+
+
+def test_disabled_and_unknown_scopes_are_not_limited(db_path):
+    limiter = RateLimiter(db_path, {"input": Rule(per_minute=0, burst=0)})
+    assert all(limiter.acquire(scope, "ip:a")[0] for scope in ("input", "other") for _ in range(5))
+
+
+def test_client_key_hashes_api_keys():
+    keys = known_keys(["secret", " other ", ""])
+    assert client_key(None, "1.2.3.4", keys) == "ip:1.2.3.4"
+    key = client_key("secret", "1.2.3.4", keys)
+    assert key.startswith("key:") and "secret" not in key
+    assert client_key("other", "1.2.3.4", keys) not in (key, "ip:1.2.3.4")
+
+
+def test_unknown_api_keys_share_the_ip_bucket():
+    assert client_key("random-1", "1.2.3.4", known_keys(["secret"])) == "ip:1.2.3.4"
+    assert client_key("random-2", "1.2.3.4") == "ip:1.2.3.4"
@@ -0,0 +1,33 @@
+import time
+import random
+from review_dedup import canonical_review, collapse_reviews, near_duplicate_groups
+
+
+def test_canonical_review_ignores_punctuation_and_case():
+    assert canonical_review("Sound   quality, GREAT!!") == "sound quality great"
+    assert canonical_review("می‌شود") == "میشود"
+
+
+def test_collapse_reviews_counts_near_duplicates():
+    reviews = [
+        "کیفیت صدا عالیه",
+        "باتری خیلی زود تموم میشه",
+        "کیفیت صدا عالیه!!",
+        "کیفیت صدا عالیهه",
+    ]
+    assert collapse_reviews(reviews) == [("کیفیت صدا عالیه", 3), ("باتری خیلی زود تموم میشه", 1)]
+
+
+def test_distinct_reviews_stay_separate():
+    labels = near_duplicate_groups(["battery lasts two days", "the case feels cheap", "great noise cancelling"])
+    assert len(set(labels)) == 3
+
+
+def test_collapse_scales_to_many_reviews():
+    random.seed(7)
+    words = "هدفون صدا باتری شارژ کیفیت عالی بیس نویز تماس میکروفون قیمت ارسال رنگ طراحی".split()
+    reviews = [" ".join(random.choice(words) for _ in range(12)) for _ in range(20000)]
+    start = time.perf_counter()
+    collapse_reviews(reviews)
+    assert time.perf_counter() - start < 3.0
+# === To run the tests, navigate to the "tests" directory or specify a test file, then run: pytest ===
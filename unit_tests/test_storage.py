@@ -0,0 +1,70 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from storage import Storage, atomic_write
+
+
+def test_ids_are_unique_under_concurrent_uploads(tmp_path):
+    storage = Storage(str(tmp_path))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        records = list(pool.map(lambda i: storage.save_input(f"input {i}".encode(), f"{i}.json"), range(40)))
+    assert sorted(r.id for r in records) == list(range(1, 41))
+    assert all(os.path.exists(r.path) for r in records)
+
+
+def test_latest_input_is_numeric_not_lexicographic(tmp_path):
+    storage = Storage(str(tmp_path))
+    for i in range(10):
+        storage.save_input(f"input {i}".encode())
+    latest = storage.latest_input()
+    assert latest.id == 10 and latest.path.endswith("input10.json")
+    assert storage.find_input(latest.sha256).id == 10
+
+
+def test_output_links_and_status(tmp_path):
+    storage = Storage(str(tmp_path))
+    record = storage.save_input(b"data")
+    ok, failed, local = (storage.reserve_output(record.id) for _ in range(3))
+    atomic_write(ok.path, "{}")
+    assert storage.complete_output(ok.id).size == 2
+    storage.fail_output(failed.id)
+    atomic_write(local.path, "{}")
+    storage.complete_output(local.id, "fallback")
+    assert [(o.id, o.status) for o in storage.outputs_for_input(record.id)] == [(1, "done"), (2, "failed"), (3, "fallback")]
+
+
+def test_stale_pending_outputs_expire(tmp_path):
+    storage = Storage(str(tmp_path))
+    stale, recent = storage.reserve_output(None), storage.reserve_output(None)
+    atomic_write(stale.path, "{")  # left behind by a crashed analysis
+    with storage._transaction() as db:
+        db.execute("UPDATE outputs SET created_at = created_at - 60 WHERE id = ?", (stale.id,))
+
+    assert storage.expire_pending(30) == [stale.id]
+    assert storage.get_output(stale.id).status == "failed" and not os.path.exists(stale.path)
+    assert storage.get_output(recent.id).status == "pending"
+    assert storage.expire_pending(30) == []
+
+
+def test_existing_files_are_indexed_once(tmp_path):
+    os.makedirs(tmp_path / "inputs")
+    for i in (2, 9, 10):
+        (tmp_path / "inputs" / f"input{i}.json").write_text("{}")
+    storage = Storage(str(tmp_path))
+    assert storage.latest_input().id == 10
+    assert storage.save_input(b"new").id == 11
+    assert Storage(str(tmp_path)).latest_input().id == 11
+
+
+def test_finished_outputs_get_compressed_variants(tmp_path):
+    storage = Storage(str(tmp_path))
+    big, small = storage.reserve_output(None), storage.reserve_output(None)
+    atomic_write(big.path, '{"features": [' + ", ".join('"x"' for _ in range(500)) + "]}")
+    atomic_write(small.path, "{}")
+    storage.complete_output(big.id)
+    storage.complete_output(small.id)
+    assert os.path.exists(storage.variant_path(big.id, "gzip"))
+    assert not os.path.exists(storage.variant_path(small.id, "gzip"))
+    storage.fail_output(big.id)
+    assert not os.path.exists(storage.variant_path(big.id, "gzip"))
+    assert [o.id for o in storage.list_outputs(status="done")] == [small.id]
+    assert [o.id for o in storage.list_outputs(after=big.id)] == [small.id]
@@ -0,0 +1,79 @@
+import sys
+import json
+import pytest
+from unittest.mock import MagicMock
+from token_budget import _encoding, count_tokens, fit_to_budget, review_salience, sentence_salience, tokenizer_name
+
+FILLER = "این محصول برای همه مناسب است و از خرید آن راضی خواهید بود."
+FEATURE = "باتری آن تا 10 ساعت شارژ می‌ماند و نویز کنسلینگ ANC دارد."
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    """Deterministic counts whether or not a tiktoken encoding can be loaded here."""
+    monkeypatch.setattr("token_budget._encoding", lambda model: None)
+
+
+def catalog(products=4, filler=20, reviews=10):
+    return json.dumps({"products": [{
+        "name": f"Product {p}",
+        "description": " ".join([FILLER] * filler + [FEATURE]),
+        "reviews": ["سلام وقت بخیر"] * reviews + ["صدای بیس و میکروفون برای تماس عالی است؟"],
+    } for p in range(products)]}, ensure_ascii=False)
+
+
+def test_count_tokens_estimate_weights_persian_higher():
+    assert count_tokens("abcd" * 10, "fake") == 10
+    assert count_tokens("سلام" * 3, "fake") == 4
+
+
+def test_estimate_tokenizer_never_loads_tiktoken(monkeypatch):
+    """TOKENIZER=estimate is the offline setting: tiktoken is not even imported."""
+    tiktoken = MagicMock()
+    monkeypatch.setitem(sys.modules, "tiktoken", tiktoken)
+    monkeypatch.setattr("token_budget._encoding", _encoding)  # the real one, not the fixture's
+    monkeypatch.setattr("token_budget.TOKENIZER", "estimate")
+    _encoding.cache_clear()
+    try:
+        assert tokenizer_name("gpt-4o-mini") == "estimate"
+        assert count_tokens("abcd" * 10, "gpt-4o-mini") == 10
+        tiktoken.encoding_for_model.assert_not_called()
+
+        monkeypatch.setattr("token_budget.TOKENIZER", "tiktoken")
+        _encoding.cache_clear()
+        tiktoken.encoding_for_model.return_value.name = "o200k_base"
+        assert tokenizer_name("gpt-4o-mini") == "tiktoken:o200k_base"
+    finally:
+        _encoding.cache_clear()
+
+
+def test_content_within_budget_is_unchanged():
+    content = catalog(products=1, filler=1, reviews=1)
+    trimmed, report = fit_to_budget(content, 10_000, "fake")
+    assert trimmed == content and not report.trimmed and report.fits
+
+
+def test_oversized_catalog_keeps_every_product_and_its_most_salient_parts():
+    content = catalog()
+    trimmed, report = fit_to_budget(content, 600, "fake")
+
+    assert report.fits and report.tokens_after <= 600 < report.tokens_before
+    products = json.loads(trimmed)["products"]
+    assert [p["name"] for p in products] == [f"Product {p}" for p in range(4)]
+    for product in products:
+        assert FEATURE in product["description"]
+        assert "صدای بیس و میکروفون برای تماس عالی است؟" in product["reviews"]
+    assert report.sentences_dropped > 0 and report.reviews_dropped > 0
+    assert report.products[0]["name"] == "Product 0" and report.products[0]["dropped"]
+
+
+def test_free_text_is_trimmed_by_sentence():
+    content = "\n".join([FILLER] * 50 + [FEATURE])
+    trimmed, report = fit_to_budget(content, 100, "fake")
+    assert FEATURE in trimmed and report.fits and report.sentences_dropped > 0
+
+
+def test_salience_prefers_features_and_repeated_reviews():
+    assert sentence_salience(FEATURE) > sentence_salience(FILLER) == 0
+    review = "صدای بیس عالی است"
+    assert review_salience({"text": review, "count": 5}) > review_salience(review) > review_salience("سلام وقت بخیر")